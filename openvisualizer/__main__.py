@@ -14,6 +14,9 @@ import coloredlogs
 import pkg_resources as pkg_rs
 
 from openvisualizer import APPNAME, PACKAGE_NAME, DEFAULT_LOGGING_CONF, WINDOWS_COLORS, UNIX_COLORS, VERSION
+from openvisualizer.motehandler.moteconnector.openparser.parserlogs import ParserLogs
+from openvisualizer.motehandler.moteprobe.framequeue import FrameQueue
+from openvisualizer.motehandler.moteprobe.moteprobe import MoteProbe
 from openvisualizer.server import OpenVisualizer
 
 server_object: Optional[OpenVisualizer] = None
@@ -38,7 +41,16 @@ ServerConfig = namedtuple('ServerConfig',
                               'page_zero',
                               'fw_path',
                               'mqtt_broker',
-                              'root'
+                              'root',
+                              'tx_pacing',
+                              'tx_coalesce',
+                              'rx_queue_size',
+                              'rx_drop_policy',
+                              'ingest_stats',
+                              'status_dedup',
+                              'log_window',
+                              'record_trace',
+                              'async_delivery',
                           ])
 
 pass_config = click.make_pass_decorator(ServerConfig, ensure=True)
@@ -124,8 +136,29 @@ def prompt_fw_path(ctx, param, fw_path):
               help="Specify path to the OpenWSN firmware", callback=prompt_fw_path)
 @click.option('--mqtt-broker', default=None, type=str, help='Specify address MQTT server for network stats.')
 @click.option('--root', type=str, help='Mark a mote as DAGroot, e.g. /dev/ttyUSB* or COM*')
+@click.option('--tx-pacing', default=MoteProbe.TX_PACING, type=float, show_default=True,
+              help='Seconds to wait between the 6LoWPAN fragments of a packet written to a mote')
+@click.option('--tx-coalesce', default=MoteProbe.TX_COALESCE, type=int, show_default=True,
+              help='Merge pending frames into writes of up to this many bytes (0 writes frames one by one)')
+@click.option('--rx-queue-size', default=MoteProbe.RX_QUEUE_SIZE, type=click.IntRange(min=0), show_default=True,
+              help='Number of received frames buffered per mote while waiting to be parsed (0 parses them on the '
+                   'serial reader thread)')
+@click.option('--rx-drop-policy', type=click.Choice(FrameQueue.POLICIES),
+              help='Frame to drop (or block the serial reader) when the receive buffer is full  '
+                   '[default: {}]'.format(MoteProbe.RX_DROP_POLICY))
+@click.option('--ingest-stats', is_flag=True, help='Collect traffic and parsing statistics of the serial ports')
+@click.option('--status-dedup', is_flag=True, help='Skip the status elements a mote resends unchanged')
+@click.option('--log-window', default=ParserLogs.AGGREGATION_WINDOW, type=click.FloatRange(min=0), show_default=True,
+              help='Seconds during which repeated mote log entries are counted instead of printed (0 prints all)')
+@click.option('--record-trace', type=click.Path(dir_okay=False, writable=True),
+              help='Record the frames received from the motes to this file (see the replay command)')
+@click.option('--async-delivery', is_flag=True,
+              help='Deliver the events to the TUN interface, the wireshark export and the RPL DAO processing on their '
+                   'own threads')
 @click.pass_context
-def cli(ctx, host, port, version, wireshark_debug, tun, lconf, page_zero, fw_path, mqtt_broker, root):
+def cli(ctx, host, port, version, wireshark_debug, tun, lconf, page_zero, fw_path, mqtt_broker, root, tx_pacing,
+        tx_coalesce, rx_queue_size, rx_drop_policy, ingest_stats, status_dedup, log_window, record_trace,
+        async_delivery):
     banner = [""]
     banner += [" ___                 _ _ _  ___  _ _ "]
     banner += ["| . | ___  ___ ._ _ | | | |/ __>| \\ |"]
@@ -165,18 +198,28 @@ def cli(ctx, host, port, version, wireshark_debug, tun, lconf, page_zero, fw_pat
             log.critical(err)
             return
 
-    ctx.obj = ServerConfig(host, port, wireshark_debug, tun, lconf, page_zero, fw_path, mqtt_broker, root)
+    ctx.obj = ServerConfig(host, port, wireshark_debug, tun, lconf, page_zero, fw_path, mqtt_broker, root, tx_pacing,
+                           tx_coalesce, rx_queue_size, rx_drop_policy, ingest_stats, status_dedup, log_window,
+                           record_trace, async_delivery)
     load_logging_conf(ctx.obj)
 
 
 @click.command()
 @click.option('--baudrate', default=['115200'], help='A list of baudrates to test', show_default=True)
 @click.option('--port_mask', help='Define a port mask for probing hardware, e.g., /dev/ttyUSB*')
+@click.option('--probe-backend', default='thread', type=click.Choice(sorted(OpenVisualizer.PROBE_BACKENDS.keys())),
+              help='Read each serial port from its own thread or multiplex all ports on one asyncio event loop',
+              show_default=True)
+@click.option('--baudrate-cache/--no-baudrate-cache', default=True,
+              help='Try the baudrate that worked last time on each port before probing all the baudrates',
+              show_default=True)
 @pass_config
-def hardware(config, baudrate, port_mask):
+def hardware(config, baudrate, port_mask, probe_backend, baudrate_cache):
     """ OpenVisualizer in hardware mode."""
 
-    start_server(OpenVisualizer(config, OpenVisualizer.Mode.HARDWARE, baudrate=baudrate, port_mask=port_mask), config)
+    start_server(
+        OpenVisualizer(config, OpenVisualizer.Mode.HARDWARE, baudrate=baudrate, port_mask=port_mask,
+                       probe_backend=probe_backend, baudrate_cache=baudrate_cache), config)
 
 
 @click.command()
@@ -190,6 +233,22 @@ def simulation(config, num_of_motes, topology):
         OpenVisualizer(config, OpenVisualizer.Mode.SIMULATION, num_of_motes=num_of_motes, topology=topology), config)
 
 
+@click.command()
+@pass_config
+@click.argument('trace', nargs=1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--speed', default=1.0, type=click.FloatRange(min=0), show_default=True,
+              help='Replay speed relative to the recording, 0 replays the frames as fast as they are parsed')
+@click.option('--start', type=click.FloatRange(min=0),
+              help='Skip the frames recorded less than this many seconds after the first one')
+@click.option('--end', type=click.FloatRange(min=0),
+              help='Stop at the first frame recorded this many seconds after the first one')
+def replay(config, trace, speed, start, end):
+    """ OpenVisualizer fed with the frames of a recorded trace. """
+
+    start_server(
+        OpenVisualizer(config, OpenVisualizer.Mode.REPLAY, trace=trace, speed=speed, start=start, end=end), config)
+
+
 @click.command()
 @pass_config
 def testbed(config):
@@ -230,5 +289,6 @@ def load_logging_conf(config):
 
 cli.add_command(hardware)
 cli.add_command(simulation)
+cli.add_command(replay)
 cli.add_command(testbed)
 cli.add_command(iotlab)
@@ -0,0 +1,49 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+import json
+import os
+import sys
+
+import click
+
+from openvisualizer.analytics.batch import analyze, make_shards
+from openvisualizer.utils import extract_stack_defines, StackDefinesCache
+
+
+@click.command()
+@click.argument('traces', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), default='summary.json',
+              show_default=True, help='Summary file, - writes the summary to the standard output')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), help='Number of worker processes [default: one per CPU]')
+@click.option('--slice', 'slice_length', type=click.FloatRange(min=0),
+              help='Also split each port of a trace in slices of this many seconds')
+@click.option('--latency-samples', default=0, type=click.IntRange(min=0), show_default=True,
+              help='Size of the sample of latencies kept per mote and shard, to report latency percentiles')
+@click.option('--fw-path', default=lambda: os.environ.get('OPENWSN_FW_BASE'),
+              help='Path to the OpenWSN firmware, to name the components in the log counts')
+def cli(traces, output, jobs, slice_length, latency_samples, fw_path):
+    """ Parses recorded frame traces and summarizes the mote KPIs and log entries. """
+
+    stack_defines = extract_stack_defines(fw_path, StackDefinesCache()) if fw_path else None
+
+    shards = make_shards(traces, slice_length, latency_samples)
+    with click.progressbar(length=len(shards), label='Analyzing {} shards'.format(len(shards)),
+                           file=sys.stderr) as bar:
+        summary = analyze(shards, jobs, progress=lambda _: bar.update(1))
+
+    result = json.dumps(summary.to_dict(stack_defines), indent=2)
+    if output == '-':
+        click.echo(result)
+    else:
+        with open(output, 'w') as f:
+            f.write(result)
+        click.secho('{} frames ({} HDLC errors, {} parse errors) from {} motes summarized in {}'.format(
+            summary.frames, summary.hdlc_errors, summary.parse_errors, len(summary.kpi), output), err=True)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,179 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+"""
+Offline analysis of recorded frame traces (see frametrace).
+
+The traces are split into shards, one per port and optional time slice, each one run through its own OpenParser,
+possibly in a process pool. A shard reduces the ParserData KPIs and the ParserLogs counts to a ShardSummary; the
+summaries merge exactly whatever the sharding (up to the float rounding, and to the sampling of the latency
+percentiles), so the result does not depend on the slice length. They are merged in the order of the shards, which
+keeps the laps of the packet counters (see kpistats.CounterBitmap) in sequence.
+"""
+
+import logging
+import multiprocessing
+import time
+from collections import namedtuple
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.moteprobe.frametrace import TraceReader
+
+log = logging.getLogger('Analytics')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+Shard = namedtuple('Shard', ['trace', 'port', 'start', 'end', 'latency_samples'])
+
+
+# ============================ class ===================================
+
+class ShardSummary(object):
+    """ Frame counts, KPIs per source mote and log entry counts of one or several shards. """
+
+    def __init__(self):
+        self.shards = 0
+        self.frames = 0
+        self.hdlc_errors = 0
+        self.parse_errors = 0
+        self.frame_types = {}
+        self.first = None
+        self.last = None
+        # source mote id -> UinjectKpi
+        self.kpi = {}
+        # (severity, mote id, component, error code) -> number of entries
+        self.logs = {}
+
+    def merge(self, other):
+        self.shards += other.shards
+        self.frames += other.frames
+        self.hdlc_errors += other.hdlc_errors
+        self.parse_errors += other.parse_errors
+        for event_sub_type, count in other.frame_types.items():
+            self.frame_types[event_sub_type] = self.frame_types.get(event_sub_type, 0) + count
+        if other.first is not None:
+            self.first = other.first if self.first is None else min(self.first, other.first)
+            self.last = other.last if self.last is None else max(self.last, other.last)
+        for src_id, kpi in other.kpi.items():
+            if src_id in self.kpi:
+                self.kpi[src_id].merge(kpi)
+            else:
+                self.kpi[src_id] = kpi
+        for key, count in other.logs.items():
+            self.logs[key] = self.logs.get(key, 0) + count
+
+    def to_dict(self, stack_defines=None):
+        """ Returns the summary as a JSON-serializable dict, the components are named after stack_defines if given """
+        components = (stack_defines or {}).get('components', {})
+        kpi = {src_id: mote_kpi.to_dict() for src_id, mote_kpi in sorted(self.kpi.items())}
+
+        # averages over the motes, as published by ParserData
+        network = {}
+        if kpi:
+            for name in ('avg_pdr', 'avg_latency', 'avg_cellsUsage'):
+                network[name] = sum(k[name] for k in kpi.values()) / len(kpi)
+
+        return {
+            'shards': self.shards,
+            'frames': self.frames,
+            'hdlc_errors': self.hdlc_errors,
+            'parse_errors': self.parse_errors,
+            'frame_types': dict(self.frame_types),
+            'first': self.first,
+            'last': self.last,
+            'kpi': kpi,
+            'network_kpi': network,
+            'logs': [
+                {
+                    'severity': chr(severity),
+                    'mote_id': mote_id,
+                    'component': components.get(component, 'unknown component code {0}'.format(component)),
+                    'error_code': error_code,
+                    'count': count,
+                } for (severity, mote_id, component, error_code), count in sorted(self.logs.items())
+            ],
+        }
+
+
+# ============================ functions ===============================
+
+def make_shards(traces, slice_length=None, latency_samples=0):
+    """
+    Splits the traces in one shard per port, and per slice_length seconds of the trace if given.
+
+    :param latency_samples: size of the sample of latencies kept per mote and shard, for the latency percentiles
+    """
+    shards = []
+    for trace in traces:
+        # builds the index once, the workers load it
+        with TraceReader(trace) as reader:
+            ports = reader.ports
+            first, last = reader.first_timestamp, reader.last_timestamp
+
+        if not slice_length or first is None:
+            shards += [Shard(trace, port, None, None, latency_samples) for port in ports]
+            continue
+
+        start = first
+        while start <= last:
+            shards += [Shard(trace, port, start, start + slice_length, latency_samples) for port in ports]
+            start += slice_length
+    return shards
+
+
+def analyze_shard(shard):
+    """ Parses the frames of a shard, returns their ShardSummary """
+    summary = ShardSummary()
+    summary.shards = 1
+
+    parser = OpenParser(None, {}, shard.port)
+    parser.parser_data.latency_samples = shard.latency_samples
+    for log_parser in parser.log_parsers:
+        # the entries are counted, never formatted (no logger is ever enabled for NOTSET)
+        log_parser.level = logging.NOTSET
+
+    frame_types = summary.frame_types
+    with TraceReader(shard.trace) as reader:
+        for timestamp, _, event_sub_type, _ in reader.parse(parser, shard.port, shard.start, shard.end):
+            frame_types[event_sub_type] = frame_types.get(event_sub_type, 0) + 1
+            if summary.first is None:
+                summary.first = timestamp
+            summary.last = timestamp
+        summary.hdlc_errors = reader.hdlc_errors
+        summary.parse_errors = reader.parse_errors
+    summary.frames = sum(frame_types.values())
+
+    summary.kpi = parser.parser_data.avg_kpi
+    for log_parser in parser.log_parsers:
+        for (mote_id, component, error_code), count in log_parser.error_info.items():
+            summary.logs[(log_parser.severity, mote_id, component, error_code)] = count
+    return summary
+
+
+def analyze(shards, processes=None, progress=None):
+    """
+    Analyzes shards in a pool of processes (one per CPU by default, in this process with processes=1).
+
+    :param progress: called with each ShardSummary as it completes
+    :returns: the merged ShardSummary
+    """
+    summary = ShardSummary()
+    start = time.monotonic()
+
+    def _merge(results):
+        for result in results:
+            summary.merge(result)
+            if progress is not None:
+                progress(result)
+
+    if processes == 1:
+        _merge(map(analyze_shard, shards))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            _merge(pool.imap(analyze_shard, shards))
+
+    log.info('{} shards analyzed in {:.3f}s'.format(summary.shards, time.monotonic() - start))
+    return summary
@@ -4,18 +4,262 @@
 # Released under the BSD 3-Clause license as published at the link below.
 # https://openwsn.atlassian.net/wiki/display/OW/License
 
+import itertools
 import logging
 import threading
+import weakref
 
 from pydispatch import dispatcher
 
+from openvisualizer.eventbus.eventworker import EventWorker
+
 log = logging.getLogger('EventBusClient')
 log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
+WILDCARD = '*'
+
+
+def signals_equivalent(s1, s2):
+    """ Two signals match if equal, string or 3-tuple, with the wildcard matching any string or tuple element """
+    return_val = True
+    if isinstance(s1, str) and isinstance(s2, str):
+        if (s1 != s2) and (s1 != WILDCARD) and (s2 != WILDCARD):
+            return_val = False
+    elif isinstance(s1, tuple) and isinstance(s2, tuple):
+        if len(s1) == len(s2) == 3:
+            for i in range(3):
+                if (s1[i] != s2[i]) and (s1[i] != WILDCARD) and (s2[i] != WILDCARD):
+                    return_val = False
+        else:
+            return_val = False
+    else:
+        return_val = False
+
+    return return_val
+
+
+# ============================ class ===================================
+
+class _Subscription(object):
+    """ A registration of a client, owned by the client and only weakly referenced by the registry. """
+
+    __slots__ = ('client_seq', 'seq', 'sender', 'signal', 'callback', 'registration', 'ref', 'path', 'worker',
+                 '__weakref__')
+
+    def __init__(self, client_seq, seq, registration, worker=None):
+        self.client_seq = client_seq
+        self.seq = seq
+        self.sender = registration['sender']
+        self.signal = registration['signal']
+        self.callback = registration['callback']
+        self.registration = registration
+        self.ref = weakref.ref(self)
+        # keys of its bucket in the registry index, None while not indexed
+        self.path = None
+        # the EventWorker delivering its events, None when delivered on the sender's thread
+        self.worker = worker
+
+
+class _Responses(list):
+    """ The (callback, return value) of the clients notified of an event, see EventBusRegistry.notify """
+
+
+# ============================ class ===================================
+
+class EventBusRegistry(object):
+    """
+    Subscriptions of all the EventBusClients, indexed by signal and sender.
+
+    A single receiver is connected to the dispatcher for all the clients: an event only reaches the callbacks
+    registered for its signal, found in the exact signal index, in the string wildcard subscriptions or, for
+    the (address, protocol, port) tuples, in one index per combination of wildcard positions. The events
+    carrying a wildcard themselves fall back to scanning every subscription.
+
+    As with a client connected to the dispatcher, each client has at most one callback called per event, the one
+    registered first, and the clients are called in their creation order. The subscriptions delivered by an
+    EventWorker are only queued, their response to the event is True.
+
+    The index is copy-on-write: (un)subscribing copies the dictionaries on the path to the changed bucket and swaps
+    in the new root with a single assignment, under a lock only taken by the writers. An event reads the root once
+    and looks it up without locking, it never sees a partial update.
+    """
+
+    EXACT = 'exact'
+    ANY_STR = 'any_str'
+    PATTERNS = 'patterns'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client_seq = itertools.count()
+        self._seq = itertools.count()
+        self._connected = False
+
+        # EXACT: signal -> sender -> (weakref to subscription, ...)
+        # ANY_STR: sender -> (...), subscriptions to any string signal
+        # PATTERNS: concrete positions -> concrete values -> sender -> (...), tuple signals with wildcard elements
+        # never modified once published, see _update()
+        self._index = {}
+
+    # ======================== public ==================================
+
+    def new_client(self):
+        """ Returns the sequence number of a new client, connects to the dispatcher on first use """
+        with self._lock:
+            if not self._connected:
+                dispatcher.connect(self.notify, weak=False)
+                self._connected = True
+            return next(self._client_seq)
+
+    def subscribe(self, client_seq, registration, worker=None):
+        """ Indexes a registration, returns the subscription the client must keep alive """
+        with self._lock:
+            sub = _Subscription(client_seq, next(self._seq), registration, worker)
+            path = self._path(sub.signal)
+            if path is not None:
+                # never matches any event otherwise
+                sub.path = path + (sub.sender,)
+                self._update(sub.path, lambda refs: refs + (sub.ref,))
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub.path is not None:
+                self._update(sub.path, lambda refs: tuple(ref for ref in refs if ref is not sub.ref))
+                sub.path = None
+
+    def match(self, sender, signal):
+        """ Returns the callbacks to notify of an event, in the order of their clients """
+        return [sub.callback for sub in self._match(sender, signal)]
+
+    def notify(self, signal, sender, data):
+        """ The dispatcher receiver of all the clients """
+        responses = _Responses()
+        for sub in self._match(sender, signal):
+            callback = sub.callback
+            worker = sub.worker
+            if worker is not None:
+                worker.put(callback, sender, signal, data)
+                responses.append((callback, True))
+                continue
+            try:
+                responses.append((callback, callback(sender=sender, signal=signal, data=data)))
+            except TypeError as err:
+                output = "ERROR could not call {0}, err={1}".format(callback, err)
+                log.critical(output)
+        return responses
+
+    # ======================== private =================================
+
+    def _match(self, sender, signal):
+        """ The subscriptions to notify of an event, in the order of their clients """
+        subs = []
+        dead = False
+        for ref in self._candidates(self._index, sender, signal):
+            sub = ref()
+            if sub is None:
+                dead = True
+            elif sub.sender == sender or sub.sender == WILDCARD:
+                subs.append(sub)
+        if dead:
+            self._prune()
+
+        if len(subs) > 1:
+            first = {}
+            for sub in subs:
+                if sub.client_seq not in first or sub.seq < first[sub.client_seq].seq:
+                    first[sub.client_seq] = sub
+            subs = sorted(first.values(), key=lambda sub: sub.client_seq)
+
+        return subs
+
+    def _path(self, signal):
+        """ The keys of the index leading to the subscriptions to signal (senders excluded) """
+        if isinstance(signal, str):
+            return (self.ANY_STR,) if signal == WILDCARD else (self.EXACT, signal)
+        if isinstance(signal, tuple) and len(signal) == 3:
+            positions = tuple(i for i in range(3) if signal[i] != WILDCARD)
+            if len(positions) == 3:
+                return self.EXACT, signal
+            return self.PATTERNS, positions, tuple(signal[i] for i in positions)
+        return None
+
+    def _update(self, path, change):
+        """ Publishes a new index where the bucket at path is replaced by change(bucket) (lock held) """
+
+        def _copy(node, keys):
+            key = keys[0]
+            if len(keys) == 1:
+                child = change(node.get(key, ()))
+            else:
+                child = _copy(node.get(key, {}), keys[1:])
+            node = dict(node)
+            if child:
+                node[key] = child
+            else:
+                node.pop(key, None)
+            return node
+
+        self._index = _copy(self._index, path)
+
+    def _candidates(self, index, sender, signal):
+        """ The subscriptions possibly matching signal and sender """
+        if isinstance(signal, str) and signal != WILDCARD:
+            buckets = [index.get(self.EXACT, {}).get(signal), index.get(self.ANY_STR)]
+        elif isinstance(signal, tuple) and len(signal) == 3 and WILDCARD not in signal:
+            buckets = [index.get(self.EXACT, {}).get(signal)]
+            for positions, table in index.get(self.PATTERNS, {}).items():
+                buckets.append(table.get(tuple(signal[i] for i in positions)))
+        elif isinstance(signal, (str, tuple)):
+            return self._scan(index, signal)
+        else:
+            return []
+
+        refs = []
+        for senders in buckets:
+            if senders:
+                refs += senders.get(sender, ())
+                if sender != WILDCARD:
+                    refs += senders.get(WILDCARD, ())
+        return refs
+
+    def _scan(self, index, signal):
+        """ The subscriptions matching signal, whatever their index """
+        refs = []
+        for _, bucket in self._buckets(index):
+            for ref in bucket:
+                sub = ref()
+                if sub is not None and signals_equivalent(sub.signal, signal):
+                    refs.append(ref)
+        return refs
+
+    def _buckets(self, index):
+        """ Yields the (path, bucket) of every bucket of the index """
+        for signal, senders in index.get(self.EXACT, {}).items():
+            for sender, bucket in senders.items():
+                yield (self.EXACT, signal, sender), bucket
+        for sender, bucket in index.get(self.ANY_STR, {}).items():
+            yield (self.ANY_STR, sender), bucket
+        for positions, table in index.get(self.PATTERNS, {}).items():
+            for values, senders in table.items():
+                for sender, bucket in senders.items():
+                    yield (self.PATTERNS, positions, values, sender), bucket
+
+    def _prune(self):
+        """ Drops the subscriptions of the clients garbage collected without unregistering """
+        with self._lock:
+            for path, bucket in list(self._buckets(self._index)):
+                if any(ref() is None for ref in bucket):
+                    self._update(path, lambda refs: tuple(ref for ref in refs if ref() is not None))
+
+
+registry = EventBusRegistry()
+
+
+# ============================ class ===================================
 
 class EventBusClient:
-    WILDCARD = '*'
+    WILDCARD = WILDCARD
 
     PROTO_ICMPv6 = 'icmpv6'
     PROTO_UDP = 'udp'
@@ -24,6 +268,14 @@ class EventBusClient:
         PROTO_UDP,
     ]
 
+    # the sender of these signals waits for the answer, they are always delivered on its thread
+    REQUEST_SIGNALS = (
+        'getSourceRoute',
+        'getParents',
+        'getNetworkPrefix',
+        'getNetworkHost',
+    )
+
     def __init__(self, name, registrations=None, **kwargs):
 
         if registrations is None:
@@ -40,9 +292,17 @@ class EventBusClient:
         # log
         log.debug("create instance")
 
-        # store params
+        # store params, the registrations are replaced (never modified) under data_lock, they can be read without it
         self.data_lock = threading.RLock()
-        self.registrations = []
+        self.registrations = ()
+
+        # the registry only references the subscriptions weakly, they live as long as the client
+        self._client_seq = registry.new_client()
+        self._subscriptions = ()
+
+        # the EventWorker delivering the async_signals, None while all the events are delivered on the sender's thread
+        self.worker = None
+        self.async_signals = ()
 
         # give this thread a name
         self.name = name
@@ -54,13 +314,17 @@ class EventBusClient:
         for r in registrations:
             self.register(sender=r['sender'], signal=r['signal'], callback=r['callback'])
 
-        # connect to dispatcher
-        dispatcher.connect(receiver=self._event_bus_notification)
-
     # ======================== public ==========================================
 
     def dispatch(self, signal, data):
-        return dispatcher.send(sender=self.name, signal=signal, data=data)
+        """ Sends an event, returns a list of (receiver, return value) """
+        results = []
+        for receiver, response in dispatcher.send(sender=self.name, signal=signal, data=data):
+            if isinstance(response, _Responses):
+                results += response
+            else:
+                results.append((receiver, response))
+        return results
 
     def register(self, sender, signal, callback):
 
@@ -85,56 +349,76 @@ class EventBusClient:
         }
 
         with self.data_lock:
-            self.registrations += [new_registration]
+            worker = self.worker if self._is_async(signal) else None
+            self._subscriptions += (registry.subscribe(self._client_seq, new_registration, worker),)
+            self.registrations += (new_registration,)
 
     def unregister(self, sender, signal, callback):
 
         with self.data_lock:
-            for reg in self.registrations:
-                if reg['sender'] == sender and self._signals_equivalent(reg['signal'], signal) and \
-                        reg['callback'] == callback:
-                    self.registrations.remove(reg)
-
-    # ======================== private =========================================
+            self._unsubscribe([
+                reg for reg in self.registrations
+                if reg['sender'] == sender and self._signals_equivalent(reg['signal'], signal) and
+                reg['callback'] == callback
+            ])
+
+    def disconnect(self):
+        """ Stops receiving events """
+        with self.data_lock:
+            self._unsubscribe(self.registrations)
+        self.disable_async()
 
-    def _event_bus_notification(self, signal, sender, data):
+    def enable_async(self, signals, maxlen=EventWorker.MAXLEN):
+        """
+        Delivers the events matching one of signals (as in unregister) to this client on its own worker thread.
 
-        callback = None
+        The sender no longer waits for the callbacks, which return True to dispatch() whatever they answer. Events are
+        dropped, oldest first, when more than maxlen are waiting, see EventWorker.
+        """
+        for signal in signals:
+            if signal in self.REQUEST_SIGNALS:
+                raise ValueError('{} is answered synchronously'.format(signal))
 
-        # find the callback
         with self.data_lock:
-            for r in self.registrations:
-                if self._signals_equivalent(r['signal'], signal) and (
-                        r['sender'] == sender or r['sender'] == self.WILDCARD):
-                    callback = r['callback']
-                    break
-
-        if not callback:
-            return None
-
-        # call the callback
-        try:
-            return callback(sender=sender, signal=signal, data=data)
-        except TypeError as err:
-            output = "ERROR could not call {0}, err={1}".format(callback, err)
-            log.critical(output)
+            if self.worker is None:
+                self.worker = EventWorker(self.name, maxlen)
+            self.worker.maxlen = maxlen
+            self.async_signals = tuple(signals)
+            self._set_workers()
+
+    def disable_async(self):
+        """ Delivers all the events on the sender's thread again, once the queued ones are delivered """
+        with self.data_lock:
+            worker = self.worker
+            self.worker = None
+            self.async_signals = ()
+            self._set_workers()
+        if worker is not None:
+            worker.close()
 
-    def _signals_equivalent(self, s1, s2):
-        return_val = True
-        if type(s1) == type(s2) == str:
-            if (s1 != s2) and (s1 != self.WILDCARD) and (s2 != self.WILDCARD):
-                return_val = False
-        elif type(s1) == type(s2) == tuple:
-            if len(s1) == len(s2) == 3:
-                for i in range(3):
-                    if (s1[i] != s2[i]) and (s1[i] != self.WILDCARD) and (s2[i] != self.WILDCARD):
-                        return_val = False
-            else:
-                return_val = False
-        else:
-            return_val = False
+    # ======================== private =========================================
+
+    def _unsubscribe(self, registrations):
+        """ Removes registrations and their subscriptions (data_lock held) """
+        if not registrations:
+            return
+        removed = set(id(reg) for reg in registrations)
+        for sub in self._subscriptions:
+            if id(sub.registration) in removed:
+                registry.unsubscribe(sub)
+        self._subscriptions = tuple(sub for sub in self._subscriptions if id(sub.registration) not in removed)
+        self.registrations = tuple(reg for reg in self.registrations if id(reg) not in removed)
+
+    def _is_async(self, signal):
+        return self.worker is not None and any(self._signals_equivalent(signal, s) for s in self.async_signals)
+
+    def _set_workers(self):
+        """ Assigns the worker to the subscriptions (data_lock held) """
+        for sub in self._subscriptions:
+            sub.worker = self.worker if self._is_async(sub.signal) else None
 
-        return return_val
+    def _signals_equivalent(self, s1, s2):
+        return signals_equivalent(s1, s2)
 
     def _dispatch_protocol(self, signal, data):
         """ used to sent to the eventbus a signal and look whether someone responds or not"""
@@ -4,25 +4,139 @@
 # Released under the BSD 3-Clause license as published at the link below.
 # https://openwsn.atlassian.net/wiki/display/OW/License
 
-import copy
-import json
 import logging
+import struct
 import threading
+import time
+from bisect import bisect_left
+from itertools import accumulate
 
 from pydispatch import dispatcher
-from scapy.compat import raw
-from scapy.layers.inet import UDP
-from scapy.layers.inet6 import IPv6
 
+from openvisualizer.eventbus.eventworker import EventWorker
+from openvisualizer.motehandler.moteprobe.openhdlc import fcs16
 from openvisualizer.opentun.opentun import OpenTun
-from openvisualizer.utils import format_buf, calculate_fcs, format_ipv6_addr
+from openvisualizer.utils import format_buf
 
 log = logging.getLogger('EventBusMonitor')
 log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
+# ZEP header, the channel and length are filled in for each packet
+ZEP_HEADER = (
+    b'EX'  # Protocol ID String
+    + b'\x02'  # Protocol Version
+    + b'\x01'  # Type
+    + b'\x00'  # Channel ID
+    + b'\x00\x01'  # Device ID
+    + b'\x01'  # LQI/CRC mode
+    + b'\xff'
+    + b'\x01' * 8  # timestamp
+    + b'\x02' * 4  # sequence number
+    + b'\x00' * 10  # reserved
+    + b'\x00'  # length
+)
+ZEP_CHANNEL = 4
+ZEP_LENGTH = 31
+
+# IEEE802.15.4 data frame header with dummy values, without the addresses
+MAC_HEADER = bytes([
+    0x41, 0xcc,  # frame control
+    0x66,  # sequence number
+    0xfe, 0xca,  # destination PAN ID
+])
+
+# IPv6 and UDP headers of the debug packets, sent from and to the address of the TUN interface, the lengths and the
+# checksum are filled in for each packet
+ZEP_PORT = 17754
+DEBUG_ADDR = bytes(OpenTun.IPV6PREFIX + OpenTun.IPV6HOST)
+IPV6_UDP_HEADER = struct.pack('>IHBB16s16sHHHH', 6 << 28, 0, 17, 64, DEBUG_ADDR, DEBUG_ADDR, 0, ZEP_PORT, 0, 0)
+IPV6_PAYLOAD_LENGTH = 4
+UDP_LENGTH = 44
+UDP_CHECKSUM = 46
+UDP_HEADER_LEN = 8
+# one's complement sum (modulo 0xffff) of the constant words of the UDP pseudo-header and header: addresses, next
+# header and ports
+UDP_PARTIAL_SUM = (int.from_bytes(DEBUG_ADDR + DEBUG_ADDR, 'big') + 17 + ZEP_PORT) % 0xffff
+
+
+# ============================ class ===================================
+
+class _SignalStats(object):
+    """
+    Counters of the events of one (sender, signal), as seen by one sending thread.
+
+    intervals[i] counts the times between two events shorter than 2**i microseconds, as in ingeststats.Histogram. The
+    events are also counted per window of RATE_WINDOW seconds, in the current window and the one before, for the rate.
+    """
+
+    NUM_BUCKETS = 24
+    RATE_WINDOW = 5.0
+
+    __slots__ = ('num', 'first', 'last', 'intervals', 'window', 'window_num', 'previous_num')
+
+    def __init__(self, now):
+        self.num = 0
+        self.first = now
+        self.last = now
+        self.intervals = [0] * self.NUM_BUCKETS
+        self.window = int(now / self.RATE_WINDOW)
+        self.window_num = 0
+        self.previous_num = 0
+
+    def copy(self):
+        other = _SignalStats(self.first)
+        other.num = self.num
+        other.last = self.last
+        other.intervals = list(self.intervals)
+        other.window = self.window
+        other.window_num = self.window_num
+        other.previous_num = self.previous_num
+        return other
+
+    def merge(self, other):
+        self.num += other.num
+        self.first = min(self.first, other.first)
+        self.last = max(self.last, other.last)
+        self.intervals = [a + b for a, b in zip(self.intervals, other.intervals)]
+        window = max(self.window, other.window)
+        window_num, previous_num = self.window_counts(window)
+        other_window_num, other_previous_num = other.window_counts(window)
+        self.window = window
+        self.window_num = window_num + other_window_num
+        self.previous_num = previous_num + other_previous_num
+
+    def window_counts(self, window):
+        """ Returns the number of events counted in window and in the window before """
+        if window <= self.window:
+            return self.window_num, self.previous_num
+        if window == self.window + 1:
+            return 0, self.window_num
+        return 0, 0
+
+    def rate(self, now):
+        """ Events per second over the last RATE_WINDOW seconds, the previous window weighted by its overlap """
+        position = now / self.RATE_WINDOW
+        window = int(position)
+        window_num, previous_num = self.window_counts(window)
+        return (window_num + previous_num * (1.0 - (position - window))) / self.RATE_WINDOW
+
+    def percentiles(self, *ps):
+        """ Returns upper bounds, in seconds, of the percentiles of the time between two events """
+        seen = list(accumulate(self.intervals))
+        if not seen[-1]:
+            return [0.0] * len(ps)
+        return [(1 << bisect_left(seen, seen[-1] * p / 100.0)) / 1e6 for p in ps]
+
+
+# ============================ class ===================================
 
 class EventBusMonitor:
+    # the signals carrying the mesh packets exported to wireshark
+    ZEP_SIGNALS = ('wirelessTxStart', 'fromMote.data', 'fromMote.sniffedPacket', 'bytesToMesh')
+
+    STATS_FIELDS = ['sender', 'signal', 'num', 'rate']
+    INTERVAL_FIELDS = ['interval_mean', 'interval_p50', 'interval_p90', 'interval_p99', 'interval_max', 'intervals']
 
     def __init__(self, wireshark_debug):
 
@@ -33,11 +147,19 @@ class EventBusMonitor:
 
         # local variables
         self.data_lock = threading.Lock()
-        self.stats = {}
+        # each sending thread counts its events in its own dictionary (sender, signal) -> _SignalStats, without
+        # locking, the dictionaries of all the threads are merged by get_stats()
+        self._local = threading.local()
+        self._thread_stats = []
+        # the counters of the threads which exited, merged once
+        self._exited_stats = {}
         self.wireshark_debug_enabled = wireshark_debug
         self.dagoot_eui64 = [0x00] * 8
         self.sim_mode = False
 
+        # the EventWorker wrapping and exporting the ZEP debug packets, None while done on the sender's thread
+        self.worker = None
+
         # give this instance a name
         self.name = 'EventBusMonitor'
 
@@ -46,23 +168,39 @@ class EventBusMonitor:
 
     # ======================== public ==========================================
 
-    def get_stats(self):
-
-        # get a copy of stats
-        with self.data_lock:
-            temp_stats = copy.deepcopy(self.stats)
+    @property
+    def stats(self):
+        """ The number of events per (sender, signal) """
+        return {key: s.num for key, s in self._merge().items()}
 
-        # format as a dictionary
-        return_val = [
-            {
-                'sender': k[0],
-                'signal': k[1],
-                'num': v,
-            } for (k, v) in temp_stats.items()
-        ]
+    def get_stats(self, intervals=False):
+        """
+        Returns a snapshot of the event statistics, a dictionary with the names of the 'fields' and the 'rows', one
+        list of values per (sender, signal), see STATS_FIELDS, followed by INTERVAL_FIELDS if intervals is set.
 
-        # send back JSON string
-        return json.dumps(return_val)
+        The rate is the number of events per second over the last seconds (see _SignalStats.RATE_WINDOW). The intervals
+        are the times between two events in seconds, measured per sending thread: their mean, upper bounds of their
+        percentiles and their histogram, the number of intervals shorter than 2**i microseconds for i in
+        range(_SignalStats.NUM_BUCKETS), the last bucket counting also the longer ones.
+        """
+        merged = self._merge()
+        now = time.monotonic()
+        rows = []
+        for (sender, signal), s in merged.items():
+            row = [
+                sender if isinstance(sender, str) else str(sender),
+                signal if isinstance(signal, str) else str(signal),
+                float(s.num),
+                s.rate(now),
+            ]
+            if intervals:
+                row.append((s.last - s.first) / (s.num - 1) if s.num > 1 else 0.0)
+                row += s.percentiles(50, 90, 99, 100)
+                row.append(list(s.intervals))
+            rows.append(row)
+
+        fields = self.STATS_FIELDS + self.INTERVAL_FIELDS if intervals else self.STATS_FIELDS
+        return {'fields': fields, 'rows': rows}
 
     def set_wireshark_debug(self, is_enabled):
         """
@@ -74,16 +212,49 @@ class EventBusMonitor:
         log.info('%s export of ZEP mesh debug packets to Internet',
                  'Enabled' if self.wireshark_debug_enabled else 'Disabled')
 
+    def enable_async(self, maxlen=EventWorker.MAXLEN):
+        """ Wraps and exports the ZEP debug packets on a worker thread, instead of the thread sending the events """
+        with self.data_lock:
+            if self.worker is None:
+                self.worker = EventWorker(self.name, maxlen)
+            self.worker.maxlen = maxlen
+
+    def disable_async(self):
+        with self.data_lock:
+            worker = self.worker
+            self.worker = None
+        if worker is not None:
+            worker.close()
+
     # ======================== private =========================================
 
     def _eventbus_notification(self, signal, sender, data):
         """ Adds the signal to stats log and performs signal-specific handling """
 
-        with self.data_lock:
-            key = (sender, signal)
-            if key not in self.stats:
-                self.stats[key] = 0
-            self.stats[key] += 1
+        now = time.monotonic()
+        try:
+            stats = self._local.stats
+        except AttributeError:
+            stats = self._local.stats = {}
+            with self.data_lock:
+                self._thread_stats.append((threading.current_thread(), stats))
+
+        key = (sender, signal)
+        signal_stats = stats.get(key)
+        if signal_stats is None:
+            signal_stats = stats[key] = _SignalStats(now)
+        else:
+            # the last bucket holds everything above 4 seconds
+            bucket = int((now - signal_stats.last) * 1e6).bit_length()
+            signal_stats.intervals[min(bucket, _SignalStats.NUM_BUCKETS - 1)] += 1
+        window = int(now / _SignalStats.RATE_WINDOW)
+        if window != signal_stats.window:
+            signal_stats.previous_num = signal_stats.window_num if window == signal_stats.window + 1 else 0
+            signal_stats.window = window
+            signal_stats.window_num = 0
+        signal_stats.num += 1
+        signal_stats.window_num += 1
+        signal_stats.last = now
 
         if signal == 'infoDagRoot' and data['isDAGroot'] == 1:
             self.dagoot_eui64 = data['eui64'][:]
@@ -92,141 +263,144 @@ class EventBusMonitor:
             # this signal only exists is simulation mode
             self.sim_mode = True
 
-        if self.wireshark_debug_enabled:
+        if self.wireshark_debug_enabled and signal in self.ZEP_SIGNALS:
+            worker = self.worker
+            if worker is not None:
+                worker.put(self._export_debug_packet, sender, signal, data)
+            else:
+                self._export_debug_packet(sender, signal, data)
 
-            if self.sim_mode:
-                # simulation mode
+    def _export_debug_packet(self, sender, signal, data):
+        """ Exports a copy of the mesh packets carried by the event, as ZEP packets, when wireshark debug is on """
 
-                if signal == 'wirelessTxStart':
-                    # Forwards a copy of the packet exchanged between simulated motes
-                    # to the tun interface for debugging.
+        if self.sim_mode:
+            # simulation mode
 
-                    (mote_id, frame, frequency) = data
+            if signal == 'wirelessTxStart':
+                # Forwards a copy of the packet exchanged between simulated motes
+                # to the tun interface for debugging.
 
-                    if log.isEnabledFor(logging.DEBUG):
-                        output = []
-                        output += ['']
-                        output += ['- moteId:    {0}'.format(mote_id)]
-                        output += ['- frame:     {0}'.format(format_buf(frame))]
-                        output += ['- frequency: {0}'.format(frequency)]
-                        output = '\n'.join(output)
-                        log.debug(output)
+                (mote_id, frame, frequency) = data
 
-                    assert len(frame) >= 1 + 2  # 1 for length byte, 2 for CRC
+                if log.isEnabledFor(logging.DEBUG):
+                    output = []
+                    output += ['']
+                    output += ['- moteId:    {0}'.format(mote_id)]
+                    output += ['- frame:     {0}'.format(format_buf(frame))]
+                    output += ['- frequency: {0}'.format(frequency)]
+                    output = '\n'.join(output)
+                    log.debug(output)
 
-                    # cut frame in pieces
-                    _ = frame[0]  # length
-                    body = frame[1:-2]
-                    _ = frame[-2:]  # crc
+                assert len(frame) >= 1 + 2  # 1 for length byte, 2 for CRC
 
-                    # wrap with zep header
-                    zep = self._wrap_zep_crc(body, frequency)
-                    self._dispatch_mesh_debug_packet(zep)
+                # cut frame in pieces
+                _ = frame[0]  # length
+                body = frame[1:-2]
+                _ = frame[-2:]  # crc
 
-            else:
-                # non-simulation mode
+                # wrap with zep header
+                zep = self._wrap_zep_crc(body, frequency)
+                self._dispatch_mesh_debug_packet(zep)
+
+        else:
+            # non-simulation mode
+
+            if signal == 'fromMote.data':
+                # Forwards a copy of the data received from a mode to the Internet interface for debugging.
+                (previous_hop, lowpan) = data
 
-                if signal == 'fromMote.data':
-                    # Forwards a copy of the data received from a mode to the Internet interface for debugging.
-                    (previous_hop, lowpan) = data
+                zep = self._wrap_mac_and_zep(previous_hop=previous_hop, next_hop=self.dagoot_eui64, lowpan=lowpan)
+                self._dispatch_mesh_debug_packet(zep)
 
-                    zep = self._wrap_mac_and_zep(previous_hop=previous_hop, next_hop=self.dagoot_eui64, lowpan=lowpan)
-                    self._dispatch_mesh_debug_packet(zep)
+            if signal == 'fromMote.sniffedPacket':
+                body = data[0:-3]
+                _ = data[-3:-1]  # crc
+                frequency = data[-1]
 
-                if signal == 'fromMote.sniffedPacket':
-                    body = data[0:-3]
-                    _ = data[-3:-1]  # crc
-                    frequency = data[-1]
+                # wrap with zep header
+                zep = self._wrap_zep_crc(body, frequency)
+                self._dispatch_mesh_debug_packet(zep)
 
-                    # wrap with zep header
-                    zep = self._wrap_zep_crc(body, frequency)
-                    self._dispatch_mesh_debug_packet(zep)
+            if signal == 'bytesToMesh':
+                # Forwards a copy of the 6LoWPAN packet destined for the mesh to the tun interface for debugging.
+                (next_hop, lowpan) = data
 
-                if signal == 'bytesToMesh':
-                    # Forwards a copy of the 6LoWPAN packet destined for the mesh to the tun interface for debugging.
-                    (next_hop, lowpan) = data
+                zep = self._wrap_mac_and_zep(previous_hop=self.dagoot_eui64, next_hop=next_hop, lowpan=lowpan)
+                self._dispatch_mesh_debug_packet(zep)
 
-                    zep = self._wrap_mac_and_zep(previous_hop=self.dagoot_eui64, next_hop=next_hop, lowpan=lowpan)
-                    self._dispatch_mesh_debug_packet(zep)
+    def _merge(self):
+        """ Sums the counters of all the threads, per (sender, signal) """
+        with self.data_lock:
+            # the dictionaries of the threads which exited are merged once and dropped, the merged counters are new
+            # objects: the ones returned by a previous call are never changed
+            running = []
+            for thread, stats in self._thread_stats:
+                if thread.is_alive():
+                    running.append((thread, stats))
+                    continue
+                for key, s in stats.items():
+                    total = self._exited_stats.get(key)
+                    if total is not None:
+                        s = s.copy()
+                        s.merge(total)
+                    self._exited_stats[key] = s
+            self._thread_stats = running
+            thread_stats = [stats for _, stats in running] + [dict(self._exited_stats)]
+
+        merged = {}
+        copied = set()
+        for stats in thread_stats:
+            # copying a dictionary is atomic, iterating over it while its thread adds a key is not
+            for key, s in stats.copy().items():
+                total = merged.get(key)
+                if total is None:
+                    # most (sender, signal) are only sent by one thread, their counters are read as they are
+                    merged[key] = s
+                    continue
+                if key not in copied:
+                    total = merged[key] = total.copy()
+                    copied.add(key)
+                total.merge(s)
+        return merged
 
     @staticmethod
     def _wrap_mac_and_zep(previous_hop: bytes, next_hop: bytes, lowpan: bytes):
         """
         Returns Exegin ZEP protocol header and dummy 802.15.4 header wrapped around outgoing 6LoWPAN layer packet.
         """
-
-        phop = list(previous_hop[:])
-        phop.reverse()
-        nhop = list(next_hop[:])
-        nhop.reverse()
-
-        # ZEP
-        zep = [ord('E'), ord('X')]  # Protocol ID String
-        zep += [0x02]  # Protocol Version
-        zep += [0x01]  # Type
-        zep += [0x00]  # Channel ID
-        zep += [0x00, 0x01]  # Device ID
-        zep += [0x01]  # LQI/CRC mode
-        zep += [0xff]
-        zep += [0x01] * 8  # timestamp
-        zep += [0x02] * 4  # sequence number
-        zep += [0x00] * 10  # reserved
-        zep += [21 + len(lowpan) + 2]  # length
-
-        # IEEE802.15.4                 (data frame with dummy values)
-        mac = [0x41, 0xcc]  # frame control
-        mac += [0x66]  # sequence number
-        mac += [0xfe, 0xca]  # destination PAN ID
-        mac += nhop  # destination address
-        mac += phop  # source address
-        mac += list(lowpan)
-        # CRC
-        mac += calculate_fcs(mac)
-
-        return zep + mac
+        # destination and source addresses
+        mac = MAC_HEADER + bytes(next_hop[::-1]) + bytes(previous_hop[::-1]) + bytes(lowpan)
+        return EventBusMonitor._wrap_zep_crc(mac, 0)
 
     @staticmethod
     def _wrap_zep_crc(body, frequency):
-
-        # ZEP header
-        zep = [ord('E'), ord('X')]  # Protocol ID String
-        zep += [0x02]  # Protocol Version
-        zep += [0x01]  # Type
-        zep += [frequency]  # Channel ID
-        zep += [0x00, 0x01]  # Device ID
-        zep += [0x01]  # LQI/CRC mode
-        zep += [0xff]
-        zep += [0x01] * 8  # timestamp
-        zep += [0x02] * 4  # sequence number
-        zep += [0x00] * 10  # reserved
-        zep += [len(body) + 2]  # length
-
-        # mac frame
-        mac = body
-        mac += calculate_fcs(mac)
-
-        return zep + mac
+        """ Returns the ZEP header wrapped around a 802.15.4 frame, followed by its FCS """
+        body = bytes(body)
+        zep = bytearray(ZEP_HEADER)
+        zep[ZEP_CHANNEL] = frequency
+        zep[ZEP_LENGTH] = len(body) + 2
+        zep += body
+        zep += fcs16(body, 0).to_bytes(2, 'little')
+        return zep
 
     def _dispatch_mesh_debug_packet(self, zep):
         """
         Wraps ZEP-based debug packet, for outgoing mesh 6LoWPAN message, with UDP and IPv6 headers. Then forwards as
         an event to the Internet interface.
         """
+        dispatcher.send(sender=self.name, signal='v6ToInternet', data=list(self._wrap_ipv6_udp(zep)))
 
-        # UDP
-        udp = UDP(sport=0, dport=17754)
-        udp.add_payload(bytes(zep))
-
-        # Common address for source and destination
-        addr = []
-        addr += OpenTun.IPV6PREFIX
-        addr += OpenTun.IPV6HOST
-        addr = format_ipv6_addr(addr)
-
-        # IP
-        ip = IPv6(version=6, tc=0, src=addr, hlim=64, dst=addr)
-        ip = ip / udp
-
-        data = [b for b in raw(ip)]
-
-        dispatcher.send(sender=self.name, signal='v6ToInternet', data=data)
+    @staticmethod
+    def _wrap_ipv6_udp(zep):
+        """ Returns the IPv6 packet carrying zep, the headers are copied from a template and their lengths filled in """
+        length = UDP_HEADER_LEN + len(zep)
+        packet = bytearray(IPV6_UDP_HEADER)
+        packet += zep
+        struct.pack_into('>H', packet, IPV6_PAYLOAD_LENGTH, length)
+        struct.pack_into('>H', packet, UDP_LENGTH, length)
+
+        # the one's complement sum of 16-bit words is their concatenation modulo 0xffff, a 0 checksum is sent as 0xffff
+        words = int.from_bytes(zep + b'\x00' if len(zep) & 1 else zep, 'big')
+        checksum = 0xffff - (UDP_PARTIAL_SUM + 2 * length + words) % 0xffff
+        struct.pack_into('>H', packet, UDP_CHECKSUM, checksum)
+        return packet
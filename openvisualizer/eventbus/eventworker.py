@@ -0,0 +1,120 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+import logging
+import threading
+import time
+from collections import deque
+
+from openvisualizer.motehandler.ingeststats import Histogram
+
+log = logging.getLogger('EventWorker')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+
+# ============================ class ===================================
+
+class EventWorker(object):
+    """
+    Bounded queue of events and the thread delivering them to the callbacks of one subscriber.
+
+    The sender only queues the event and goes on, the callbacks run in order on the worker thread. When the queue
+    is full the oldest event is dropped: the sender, often the serial reader of a mote, is never held back.
+
+    The lag of an event is the time it spent in the queue, from the dispatch until its callback starts.
+    """
+
+    MAXLEN = 1024
+
+    def __init__(self, name, maxlen=MAXLEN):
+        self.name = name
+        self.maxlen = maxlen
+
+        self._queue = deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+
+        # written by the senders (lock held)
+        self.queued = 0
+        self.dropped = 0
+        self.max_depth = 0
+        # written by the worker thread
+        self.delivered = 0
+        self.errors = 0
+        self.lag = Histogram()
+        self.duration = Histogram()
+
+        self._thread = threading.Thread(target=self._run, name='EventWorker@{}'.format(name))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._queue)
+
+    # ======================== public ==================================
+
+    def put(self, callback, sender, signal, data):
+        """ Queues the delivery of an event to callback, returns False if an event had to be dropped """
+        with self._lock:
+            if self._closed:
+                return False
+
+            room = True
+            if len(self._queue) >= self.maxlen:
+                self._queue.popleft()
+                self.dropped += 1
+                room = False
+
+            self._queue.append((time.monotonic(), callback, sender, signal, data))
+            self.queued += 1
+            if len(self._queue) > self.max_depth:
+                self.max_depth = len(self._queue)
+
+            self._not_empty.notify()
+            return room
+
+    def close(self, timeout=None):
+        """ Delivers the events already queued, then stops the worker thread """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def to_dict(self):
+        return {
+            'depth': len(self._queue),
+            'max_depth': self.max_depth,
+            'queued': self.queued,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'lag': self.lag.to_dict(),
+            'duration': self.duration.to_dict(),
+        }
+
+    # ======================== private =================================
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue:
+                    if self._closed:
+                        return
+                    self._not_empty.wait()
+                stamp, callback, sender, signal, data = self._queue.popleft()
+
+            start = time.monotonic()
+            self.lag.add(start - stamp)
+            try:
+                callback(sender=sender, signal=signal, data=data)
+            except Exception:
+                self.errors += 1
+                log.exception('{}: error delivering {} from {}'.format(self.name, signal, sender))
+            self.duration.add(time.monotonic() - start)
+            self.delivered += 1
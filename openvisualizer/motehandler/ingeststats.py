@@ -0,0 +1,118 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+"""
+Counters and histograms describing the traffic received from the motes.
+
+A MoteProbe or MoteConnector only updates its statistics while its 'stats' attribute holds one of these objects, the
+attribute is None (and the instrumentation reduced to a single test) otherwise. Each counter is written by a single
+thread, readers get a consistent enough snapshot without locking.
+"""
+
+import time
+
+
+# ============================ class ===================================
+
+class Histogram(object):
+    """ Histogram of durations, bucket i counts the durations shorter than 2**i microseconds. """
+
+    NUM_BUCKETS = 24  # the last bucket holds everything above 4 seconds
+
+    def __init__(self):
+        self.buckets = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[min(int(seconds * 1e6).bit_length(), self.NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """ Returns an upper bound, in seconds, of the p-th percentile """
+        rank = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << i) / 1e6, self.max)
+        # the last bucket is unbounded
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': list(self.buckets),
+        }
+
+
+# ============================ class ===================================
+
+class ProbeStats(object):
+    """ Ingest counters of a MoteProbe. """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.bytes = 0
+        self.frames = 0
+        self.hdlc_errors = 0
+        self.garbage_bytes = 0
+        # from the end of a frame on the serial line until the parser returns
+        self.latency = Histogram()
+
+    def to_dict(self):
+        """ Returns the counters and rates since the statistics were enabled (byte counts as floats for XML-RPC) """
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        received = self.frames + self.hdlc_errors
+        return {
+            'elapsed': elapsed,
+            'bytes': float(self.bytes),
+            'bytes_per_sec': self.bytes / elapsed,
+            'frames': self.frames,
+            'frames_per_sec': self.frames / elapsed,
+            'hdlc_errors': self.hdlc_errors,
+            'hdlc_error_rate': self.hdlc_errors / received if received else 0.0,
+            'garbage_bytes': float(self.garbage_bytes),
+            'latency': self.latency.to_dict(),
+        }
+
+
+# ============================ class ===================================
+
+class ConnectorStats(object):
+    """ Parsing counters of a MoteConnector. """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.frames = 0
+        self.parse_errors = 0
+        self.frame_types = {}
+        self.parse_time = Histogram()
+
+    def add(self, event_sub_type, seconds):
+        self.frames += 1
+        self.frame_types[event_sub_type] = self.frame_types.get(event_sub_type, 0) + 1
+        self.parse_time.add(seconds)
+
+    def to_dict(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        return {
+            'elapsed': elapsed,
+            'frames': self.frames,
+            'frames_per_sec': self.frames / elapsed,
+            'parse_errors': self.parse_errors,
+            'frame_types': dict(self.frame_types),
+            'parse_time': self.parse_time.to_dict(),
+        }
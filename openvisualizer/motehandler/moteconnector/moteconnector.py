@@ -7,6 +7,7 @@
 import logging
 import socket
 import threading
+import time
 
 from pydispatch import dispatcher
 
@@ -36,6 +37,8 @@ class MoteConnector(EventBusClient):
         self.state_lock = threading.Lock()
         self.network_prefix = None
         self._subscribed_data_for_dagroot = False
+        # parsing statistics, only collected while set to a ConnectorStats instance
+        self.stats = None
 
         # give this thread a name
         self.name = 'mote_connector@{0}'.format(self.serialport)
@@ -62,19 +65,30 @@ class MoteConnector(EventBusClient):
     def _send_to_parser(self, data):
 
         # log
-        log.debug("received input={0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received input={0}".format(data))
+
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
 
         # parse input
         try:
-            (event_sub_type, parsed_notif) = self.parser.parse_input(data)
+            (event_sub_type, parsed_notif) = self.parser.parse_input(memoryview(data))
             assert isinstance(event_sub_type, str)
         except parserexception.ParserException as err:
+            if stats is not None:
+                stats.parse_errors += 1
             # log
             log.error(str(err))
             pass
         else:
+            if stats is not None:
+                stats.add(event_sub_type, time.perf_counter() - start)
+
             if event_sub_type == 'status':
-                if self.received_status_notif:
+                # unchanged status elements are dropped by the parser when deduplication is enabled
+                if self.received_status_notif and parsed_notif is not None:
                     self.received_status_notif(parsed_notif)
             else:
                 # dispatch
@@ -155,7 +169,7 @@ class MoteConnector(EventBusClient):
             dispatcher.send(
                 sender=self.name,
                 signal='fromMoteConnector@' + self.serialport,
-                data=''.join([chr(c) for c in data_to_send]),
+                data=bytes(data_to_send),
             )
 
         except socket.error as err:
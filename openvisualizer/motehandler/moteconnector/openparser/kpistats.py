@@ -0,0 +1,243 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+"""
+Running aggregates of the uinject KPIs, updated in constant time and memory per packet.
+
+Every aggregate can be merged with another one of the same kind, to combine the KPIs computed over several parts of
+a capture (see openvisualizer.analytics).
+"""
+
+import math
+import random
+
+
+# ============================ class ===================================
+
+class RunningStats(object):
+    """ Count, mean, variance (Welford's algorithm), minimum and maximum of a stream of numbers. """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        count = self.count = self.count + 1
+        delta = value - self.mean
+        mean = self.mean = self.mean + delta / count
+        self._m2 += delta * (value - mean)
+        if count == 1:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+
+# ============================ class ===================================
+
+class CounterBitmap(object):
+    """
+    The distinct values received of a 16-bit packet counter, in one 8KB bitmap per lap of the counter.
+
+    Each counter is unwrapped to the value closest to the highest one received so far, i.e. within half a lap: the laps
+    are counted as long as fewer than 32768 packets in a row are lost. min and max are unwrapped values.
+    """
+
+    SIZE = 1 << 16
+    HALF = SIZE >> 1
+
+    def __init__(self):
+        # lap -> bitmap of the counters received during that lap
+        self.laps = {}
+        self.distinct = 0
+        self.first = None
+        self.min = None
+        self.max = None
+
+    def add(self, counter):
+        value = self._unwrap(counter)
+        bits = self.laps.get(value >> 16)
+        if bits is None:
+            bits = self.laps[value >> 16] = bytearray(self.SIZE >> 3)
+        index = (value & 0xffff) >> 3
+        mask = 1 << (value & 7)
+        if not bits[index] & mask:
+            bits[index] |= mask
+            self.distinct += 1
+            if self.distinct == 1:
+                self.first = self.min = self.max = value
+            elif value < self.min:
+                self.min = value
+            elif value > self.max:
+                self.max = value
+
+    def merge(self, other):
+        """ Adds the counters of other, which were received after (or around) those of self """
+        if not other.distinct:
+            return
+
+        # other unwrapped its counters from the lap of its first one, shift them to the lap closest to self
+        shift = self._unwrap(other.first) - other.first
+        for lap, other_bits in other.laps.items():
+            lap += shift >> 16
+            other_bits = int.from_bytes(other_bits, 'little')
+            bits = int.from_bytes(self.laps.get(lap, b''), 'little')
+            merged = bits | other_bits
+            self.laps[lap] = bytearray(merged.to_bytes(self.SIZE >> 3, 'little'))
+            self.distinct += bin(merged).count('1') - bin(bits).count('1')
+
+        if self.first is None:
+            self.first, self.min, self.max = other.first, other.min, other.max
+        else:
+            self.min = min(self.min, other.min + shift)
+            self.max = max(self.max, other.max + shift)
+
+    @property
+    def pdr(self):
+        """ Distinct counters received over the span of the counters received """
+        if not self.distinct:
+            return 0.0
+        return self.distinct / (1 + self.max - self.min)
+
+    def _unwrap(self, counter):
+        if self.max is None:
+            return counter
+        return self.max + (counter - self.max + self.HALF) % self.SIZE - self.HALF
+
+
+# ============================ class ===================================
+
+class Reservoir(object):
+    """ A uniform sample of at most size values of a stream (algorithm R), to estimate percentiles. """
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.count = 0
+        self.samples = []
+        self._rng = random.Random(seed)
+
+    def add(self, value):
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < self.size:
+                self.samples[slot] = value
+
+    def merge(self, other):
+        """ Keeps a sample of both streams, each one represented in proportion to its length """
+        count = self.count + other.count
+        if len(self.samples) + len(other.samples) <= self.size:
+            self.samples += other.samples
+        else:
+            pools = [list(self.samples), list(other.samples)]
+            for pool in pools:
+                self._rng.shuffle(pool)
+            weight = self.count / count
+            samples = []
+            while len(samples) < self.size and (pools[0] or pools[1]):
+                pool = pools[0] if pools[0] and (not pools[1] or self._rng.random() < weight) else pools[1]
+                samples.append(pool.pop())
+            self.samples = samples
+        self.count = count
+
+    def percentile(self, p):
+        """ Returns the p-th percentile (nearest rank) of the sample, None if empty """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(int(math.ceil(len(ordered) * p / 100.0)) - 1, 0)]
+
+
+# ============================ class ===================================
+
+class UinjectKpi(object):
+    """ KPIs of the uinject packets received from one mote. """
+
+    def __init__(self, latency_samples=0):
+        self.counters = CounterBitmap()
+        self.latency = RunningStats()
+        self.cells_tx = RunningStats()
+        self.cells_rx = RunningStats()
+        self.duty_cycle = RunningStats()
+        # latency percentiles, only with a reservoir
+        self.latency_reservoir = Reservoir(latency_samples) if latency_samples else None
+
+    def add(self, counter, latency, cells_tx, cells_rx, duty_cycle):
+        self.counters.add(counter)
+        self.latency.add(latency)
+        self.cells_tx.add(cells_tx)
+        self.cells_rx.add(cells_rx)
+        self.duty_cycle.add(duty_cycle)
+        if self.latency_reservoir is not None:
+            self.latency_reservoir.add(latency)
+
+    def merge(self, other):
+        self.counters.merge(other.counters)
+        self.latency.merge(other.latency)
+        self.cells_tx.merge(other.cells_tx)
+        self.cells_rx.merge(other.cells_rx)
+        self.duty_cycle.merge(other.duty_cycle)
+        if self.latency_reservoir is not None and other.latency_reservoir is not None:
+            self.latency_reservoir.merge(other.latency_reservoir)
+
+    @property
+    def packets(self):
+        return self.latency.count
+
+    @property
+    def avg_latency(self):
+        return self.latency.mean
+
+    @property
+    def avg_pdr(self):
+        return self.counters.pdr
+
+    @property
+    def avg_cells_usage(self):
+        """ Average number of cells used for tx, over the 64 cells of the cell list """
+        return self.cells_tx.mean / 64.0
+
+    def to_dict(self):
+        kpi = {
+            'packets': self.packets,
+            'avg_latency': self.avg_latency,
+            'std_latency': self.latency.stddev,
+            'min_latency': self.latency.min,
+            'max_latency': self.latency.max,
+            'avg_pdr': self.avg_pdr,
+            'avg_cellsUsage': self.avg_cells_usage,
+            'avg_cellsUsedRx': self.cells_rx.mean,
+            'avg_dutyCycle': self.duty_cycle.mean,
+        }
+        if self.latency_reservoir is not None:
+            for p in (50, 90, 99):
+                kpi['p{}_latency'.format(p)] = self.latency_reservoir.percentile(p)
+        return kpi
@@ -53,6 +53,14 @@ class OpenParser(parser.Parser):
         self.parser_success = ParserLogs(self.SERFRAME_MOTE2PC_SUCCESS, stack_defines)
         self.parser_error = ParserLogs(self.SERFRAME_MOTE2PC_ERROR, stack_defines)
         self.parser_critical = ParserLogs(self.SERFRAME_MOTE2PC_CRITICAL, stack_defines)
+        self.log_parsers = [
+            self.parser_verbose,
+            self.parser_info,
+            self.parser_warning,
+            self.parser_success,
+            self.parser_error,
+            self.parser_critical,
+        ]
         self.parser_data = parserdata.ParserData(mqtt_broker, mote_port)
         self.parser_packet = parserpacket.ParserPacket()
         self.parser_printf = parserprintf.ParserPrintf()
@@ -8,6 +8,7 @@ import logging
 from abc import ABCMeta
 
 from openvisualizer.motehandler.moteconnector.openparser.parserexception import ParserException
+from openvisualizer.utils import format_buf
 
 log = logging.getLogger('Parser')
 log.setLevel(logging.ERROR)
@@ -47,12 +48,16 @@ class Parser(object):
         self.header_parsing_keys = []
         self.named_tuple = {}
 
+        # list of (index, table), each table maps the 256 values of the byte at index to its sub-parser (or None)
+        self.dispatch_tables = []
+
     # ======================== public ==========================================
 
     def parse_input(self, data):
 
         # log
-        log.debug("received data: {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received data: {0}".format(format_buf(data)))
 
         # ensure data not short longer than header
         self._check_length(data)
@@ -61,9 +66,10 @@ class Parser(object):
         # TODO
 
         # call the next header parser
-        for key in self.parsing_keys:
-            if data[key.index] == key.val:
-                return key.parser.parse_input(data[self.header_length:])
+        for index, table in self.dispatch_tables:
+            sub_parser = table[data[index]]
+            if sub_parser is not None:
+                return sub_parser.parse_input(data[self.header_length:])
 
         # if you get here, no key was found
         raise ParserException(ParserException.ExceptionType.NO_KEY, "type={0} (\"{1}\")".format(data[0], chr(data[0])))
@@ -75,4 +81,16 @@ class Parser(object):
             raise ParserException(ParserException.ExceptionType.TOO_SHORT)
 
     def _add_sub_parser(self, index=None, val=None, parser=None):
-        self.parsing_keys.append(ParsingKey(index, val, parser))
+        key = ParsingKey(index, val, parser)
+        self.parsing_keys.append(key)
+
+        for table_index, table in self.dispatch_tables:
+            if table_index == key.index:
+                break
+        else:
+            table = [None] * 256
+            self.dispatch_tables.append((key.index, table))
+
+        # like the keys, the first sub-parser registered for a value wins
+        if table[key.val] is None:
+            table[key.val] = key.parser
@@ -12,6 +12,8 @@ import threading
 import paho.mqtt.client as mqtt
 
 from openvisualizer.motehandler.moteconnector.openparser import parser
+from openvisualizer.motehandler.moteconnector.openparser.kpistats import UinjectKpi
+from openvisualizer.utils import format_buf
 
 log = logging.getLogger('ParserData')
 log.setLevel(logging.ERROR)
@@ -23,6 +25,15 @@ class ParserData(parser.Parser):
 
     UINJECT_MASK = 'uinject'
 
+    _UINJECT_MASK_BYTES = UINJECT_MASK.encode()
+    _ASN = struct.Struct('<BHH')
+    _ASN_DIFF = struct.Struct('<HHB')
+    _U16 = struct.Struct('<H')
+    _U32 = struct.Struct('<I')
+
+    # size of the per mote sample of latencies kept for percentiles, 0 keeps none
+    LATENCY_SAMPLES = 0
+
     def __init__(self, mqtt_broker_address, mote_port):
 
         # log
@@ -37,7 +48,9 @@ class ParserData(parser.Parser):
             'asn_0_1',  # H
         ]
 
+        # source mote id -> UinjectKpi
         self.avg_kpi = {}
+        self.latency_samples = self.LATENCY_SAMPLES
 
         self.mote_port = mote_port
         self.broker = mqtt_broker_address
@@ -69,7 +82,8 @@ class ParserData(parser.Parser):
 
     def parse_input(self, data):
         # log
-        log.debug("received data {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received data {0}".format(format_buf(data)))
 
         # ensure data not short longer than header
         self._check_length(data)
@@ -78,7 +92,7 @@ class ParserData(parser.Parser):
         # asn comes in the next 5bytes.
 
         asn_bytes = data[2:7]
-        (self._asn) = struct.unpack('<BHH', bytes(asn_bytes))
+        (self._asn) = self._ASN.unpack_from(data, 2)
 
         # source and destination of the message
         dest = data[7:15]
@@ -86,23 +100,27 @@ class ParserData(parser.Parser):
         # source is elided!!! so it is not there.. check that.
         source = data[15:23]
 
-        log.debug("destination address of the packet is {0} ".format("".join(hex(c) for c in dest)))
-        log.debug("source address (just previous hop) of the packet is {0} ".format("".join(hex(c) for c in source)))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("destination address of the packet is {0} ".format("".join(hex(c) for c in dest)))
+            log.debug("source address (just previous hop) of the packet is {0} ".format(
+                "".join(hex(c) for c in source)))
 
         # remove asn src and dest and mote id at the beginning.
         # this is a hack for latency measurements... TODO, move latency to an app listening on the corresponding port.
         # inject end_asn into the packet as well
         data = data[23:]
 
-        log.debug("packet without source, dest and asn {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("packet without source, dest and asn {0}".format(format_buf(data)))
 
         # when the packet goes to internet it comes with the asn at the beginning as timestamp.
 
         # cross layer trick here. capture UDP packet from udpLatency and get ASN to compute latency.
-        offset = 0
-        if len(data) > 37:
+        # the fields are read in place, at offsets counted back from the end of the packet
+        offset = len(data)
+        if offset > 37:
             offset -= 7
-            if self.UINJECT_MASK == ''.join(chr(i) for i in data[offset:]):
+            if data[offset:] == self._UINJECT_MASK_BYTES:
 
                 pkt_info = \
                     {
@@ -116,9 +134,9 @@ class ParserData(parser.Parser):
                     }
 
                 offset -= 2
-                pkt_info['counter'] = data[offset - 2] + 256 * data[offset - 1]  # counter sent by mote
+                pkt_info['counter'] = self._U16.unpack_from(data, offset - 2)[0]  # counter sent by mote
 
-                pkt_info['asn'] = struct.unpack('<I', ''.join([chr(c) for c in data[offset - 5:offset - 1]]))[0]
+                pkt_info['asn'] = self._U32.unpack_from(data, offset - 5)[0]
                 aux = data[offset - 5:offset]  # last 5 bytes of the packet are the ASN in the UDP latency packet
                 diff = ParserData._asn_diference(aux, asn_bytes)  # calculate difference
                 pkt_info['latency'] = diff  # compute time in slots
@@ -130,36 +148,29 @@ class ParserData(parser.Parser):
                 pkt_info['numCellsUsedRx'] = data[offset - 1]
                 offset -= 1
 
-                pkt_info['src_id'] = ''.join(['%02x' % x for x in [data[offset - 1], data[offset - 2]]])  # mote id
+                pkt_info['src_id'] = '{:02x}{:02x}'.format(data[offset - 1], data[offset - 2])  # mote id
                 src_id = pkt_info['src_id']
                 offset -= 2
 
-                num_ticks_on = struct.unpack('<I', ''.join([chr(c) for c in data[offset - 4:offset]]))[0]
+                num_ticks_on = self._U32.unpack_from(data, offset - 4)[0]
                 offset -= 4
 
-                num_ticks_in_total = struct.unpack('<I', ''.join([chr(c) for c in data[offset - 4:offset]]))[0]
+                num_ticks_in_total = self._U32.unpack_from(data, offset - 4)[0]
                 offset -= 4
 
                 pkt_info['dutyCycle'] = float(num_ticks_on) / float(num_ticks_in_total)  # duty cycle
 
-                # self.avg_kpi:
-                if src_id in self.avg_kpi:
-                    self.avg_kpi[src_id]['counter'].append(pkt_info['counter'])
-                    self.avg_kpi[src_id]['latency'].append(pkt_info['latency'])
-                    self.avg_kpi[src_id]['numCellsUsedTx'].append(pkt_info['numCellsUsedTx'])
-                    self.avg_kpi[src_id]['numCellsUsedRx'].append(pkt_info['numCellsUsedRx'])
-                    self.avg_kpi[src_id]['dutyCycle'].append(pkt_info['dutyCycle'])
-                else:
-                    self.avg_kpi[src_id] = {
-                        'counter': [pkt_info['counter']],
-                        'latency': [pkt_info['latency']],
-                        'numCellsUsedTx': [pkt_info['numCellsUsedTx']],
-                        'numCellsUsedRx': [pkt_info['numCellsUsedRx']],
-                        'dutyCycle': [pkt_info['dutyCycle']],
-                        'avg_cellsUsage': 0.0,
-                        'avg_latency': 0.0,
-                        'avg_pdr': 0.0,
-                    }
+                # running aggregates, constant time and memory per packet
+                kpi = self.avg_kpi.get(src_id)
+                if kpi is None:
+                    kpi = self.avg_kpi[src_id] = UinjectKpi(self.latency_samples)
+                kpi.add(
+                    pkt_info['counter'],
+                    pkt_info['latency'],
+                    pkt_info['numCellsUsedTx'],
+                    pkt_info['numCellsUsedRx'],
+                    pkt_info['dutyCycle'],
+                )
 
                 if self.mqtt_connected:
                     self.publish_kpi(src_id)
@@ -178,15 +189,15 @@ class ParserData(parser.Parser):
         event_type = 'data'
         # notify a tuple including source as one hop away nodes elide SRC address as can be inferred from MAC layer
         # header
-        return event_type, (source, data)
+        return event_type, (bytes(source), bytes(data))
 
     # ======================== private =========================================
 
     @staticmethod
     def _asn_diference(init, end):
 
-        asn_init = struct.unpack('<HHB', ''.join([chr(c) for c in init]))
-        asn_end = struct.unpack('<HHB', ''.join([chr(c) for c in end]))
+        asn_init = ParserData._ASN_DIFF.unpack_from(init)
+        asn_end = ParserData._ASN_DIFF.unpack_from(end)
         if asn_end[2] != asn_init[2]:  # 'byte4'
             return 0xFFFFFFFF
         else:
@@ -200,27 +211,14 @@ class ParserData(parser.Parser):
 
         payload = {'token': 123}
 
-        mote_data = self.avg_kpi[src_id]
-
-        self.avg_kpi[src_id]['avg_cellsUsage'] = \
-            float(sum(mote_data['numCellsUsedTx']) / len(mote_data['numCellsUsedTx'])) / float(64)
-
-        self.avg_kpi[src_id]['avg_latency'] = \
-            sum(self.avg_kpi[src_id]['latency']) / len(self.avg_kpi[src_id]['latency'])
-
-        mote_data['counter'].sort()  # sort the counter before calculating
-
-        self.avg_kpi[src_id]['avg_pdr'] = \
-            float(len(set(mote_data['counter']))) / float(1 + mote_data['counter'][-1] - mote_data['counter'][0])
-
         avg_pdr_all = 0.0
         avg_latency_all = 0.0
         avg_num_cells_usage_all = 0.0
 
-        for mote, data in self.avg_kpi.items():
-            avg_pdr_all += data['avg_pdr']
-            avg_latency_all += data['avg_latency']
-            avg_num_cells_usage_all += data['avg_cellsUsage']
+        for mote, kpi in self.avg_kpi.items():
+            avg_pdr_all += kpi.avg_pdr
+            avg_latency_all += kpi.avg_latency
+            avg_num_cells_usage_all += kpi.avg_cells_usage
 
         num_motes = len(self.avg_kpi)
         avg_pdr_all = avg_pdr_all / float(num_motes)
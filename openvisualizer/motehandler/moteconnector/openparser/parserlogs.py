@@ -6,12 +6,15 @@
 
 import logging
 import struct
+import threading
+import time
 
 import verboselogs
 from enum import IntEnum
 
 from openvisualizer.motehandler.moteconnector.openparser.parser import Parser
 from openvisualizer.motehandler.moteconnector.openparser.parserexception import ParserException
+from openvisualizer.utils import format_buf
 
 verboselogs.install()
 
@@ -23,6 +26,11 @@ log.addHandler(logging.NullHandler())
 class ParserLogs(Parser):
     HEADER_LENGTH = 1
 
+    _LOG = struct.Struct('>HBBhH')
+
+    # seconds during which the repetitions of a log entry are counted instead of logged, 0 logs every entry
+    AGGREGATION_WINDOW = 0
+
     class LogSeverity(IntEnum):
         SEVERITY_VERBOSE = ord('V')
         SEVERITY_INFO = ord('I')
@@ -31,6 +39,15 @@ class ParserLogs(Parser):
         SEVERITY_ERROR = ord('E')
         SEVERITY_CRITICAL = ord('C')
 
+    _LEVELS = {
+        LogSeverity.SEVERITY_VERBOSE: verboselogs.VERBOSE,
+        LogSeverity.SEVERITY_INFO: logging.INFO,
+        LogSeverity.SEVERITY_WARNING: logging.WARNING,
+        LogSeverity.SEVERITY_SUCCESS: verboselogs.SUCCESS,
+        LogSeverity.SEVERITY_ERROR: logging.ERROR,
+        LogSeverity.SEVERITY_CRITICAL: logging.CRITICAL,
+    }
+
     def __init__(self, severity, stack_defines):
         assert self.LogSeverity(severity)
 
@@ -43,29 +60,88 @@ class ParserLogs(Parser):
         # store params
         self.severity = severity
         self.stack_defines = stack_defines
+        self.level = self._LEVELS[severity]
+        self.aggregation_window = self.AGGREGATION_WINDOW
 
-        # store error info
+        # store error info, number of entries received per (mote_id, component, error_code)
         self.error_info = {}
 
+        # (mote_id, component, error_code) -> [start of the aggregation window, entries not logged since, arg1, arg2
+        # of the last one], the expired windows are logged (if they counted entries) and removed by _flush
+        self._windows = {}
+        self._windows_lock = threading.Lock()
+        self._next_flush = 0.0
+        self._flush_timer = None
+
     # ======================== public ==========================================
 
     def parse_input(self, data):
 
         # log
-        log.debug("received data {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received data {0}".format(format_buf(data)))
 
         # parse packet
         try:
-            mote_id, component, error_code, arg1, arg2 = struct.unpack('>HBBhH', bytes(data))
+            mote_id, component, error_code, arg1, arg2 = self._LOG.unpack(data)
         except struct.error:
             raise ParserException(ParserException.ExceptionType.DESERIALIZE.value,
                                   "could not extract data from {0}".format(data))
 
-        if (component, error_code) in self.error_info.keys():
-            self.error_info[(component, error_code)] += 1
-        else:
-            self.error_info[(component, error_code)] = 1
+        key = (mote_id, component, error_code)
+        self.error_info[key] = self.error_info.get(key, 0) + 1
+
+        # the entry is only turned into a string if it is going to be logged
+        if not log.isEnabledFor(self.level):
+            return 'error', bytes(data)
+
+        if not self.aggregation_window:
+            self._log_entry(key, arg1, arg2)
+            return 'error', bytes(data)
+
+        now = time.monotonic()
+        with self._windows_lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] < self.aggregation_window:
+                window[1] += 1
+                window[2:] = arg1, arg2
+                # the entries counted until the window closes are logged by then, even if no other entry comes
+                self._schedule_flush()
+                return 'error', bytes(data)
+
+            # this entry and the ones counted during the previous window
+            self._log_entry(key, arg1, arg2, 1 + window[1] if window is not None else 1)
+            self._windows[key] = [now, 0, arg1, arg2]
+
+            if now >= self._next_flush:
+                self._flush(now)
+
+        return 'error', bytes(data)
+
+    def flush(self):
+        """ Logs the entries still counted in the aggregation windows, and closes these windows """
+        with self._windows_lock:
+            self._flush(time.monotonic(), force=True)
+
+    def get_error_info(self):
+        """ Returns the number of entries received per mote, component and error code (XML-RPC friendly) """
+        with self._windows_lock:
+            self._flush(time.monotonic())
+
+        return [
+            {
+                'severity': chr(self.severity),
+                'mote_id': mote_id,
+                'component': self._translate_component(component),
+                'error_code': error_code,
+                'count': count,
+            } for (mote_id, component, error_code), count in list(self.error_info.items())
+        ]
 
+    # ======================== private =========================================
+
+    def _log_entry(self, key, arg1, arg2, repeats=1):
+        mote_id, component, error_code = key
         if error_code == 0x25:
             # replace args of sixtop command/return code id by string
             arg1 = self.stack_defines["sixtop_returncodes"][arg1]
@@ -77,26 +153,34 @@ class ParserLogs(Parser):
             MOTEID=mote_id,
             ERROR_DESC=self._translate_log_description(error_code, arg1, arg2),
         )
+        if repeats > 1:
+            output += " (x{0})".format(repeats)
 
         # log
-        if self.severity == self.LogSeverity.SEVERITY_VERBOSE:
-            log.verbose(output)
-        elif self.severity == self.LogSeverity.SEVERITY_INFO:
-            log.info(output)
-        elif self.severity == self.LogSeverity.SEVERITY_WARNING:
-            log.warning(output)
-        elif self.severity == self.LogSeverity.SEVERITY_SUCCESS:
-            log.success(output)
-        elif self.severity == self.LogSeverity.SEVERITY_ERROR:
-            log.error(output)
-        elif self.severity == self.LogSeverity.SEVERITY_CRITICAL:
-            log.critical(output)
-        else:
-            raise SystemError("unexpected severity={0}".format(self.severity))
-
-        return 'error', data
-
-    # ======================== private =========================================
+        log.log(self.level, output)
+
+    def _flush(self, now, force=False):
+        """ Logs the entries counted in the expired windows (all the windows if force) and removes them (lock held) """
+        for key, (start, count, arg1, arg2) in list(self._windows.items()):
+            if force or now - start >= self.aggregation_window:
+                del self._windows[key]
+                if count:
+                    self._log_entry(key, arg1, arg2, count)
+        self._next_flush = now + self.aggregation_window
+
+    def _schedule_flush(self):
+        """ Runs _flush once the current windows have expired, unless already scheduled (lock held) """
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.aggregation_window, self._flush_timeout)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_timeout(self):
+        with self._windows_lock:
+            self._flush_timer = None
+            self._flush(time.monotonic())
+            if any(window[1] for window in self._windows.values()):
+                self._schedule_flush()
 
     def _translate_component(self, component):
         try:
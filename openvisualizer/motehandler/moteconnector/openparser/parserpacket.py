@@ -7,6 +7,7 @@
 import logging
 
 from openvisualizer.motehandler.moteconnector.openparser import parser
+from openvisualizer.utils import format_buf
 
 log = logging.getLogger('ParserPacket')
 log.setLevel(logging.ERROR)
@@ -27,7 +28,8 @@ class ParserPacket(parser.Parser):
 
     def parse_input(self, data):
         # log
-        log.debug("received packet: {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received packet: {0}".format(format_buf(data)))
 
         # ensure data not short longer than header
         self._check_length(data)
@@ -35,9 +37,10 @@ class ParserPacket(parser.Parser):
         _ = data[:2]  # header bytes
 
         # remove mote id at the beginning.
-        data = data[2:]
+        data = bytes(data[2:])
 
-        log.debug("packet without header: {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("packet without header: {0}".format(format_buf(data)))
 
         event_type = 'sniffedPacket'
 
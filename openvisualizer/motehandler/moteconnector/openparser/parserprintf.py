@@ -8,6 +8,7 @@ import logging
 import sys
 
 from openvisualizer.motehandler.moteconnector.openparser import parser
+from openvisualizer.utils import format_buf
 
 log = logging.getLogger('ParserPrintf')
 log.setLevel(logging.INFO)
@@ -49,13 +50,14 @@ class ParserPrintf(parser.Parser):
     def parse_input(self, data):
 
         # log
-        log.debug('received printf {0}'.format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('received printf {0}'.format(format_buf(data)))
 
         _ = ParserPrintf.bytes_to_addr(data[0:2])  # addr
         _ = ParserPrintf.bytes_to_string(data[2:7])  # asn
 
-        sys.stdout.write("{}".format("".join([chr(c) for c in data[7:]])))
+        sys.stdout.write(bytes(data[7:]).decode('latin-1'))
         sys.stdout.flush()
 
         # everything was fine
-        return 'error', data
+        return 'error', bytes(data)
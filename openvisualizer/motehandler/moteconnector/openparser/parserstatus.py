@@ -16,6 +16,17 @@ log = logging.getLogger('ParserStatus')
 log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
+# the namedtuple classes are shared by all the ParserStatus instances, the type of a notification identifies its element
+_status_tuples = {}
+
+
+def status_tuple(name, fields):
+    """ Returns the namedtuple class of the status element name """
+    key = (name, tuple(fields))
+    if key not in _status_tuples:
+        _status_tuples[key] = collections.namedtuple("Tuple_" + name, fields)
+    return _status_tuples[key]
+
 
 class FieldParsingKey(object):
 
@@ -26,10 +37,41 @@ class FieldParsingKey(object):
         self.structure = structure
         self.fields = fields
 
+        # compiled once, not at every status frame
+        self.struct = struct.Struct(structure)
+        self.named_tuple = status_tuple(name, fields)
+
+        # table elements are sent one row at a time, the row number being the first field
+        self.has_rows = fields[0] == 'row'
+
+
+class StatusCache(object):
+    """ Last payload received for each status element (and table row) of a mote. """
+
+    def __init__(self):
+        self.payloads = {}
+        self.hits = 0
+        self.misses = 0
+
+    def changed(self, cache_key, payload):
+        """ Returns False if payload equals the cached one, otherwise caches it and returns True """
+        if self.payloads.get(cache_key) == payload:
+            self.hits += 1
+            return False
+
+        self.payloads[cache_key] = bytes(payload)
+        self.misses += 1
+        return True
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.payloads)}
+
 
 class ParserStatus(parser.Parser):
     HEADER_LENGTH = 4
 
+    _HEADER = struct.Struct('<HB')
+
     def __init__(self):
 
         # log
@@ -40,6 +82,10 @@ class ParserStatus(parser.Parser):
 
         # local variables
         self.fields_parsing_keys = []
+        # maps the 256 values of the status element byte to their FieldParsingKey (or None)
+        self.fields_dispatch = [None] * 256
+        # when set to a StatusCache, status elements identical to the previous copy are not parsed again
+        self.status_cache = None
 
         # register fields
         self._add_fields_parser(
@@ -273,65 +319,72 @@ class ParserStatus(parser.Parser):
 
     def parse_input(self, data):
 
-        log.debug("received data={0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received data={0}".format(format_buf(data)))
 
         # ensure data not short longer than header
         self._check_length(data)
 
-        header_bytes = data[:3]
+        # extract mote_id and status_elem, the header was checked to be long enough
+        (mote_id, status_elem) = self._HEADER.unpack_from(data)
 
-        # extract mote_id and status_elem
-        try:
-            (mote_id, status_elem) = struct.unpack('<HB', bytes(header_bytes))
-        except struct.error:
-            raise ParserException(ParserException.ExceptionType.DESERIALIZE.value,
-                                  "could not extract moteId and statusElem from {0}".format(header_bytes))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("moteId={0} statusElem={1}".format(mote_id, status_elem))
 
-        log.debug("moteId={0} statusElem={1}".format(mote_id, status_elem))
-
-        # jump the header bytes
-        data = data[3:]
+        # the fields are read in place, past the header bytes
+        offset = self._HEADER.size
 
         # call the next header parser
-        for key in self.fields_parsing_keys:
-            if status_elem == key.val:
-
-                # log
-                log.debug("parsing {0}, ({1} bytes) as {2}".format(data, len(data), key.name))
-
-                # parse byte array
-                try:
-                    fields = struct.unpack(key.structure, bytes(data))
-                except struct.error as err:
-                    raise ParserException(
-                        ParserException.ExceptionType.DESERIALIZE.value,
-                        "could not extract tuple {0} by applying {1} to {2}; error: {3}".format(
-                            key.name,
-                            key.structure,
-                            format_buf(data),
-                            str(err),
-                        ),
-                    )
-
-                # map to name tuple
-                return_tuple = self.named_tuple[key.name](*fields)
-
-                # log
-                log.debug("parsed into {0}".format(return_tuple))
-
-                # map to name tuple
-                return 'status', return_tuple
-
-        # if you get here, no key was found
-        raise ParserException(ParserException.ExceptionType.NO_KEY.value,
-                              "type={0} (\"{1}\")".format(data[0], chr(data[0])))
+        key = self.fields_dispatch[status_elem]
+        if key is None:
+            # if you get here, no key was found
+            raise ParserException(ParserException.ExceptionType.NO_KEY.value, "statusElem={0}".format(status_elem))
+
+        # log
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("parsing {0}, ({1} bytes) as {2}".format(
+                format_buf(data[offset:]), len(data) - offset, key.name))
+
+        # parse byte array, unpack_from tolerates trailing bytes so the length is checked first
+        if len(data) - offset != key.struct.size:
+            raise ParserException(
+                ParserException.ExceptionType.DESERIALIZE.value,
+                "could not extract tuple {0} by applying {1} to {2}; error: expected {3} bytes".format(
+                    key.name,
+                    key.structure,
+                    format_buf(data[offset:]),
+                    key.struct.size,
+                ),
+            )
+
+        # a status element (or row) the mote resends unchanged is reported as None
+        status_cache = self.status_cache
+        if status_cache is not None:
+            cache_key = (mote_id, status_elem, data[offset]) if key.has_rows else (mote_id, status_elem)
+            if not status_cache.changed(cache_key, data[offset:]):
+                return 'status', None
+
+        fields = key.struct.unpack_from(data, offset)
+
+        # map to name tuple
+        return_tuple = key.named_tuple(*fields)
+
+        # log
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("parsed into {0}".format(return_tuple))
+
+        # map to name tuple
+        return 'status', return_tuple
 
     # ======================== private =========================================
 
     def _add_fields_parser(self, index=None, val=None, name=None, structure=None, fields=None):
 
         # add to fields parsing keys
-        self.fields_parsing_keys.append(FieldParsingKey(index, val, name, structure, fields))
+        key = FieldParsingKey(index, val, name, structure, fields)
+        self.fields_parsing_keys.append(key)
+        if self.fields_dispatch[val] is None:
+            self.fields_dispatch[val] = key
 
         # define named tuple
-        self.named_tuple[name] = collections.namedtuple("Tuple_" + name, fields)
+        self.named_tuple[name] = key.named_tuple
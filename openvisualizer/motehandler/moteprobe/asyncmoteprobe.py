@@ -0,0 +1,331 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+"""
+Serial mote probes serviced by a single asyncio event loop.
+
+The threaded probes dedicate one thread, blocked in read(), to every serial port. Here, an AsyncProbeManager thread runs
+one event loop that watches the file descriptors of all the serial ports (loop.add_reader) and feeds the received bytes
+to the frame parser of the matching probe. The frames to the motes are written from the same loop, whenever the port
+is writable.
+
+None of the loop callbacks ever blocks. When the probes are given a receive queue (see MoteProbe.set_rx_queue), the
+frames of all the ports are handed to their parsers by a single feed thread, and a port whose queue is full under the
+block policy is no longer read until its parser catches up. The probes keep the MoteProbe interface (send_to_parser,
+close, join, ...), so the rest of OpenVisualizer does not see the difference. Only available on POSIX platforms.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+import serial
+
+from .framequeue import FrameQueue
+from .moteprobe import MoteProbeNoData
+from .serialmoteprobe import SerialMoteProbe
+from openvisualizer.utils import format_crash_message
+
+log = logging.getLogger('MoteProbe')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+
+# ============================ class ===================================
+
+class AsyncProbeManager(threading.Thread):
+    """ Runs the event loop that services the serial ports of all the AsyncSerialMoteProbe instances. """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        super(AsyncProbeManager, self).__init__(name='AsyncProbeManager', daemon=True)
+
+        if os.name != 'posix':
+            raise NotImplementedError('the asyncio probe backend requires selectable serial ports (POSIX only)')
+
+        self.loop = asyncio.new_event_loop()
+        self.probes = set()
+
+        # (probe, receive queue) once per frame queued for the feed thread, started with the first receive queue
+        self._ready = queue.SimpleQueue()
+        self._feed = None
+        self._feed_lock = threading.Lock()
+
+        self.start()
+
+    @classmethod
+    def default(cls):
+        """ Returns the process-wide manager, started on first use. """
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    # ======================== thread ==================================
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # ======================== public ==================================
+
+    def add_probe(self, probe):
+        self.loop.call_soon_threadsafe(self._attach_probe, probe)
+
+    def remove_probe(self, probe):
+        self.loop.call_soon_threadsafe(self._detach_probe, probe)
+
+    @property
+    def num_probes(self):
+        return len(self.probes)
+
+    def start_feed(self):
+        """ Starts the thread handing the queued frames of all the probes to their parsers """
+        with self._feed_lock:
+            if self._feed is None:
+                self._feed = threading.Thread(target=self._run_feed, name='AsyncProbeFeed', daemon=True)
+                self._feed.start()
+
+    def feed(self, probe, rx_queue):
+        """ Has the feed thread hand the oldest frame of rx_queue to the parser of probe """
+        self._ready.put((probe, rx_queue))
+
+    def resume_reading(self, probe):
+        """ Reads the port of probe again, once its receive queue drained """
+        self.loop.call_soon_threadsafe(self._resume_probe, probe)
+
+    # ======================== private =================================
+
+    def _attach_probe(self, probe):
+        try:
+            probe._attach()
+        except Exception as err:
+            log.critical(format_crash_message(probe.name, err))
+            probe._stop_tx()
+            probe._attached.set()
+            probe._detached.set()
+            return
+
+        self.probes.add(probe)
+        self.loop.add_reader(probe.serial.fileno(), self._read_probe, probe)
+        probe._attach_ok = True
+        probe._attached.set()
+        # write the frames queued while the port was being opened
+        probe._tx_flush()
+
+    def _detach_probe(self, probe):
+        if probe in self.probes:
+            self.probes.discard(probe)
+            self.loop.remove_reader(probe.serial.fileno())
+
+        try:
+            probe._detach()
+        except Exception as err:
+            log.error(err)
+        finally:
+            probe._stop_tx()
+            probe._attached.set()
+            probe._detached.set()
+
+    def _read_probe(self, probe):
+        try:
+            rx_bytes = probe._rcv_data()
+        except MoteProbeNoData:
+            return
+        except Exception as err:
+            log.error('{}: {}'.format(probe.name, err))
+            self._detach_probe(probe)
+            return
+
+        try:
+            probe._parse_bytes(rx_bytes)
+        except Exception as err:
+            # never let one misbehaving probe take down the loop shared by all the others
+            log.critical(format_crash_message(probe.name, err))
+
+        if probe._rx_paused:
+            # the serial driver buffers the bytes, and holds the mote back with XOFF once its buffer fills
+            self.loop.remove_reader(probe.serial.fileno())
+
+    def _resume_probe(self, probe):
+        if probe in self.probes and not probe._rx_paused:
+            self.loop.add_reader(probe.serial.fileno(), self._read_probe, probe)
+
+    def _run_feed(self):
+        while True:
+            probe, rx_queue = self._ready.get()
+            try:
+                probe._rx_feed_one(rx_queue)
+            except Exception as err:
+                log.critical(format_crash_message(probe.name, err))
+
+
+# ============================ class ===================================
+
+class AsyncSerialMoteProbe(SerialMoteProbe):
+    """
+    Serial mote probe without a reader thread of its own.
+
+    The probe is attached to an AsyncProbeManager when started, which reads the port whenever it becomes readable. The
+    threading.Thread methods used by the rest of OpenVisualizer (start, join, is_alive) are mapped onto that manager.
+    """
+
+    def __init__(self, port, baudrate, rx_chunk_size=SerialMoteProbe.RX_CHUNK_SIZE, manager=None):
+        self._manager = manager if manager is not None else AsyncProbeManager.default()
+        self._detached = threading.Event()
+
+        # set while the receive queue is full under the block policy, the port is not read until it drains
+        self._rx_paused = False
+        self._rx_pause_lock = threading.Lock()
+
+        # the write in progress (bytes not written yet, number of frames, length), only used from the event loop
+        self._tx_pending = b''
+        self._tx_pending_frames = 0
+        self._tx_pending_len = 0
+        self._tx_timer = None
+        self._tx_watching = False
+
+        # initialize the parent class
+        SerialMoteProbe.__init__(self, port=port, baudrate=baudrate, bulk_read=True, rx_chunk_size=rx_chunk_size)
+
+    # ======================== thread ==================================
+
+    def start(self):
+        self._manager.add_probe(self)
+
+    def is_alive(self):
+        return not self._detached.is_set()
+
+    def join(self, timeout=None):
+        self._detached.wait(timeout)
+
+    # ======================== public ==================================
+
+    def close(self):
+        """ Detach the probe from the event loop """
+        if not self.quit:
+            SerialMoteProbe.close(self)
+            self._manager.remove_probe(self)
+
+    # ======================== private =================================
+
+    def _queue_data(self, data):
+        """ HDLC encodes a frame and queues it for the event loop, blocks while the queue is full """
+        if self._tx_stopped:
+            self._tx_drop(1)
+            return
+        item = (self.hdlc.hdlcify(data), self._tx_paced(data))
+        try:
+            # the event loop is the one draining the queue, it never waits for it
+            self._tx_queue.put(item, block=threading.current_thread() is not self._manager)
+        except queue.Full:
+            log.error('{}: transmit queue full, frame dropped'.format(self.name))
+            return
+        self._manager.loop.call_soon_threadsafe(self._tx_flush)
+
+    def _start_rx_feed(self, rx_queue):
+        """ The frames are handed to the parser by the feed thread of the manager, shared by all the probes """
+        self._manager.start_feed()
+
+    def _queue_frame(self, rx_queue, frame, stamp):
+        """ Queues a frame without ever blocking the event loop, stops reading the port while the queue is full """
+        queued = rx_queue.put(frame, stamp, block=False)
+        if rx_queue.policy == FrameQueue.BLOCK:
+            with self._rx_pause_lock:
+                if rx_queue.full:
+                    self._rx_paused = True
+        self._manager.feed(self, rx_queue)
+        return queued
+
+    def _rx_feed_one(self, rx_queue):
+        """ Hands the oldest frame of rx_queue to the parser, on the feed thread """
+        frame, stamp = rx_queue.get_nowait()
+        if frame is not None:
+            self._rx_deliver(frame, stamp)
+
+        with self._rx_pause_lock:
+            if self._rx_paused and len(rx_queue) <= rx_queue.maxlen // 2:
+                self._rx_paused = False
+                self._manager.resume_reading(self)
+
+    def _tx_flush(self):
+        """ Writes the queued frames as far as the port accepts them, without blocking the event loop """
+        if self._tx_timer is not None or self not in self._manager.probes:
+            return
+
+        while True:
+            if self._tx_pending:
+                try:
+                    written = os.write(self._serial.fileno(), self._tx_pending)
+                except BlockingIOError:
+                    written = 0
+                except OSError as err:
+                    log.error('{}: {}'.format(self.name, err))
+                    self._tx_pending = b''
+                    self._tx_watch(False)
+                    continue
+
+                self._tx_pending = self._tx_pending[written:]
+                if self._tx_pending:
+                    # resumed by the event loop once the port is writable again
+                    self._tx_watch(True)
+                    return
+                self._tx_watch(False)
+                self._tx_done(self._tx_pending_frames, self._tx_pending_len)
+
+            item = self._tx_next(block=False)
+            if item is None or item[0] is None:
+                return
+
+            frame, paced = item
+            if paced:
+                delay = self._tx_last + self.tx_pacing - time.monotonic()
+                if delay > 0:
+                    self._tx_held = item
+                    self._tx_timer = self._manager.loop.call_later(delay, self._tx_resume)
+                    return
+
+            self._tx_pending, self._tx_pending_frames = self._tx_merge(frame)
+            self._tx_pending_len = len(self._tx_pending)
+
+    def _tx_resume(self):
+        self._tx_timer = None
+        self._tx_flush()
+
+    def _tx_watch(self, writable):
+        """ Calls _tx_flush whenever the port is writable, or stops doing so """
+        if writable != self._tx_watching:
+            if writable:
+                self._manager.loop.add_writer(self._serial.fileno(), self._tx_flush)
+            else:
+                self._manager.loop.remove_writer(self._serial.fileno())
+            self._tx_watching = writable
+
+    def _rcv_data(self):
+        data = self._serial.read(self._rx_chunk_size)
+        if not data:
+            raise MoteProbeNoData
+        else:
+            return data
+
+    def _attach(self):
+        log.debug("attaching to serial port: {} @ {}".format(self._port, self._baudrate))
+        # non-blocking reads, the event loop only calls _rcv_data when the port is readable
+        self._serial = serial.Serial(self._port, self._baudrate, timeout=0, xonxoff=True, rtscts=False, dsrdtr=False)
+        log.debug("self._serial: {}".format(self._serial))
+
+    def _detach(self):
+        if self._tx_timer is not None:
+            self._tx_timer.cancel()
+            self._tx_timer = None
+        if self._tx_watching:
+            self._tx_watch(False)
+        SerialMoteProbe._detach(self)
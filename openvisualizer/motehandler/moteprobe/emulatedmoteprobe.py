@@ -37,13 +37,12 @@ class EmulatedMoteProbe(MoteProbe):
 
     # ======================== private =================================
 
-    def _send_data(self, data):
-        hdlc_data = self.hdlc.hdlcify(data)
-        self.serial.rx.put([ord(b) for b in hdlc_data])
+    def _send_data(self, hdlc_data):
+        self.serial.rx.put(list(hdlc_data))
 
     def _rcv_data(self):
         try:
-            return "".join([chr(b) for b in self.serial.tx.get_nowait()[0]])
+            return bytes(self.serial.tx.get_nowait()[0])
         except queue.Empty:
             raise MoteProbeNoData()
 
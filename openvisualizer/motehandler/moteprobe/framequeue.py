@@ -0,0 +1,164 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+import threading
+from collections import deque
+
+
+# ============================ class ===================================
+
+class FrameQueue(object):
+    """
+    Bounded FIFO of received frames between a probe's reader and the parsing/dispatch stage.
+
+    When the queue is full, the policy decides what happens to a new frame:
+
+    - drop-oldest: the oldest queued frame is discarded
+    - drop-status-first: the oldest queued status frame is discarded, or the oldest frame if none is queued; status
+      frames are periodic snapshots, the next one carries the same information
+    - block: the reader waits until the parser catches up
+    """
+
+    DROP_OLDEST = 'drop-oldest'
+    DROP_STATUS_FIRST = 'drop-status-first'
+    BLOCK = 'block'
+    POLICIES = (DROP_OLDEST, DROP_STATUS_FIRST, BLOCK)
+
+    STATUS_FRAME = ord('S')
+
+    def __init__(self, maxlen, policy=DROP_STATUS_FIRST):
+        if policy not in self.POLICIES:
+            raise ValueError('unknown drop policy {}'.format(policy))
+
+        self.maxlen = maxlen
+        self.policy = policy
+
+        # status and other frames are kept apart, tagged with a sequence number to restore the arrival order, and
+        # with the optional timestamp given by the producer
+        self._status = deque()
+        self._other = deque()
+        self._seq = 0
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.dropped_status = 0
+
+    def __len__(self):
+        return len(self._status) + len(self._other)
+
+    # ======================== public ==================================
+
+    @property
+    def full(self):
+        return len(self) >= self.maxlen
+
+    def put(self, frame, stamp=None, block=True):
+        """
+        Queues a frame, returns False if the frame (or an older one) had to be dropped.
+
+        With the block policy and block set to False, the frame is queued past maxlen instead of waiting: the caller is
+        expected to stop producing while the queue is full.
+        """
+        with self._lock:
+            room = True
+            if len(self) >= self.maxlen:
+                if self.policy != self.BLOCK:
+                    self._drop()
+                    room = False
+                elif block:
+                    while len(self) >= self.maxlen and not self._closed:
+                        self._not_full.wait()
+                    if self._closed:
+                        return False
+
+            if frame and frame[0] == self.STATUS_FRAME:
+                self._status.append((self._seq, frame, stamp))
+            else:
+                self._other.append((self._seq, frame, stamp))
+            self._seq += 1
+            self.enqueued += 1
+
+            self._not_empty.notify()
+            return room
+
+    def get(self):
+        """ Returns the oldest frame, blocks while the queue is empty and returns None once closed and drained """
+        return self.get_stamped()[0]
+
+    def get_stamped(self):
+        """ Same as get(), but returns a tuple (frame, stamp) with the timestamp the frame was queued with """
+        with self._lock:
+            while not len(self):
+                if self._closed:
+                    return None, None
+                self._not_empty.wait()
+
+            _, frame, stamp = self._oldest().popleft()
+            self._not_full.notify()
+            return frame, stamp
+
+    def configure(self, maxlen, policy=None):
+        """ Changes the size of the queue and, unless None, its drop policy """
+        if policy is not None and policy not in self.POLICIES:
+            raise ValueError('unknown drop policy {}'.format(policy))
+
+        with self._lock:
+            self.maxlen = maxlen
+            if policy is not None:
+                self.policy = policy
+            self._not_full.notify_all()
+
+    def get_nowait(self):
+        """ Returns the oldest frame and its timestamp as get_stamped(), or (None, None) if the queue is empty """
+        with self._lock:
+            if not len(self):
+                return None, None
+
+            _, frame, stamp = self._oldest().popleft()
+            self._not_full.notify()
+            return frame, stamp
+
+    def close(self):
+        """ Wakes up the blocked readers and writers, get() returns None once the remaining frames are consumed """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': len(self),
+                'frames': self.enqueued,
+                'dropped': self.dropped,
+                'dropped_status': self.dropped_status,
+            }
+
+    # ======================== private =================================
+
+    def _oldest(self):
+        if not self._status:
+            return self._other
+        if not self._other:
+            return self._status
+        return self._status if self._status[0][0] < self._other[0][0] else self._other
+
+    def _drop(self):
+        if self.policy == self.DROP_STATUS_FIRST and self._status:
+            victims = self._status
+        else:
+            victims = self._oldest()
+
+        if victims is self._status:
+            self.dropped_status += 1
+        victims.popleft()
+        self.dropped += 1
@@ -0,0 +1,381 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+"""
+Binary traces of the serial frames received from the motes.
+
+A trace starts with an 8-byte magic and holds a sequence of records, each one a fixed header (kind, port index,
+timestamp, length) followed by length bytes:
+
+- port records carry the name of a port, the index of the record becomes the index of that port
+- frame records carry a HDLC frame (flags included, XON/XOFF already removed) as received on that port
+
+All the integers are little-endian, the timestamps are seconds since the epoch.
+
+A TraceReader memory-maps a trace and keeps a sparse index of it in a sidecar file (the trace path plus '.idx'), so
+the frames of a time window or of a single port are reached without reading the records before them.
+"""
+
+import array
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+from openvisualizer.motehandler.moteconnector.openparser import parserexception
+from openvisualizer.motehandler.moteprobe import openhdlc
+
+log = logging.getLogger('FrameTrace')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+MAGIC = b'OVTRACE\x01'
+
+RECORD_PORT = 0
+RECORD_FRAME = 1
+
+# kind, port index, timestamp, payload length
+RECORD_HEADER = struct.Struct('<BHdI')
+
+INDEX_MAGIC = b'OVTRIDX\x01'
+# trace size, trace mtime (ns), index step, number of ports
+INDEX_HEADER = struct.Struct('<QqII')
+# frames, bytes, last timestamp, number of checkpoints
+INDEX_PORT = struct.Struct('<QQdI')
+
+
+# ============================ class ===================================
+
+class TraceRecorder(object):
+    """ Appends the frames received by any number of mote probes to a trace file, see MoteProbe.recorder. """
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = 0
+
+        self._lock = threading.Lock()
+        self._ports = {}
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+
+        # the timestamps come from the monotonic clock, set to the wall clock once, so that they never go backwards
+        self._time_base = time.time() - time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ======================== public ==================================
+
+    def record(self, port, frame, timestamp=None):
+        with self._lock:
+            if self._file is None:
+                return
+
+            # taken under the lock, the records of concurrent probes are written in timestamp order
+            if timestamp is None:
+                timestamp = self._time_base + time.monotonic()
+
+            index = self._ports.get(port)
+            if index is None:
+                index = self._ports[port] = len(self._ports)
+                name = port.encode('utf-8')
+                self._file.write(RECORD_HEADER.pack(RECORD_PORT, index, timestamp, len(name)) + name)
+
+            self._file.write(RECORD_HEADER.pack(RECORD_FRAME, index, timestamp, len(frame)) + frame)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ============================ class ===================================
+
+class TraceReader(object):
+    """
+    Random access to a trace file through a memory map.
+
+    The index holds, for the whole trace and for each port, a checkpoint (timestamp, offset) every index_step frames.
+    A query starts scanning at the last checkpoint before its time window, it relies on the record timestamps not
+    going backwards, as written by a TraceRecorder. The index is saved next to the trace and rebuilt when the size or
+    the modification time of the trace changes.
+    """
+
+    INDEX_STEP = 1024
+
+    def __init__(self, path, index_step=INDEX_STEP, save_index=True):
+        self.path = path
+        self.index_path = path + '.idx'
+
+        # cumulative counts of the frames skipped by parse()
+        self.hdlc_errors = 0
+        self.parse_errors = 0
+
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not a frame trace'.format(path))
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = st.st_size
+        self._mtime = st.st_mtime_ns
+
+        # ports[i] is the name of port index i, port_info[i] is [frames, bytes, last timestamp, times, offsets] and
+        # port_info[-1] describes the whole trace
+        self.index_step = index_step
+        self.ports = []
+        self._port_info = []
+
+        if not self._load_index():
+            self._build_index(index_step)
+            if save_index:
+                self._save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ======================== public ==================================
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    @property
+    def first_timestamp(self):
+        times = self._port_info[-1][3]
+        return times[0] if times else None
+
+    @property
+    def last_timestamp(self):
+        return self._port_info[-1][2] if self._port_info[-1][0] else None
+
+    def summary(self):
+        """ Returns, from the index alone, the number of frames and bytes and the first and last timestamps per port """
+        return {
+            port: {
+                'frames': frames,
+                'bytes': float(num_bytes),
+                'first': times[0] if frames else None,
+                'last': last if frames else None,
+            } for port, (frames, num_bytes, last, times, _) in zip(self.ports, self._port_info)
+        }
+
+    def frames(self, port=None, start=None, end=None):
+        """
+        Iterates over the frames of a port (or of all the ports) with a timestamp in [start, end).
+
+        :returns: a generator of tuples (timestamp, port, frame)
+        """
+        if port is None:
+            port_index = None
+            times, offsets = self._port_info[-1][3:]
+        else:
+            try:
+                port_index = self.ports.index(port)
+            except ValueError:
+                return
+            times, offsets = self._port_info[port_index][3:]
+
+        if not offsets:
+            return
+        offset = offsets[max(bisect_left(times, start) - 1, 0)] if start is not None else offsets[0]
+
+        mm = self._mm
+        ports = self.ports
+        header = RECORD_HEADER
+        size = self._size
+        while offset + header.size <= size:
+            kind, index, timestamp, length = header.unpack_from(mm, offset)
+            payload = offset + header.size
+            offset = payload + length
+            if offset > size:
+                break
+            if end is not None and timestamp >= end:
+                break
+            if kind != RECORD_FRAME or (port_index is not None and index != port_index):
+                continue
+            if start is not None and timestamp < start:
+                continue
+            yield timestamp, ports[index], mm[payload:offset]
+
+    def parse(self, parser, port=None, start=None, end=None):
+        """
+        Runs the frames of a port (or of all the ports) with a timestamp in [start, end) through an OpenParser.
+
+        The frames failing the HDLC check or the parsing are skipped and counted in hdlc_errors and parse_errors.
+
+        :returns: a generator of tuples (timestamp, port, event sub type, parsed notification)
+        """
+        dehdlcify = openhdlc.OpenHdlc().dehdlcify
+        for timestamp, port_name, frame in self.frames(port, start, end):
+            try:
+                event_sub_type, notif = parser.parse_input(memoryview(dehdlcify(frame)))
+            except openhdlc.HdlcException:
+                self.hdlc_errors += 1
+                continue
+            except parserexception.ParserException as err:
+                self.parse_errors += 1
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('{}: {}'.format(self.path, err))
+                continue
+            yield timestamp, port_name, event_sub_type, notif
+
+    # ======================== private =================================
+
+    def _build_index(self, step):
+        self.index_step = step
+        mm = self._mm
+        header = RECORD_HEADER
+        size = self._size
+        total = self._new_port_info()
+        self.ports = []
+        self._port_info = [total]
+
+        offset = len(MAGIC)
+        while offset + header.size <= size:
+            kind, index, timestamp, length = header.unpack_from(mm, offset)
+            end = offset + header.size + length
+            if end > size:
+                log.warning('{}: truncated record at the end of the trace'.format(self.path))
+                break
+
+            if kind == RECORD_FRAME:
+                for info in (self._port_info[index], total):
+                    if not info[0] % step:
+                        info[3].append(timestamp)
+                        info[4].append(offset)
+                    info[0] += 1
+                    info[1] += length
+                    info[2] = timestamp
+            elif kind == RECORD_PORT:
+                self.ports.append(mm[offset + header.size:end].decode('utf-8'))
+                self._port_info.insert(-1, self._new_port_info())
+            else:
+                raise ValueError('{}: unknown record kind {}'.format(self.path, kind))
+            offset = end
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+
+        try:
+            if data[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                return False
+            offset = len(INDEX_MAGIC)
+            size, mtime, index_step, num_ports = INDEX_HEADER.unpack_from(data, offset)
+            if (size, mtime) != (self._size, self._mtime):
+                return False
+            offset += INDEX_HEADER.size
+
+            ports = []
+            port_info = []
+            for i in range(num_ports + 1):
+                if i < num_ports:
+                    name_len, = struct.unpack_from('<H', data, offset)
+                    ports.append(data[offset + 2:offset + 2 + name_len].decode('utf-8'))
+                    offset += 2 + name_len
+                frames, num_bytes, last, num_checkpoints = INDEX_PORT.unpack_from(data, offset)
+                offset += INDEX_PORT.size
+                times = array.array('d', data[offset:offset + 8 * num_checkpoints])
+                offset += 8 * num_checkpoints
+                offsets = array.array('Q', data[offset:offset + 8 * num_checkpoints])
+                offset += 8 * num_checkpoints
+                if len(offsets) != num_checkpoints:
+                    return False
+                if sys.byteorder == 'big':
+                    times.byteswap()
+                    offsets.byteswap()
+                port_info.append([frames, num_bytes, last, times, offsets])
+        except (struct.error, ValueError):
+            return False
+
+        self.index_step = index_step
+        self.ports = ports
+        self._port_info = port_info
+        return True
+
+    def _save_index(self):
+        chunks = [INDEX_MAGIC, INDEX_HEADER.pack(self._size, self._mtime, self.index_step, len(self.ports))]
+        for i, (frames, num_bytes, last, times, offsets) in enumerate(self._port_info):
+            if i < len(self.ports):
+                name = self.ports[i].encode('utf-8')
+                chunks.append(struct.pack('<H', len(name)) + name)
+            chunks.append(INDEX_PORT.pack(frames, num_bytes, last, len(times)))
+            if sys.byteorder == 'big':
+                times, offsets = array.array('d', times), array.array('Q', offsets)
+                times.byteswap()
+                offsets.byteswap()
+            chunks.append(times.tobytes())
+            chunks.append(offsets.tobytes())
+
+        try:
+            with open(self.index_path, 'wb') as f:
+                f.write(b''.join(chunks))
+        except OSError as err:
+            log.warning('{}: could not save the index: {}'.format(self.path, err))
+
+    @staticmethod
+    def _new_port_info():
+        return [0, 0, 0.0, array.array('d'), array.array('Q')]
+
+
+# ============================ functions ===============================
+
+def read_trace(path):
+    """
+    Iterates over the frames of a trace file.
+
+    :returns: a generator of tuples (timestamp, port, frame)
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a frame trace'.format(path))
+
+        ports = []
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                log.warning('{}: truncated record at the end of the trace'.format(path))
+                return
+
+            kind, index, timestamp, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                log.warning('{}: truncated record at the end of the trace'.format(path))
+                return
+
+            if kind == RECORD_FRAME:
+                yield timestamp, ports[index], payload
+            elif kind == RECORD_PORT:
+                ports.append(payload.decode('utf-8'))
+            else:
+                raise ValueError('{}: unknown record kind {}'.format(path, kind))
+
+
+def trace_ports(path):
+    """ Returns the names of the ports recorded in a trace file, in order of appearance """
+    ports = []
+    for _, port, _ in read_trace(path):
+        if port not in ports:
+            ports.append(port)
+    return ports
@@ -112,8 +112,7 @@ class IotlabMoteProbe(MoteProbe):
         except socket.timeout:
             raise MoteProbeNoData
 
-    def _send_data(self, data):
-        hdlc_data = self.hdlc.hdlcify(data)
+    def _send_data(self, hdlc_data):
         self.socket.send(hdlc_data)
 
     def _detach(self):
@@ -10,6 +10,9 @@ from .moteprobe import MoteProbe
 # ============================ class ===================================
 
 class MockMoteProbe(MoteProbe):
+    # frames are handed to send_to_parser on the calling thread, so that tests can check them right away
+    RX_QUEUE_SIZE = 0
+
     def __init__(self, mock_name, daemon=False, buffer=None):
 
         self.trigger_rcv = False
@@ -53,12 +56,12 @@ class MockMoteProbe(MoteProbe):
 
     # ======================== private =================================
 
-    def _send_data(self, data):
+    def _send_data(self, hdlc_data):
         pass
 
     def _rcv_data(self):
         if self.quit:
-            return '0x00'
+            return b'0x00'
         else:
             while not self.quit and (self.blocking or self.buffer is None):
                 pass
@@ -67,7 +70,7 @@ class MockMoteProbe(MoteProbe):
                 self.buffer = None
                 return tmp_buffer
             else:
-                return '0x00'
+                return b'0x00'
 
     def _detach(self):
         pass
@@ -6,15 +6,19 @@
 
 import abc
 import logging
+import queue
 import sys
 import threading
 import time
 
 from pydispatch import dispatcher
 
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
 from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.framequeue import FrameQueue
 from openvisualizer.motehandler.moteprobe.serialtester import SerialTester
-from openvisualizer.utils import format_string_buf, format_crash_message
+from openvisualizer.openlbr.sixlowpan_frag import Fragmentor
+from openvisualizer.utils import format_buf, format_crash_message
 
 log = logging.getLogger('MoteProbe')
 log.setLevel(logging.ERROR)
@@ -42,6 +46,22 @@ class MoteProbe(threading.Thread):
     # XON             is transmitted as [XONXOFF_ESCAPE,            XON^XONXOFF_MASK]==[0x12,0x11^0x10]==[0x12,0x01]
     # XONXOFF_ESCAPE  is transmitted as [XONXOFF_ESCAPE, XONXOFF_ESCAPE^XONXOFF_MASK]==[0x12,0x12^0x10]==[0x12,0x02]
 
+    _XONXOFF_DELETE = bytes([XON, XOFF])
+    _XONXOFF_ESCAPE_BYTE = bytes([XONXOFF_ESCAPE])
+    _HDLC_FLAG_BYTE = openhdlc.OpenHdlc.HDLC_FLAG
+    _HDLC_FLAG_INT = openhdlc.OpenHdlc.HDLC_FLAG[0]
+
+    TX_QUEUE_SIZE = 256  # frames waiting to be written before the senders block
+    TX_PACING = 0.01  # seconds between the 6LoWPAN fragments of a packet, gives the mote time to forward each of them
+    TX_COALESCE = 256  # merge pending frames into writes of up to this many bytes, 0 writes the frames one by one
+
+    # a data frame to the mote is its type, the EUI-64 of the next hop, then the 6LoWPAN packet
+    _TX_LOWPAN_OFFSET = 9
+    _TX_CLOSE = (None, False)
+
+    RX_QUEUE_SIZE = 0  # frames received but not yet parsed, 0 hands the frames to the parser on the reader thread
+    RX_DROP_POLICY = FrameQueue.BLOCK  # lossless, the reader waits for the parser while the queue is full
+
     def __init__(self, portname, daemon=False):
         # initialize the parent class
         super(MoteProbe, self).__init__()
@@ -55,12 +75,38 @@ class MoteProbe(threading.Thread):
         self.quit = False
         # to be assigned, callback
         self.send_to_parser = None
-
-        # frame parsing variables
-        self.rx_buf = ''
+        # set once the port is attached, or failed to attach (see wait_attached)
+        self._attached = threading.Event()
+        self._attach_ok = False
+
+        # ingest statistics, only collected while set to a ProbeStats instance
+        self.stats = None
+        # the received frames are appended to a trace file while set to a TraceRecorder instance
+        self.recorder = None
+
+        # received frames are handed to the parser on the reader thread, or through a queue (see set_rx_queue)
+        self.rx_queue = None
+
+        # outgoing frames are HDLC encoded by the senders and written by a writer thread, started with the first frame
+        self.tx_pacing = self.TX_PACING
+        self.tx_coalesce = self.TX_COALESCE
+        self._tx_queue = queue.Queue(maxsize=self.TX_QUEUE_SIZE)
+        self._tx_writer = None
+        self._tx_stopped = False
+        self._tx_held = None
+        self._tx_last = 0.0
+        self._tx_frames = 0
+        self._tx_writes = 0
+        self._tx_bytes = 0
+        self._tx_dropped = 0
+        self._tx_rate_start = time.monotonic()
+        self._tx_rate_bytes = 0
+        self._tx_bytes_per_sec = 0.0
+
+        # frame parsing variables, rx_buf holds the (partial) frame carried over between reads
+        self.rx_buf = bytearray()
         self.hdlc_flag = False
         self.receiving = False
-        self.xonxoff_escaping = False
 
         # give this thread a name
         self.name = 'MoteProbe@' + self._portname
@@ -69,7 +115,10 @@ class MoteProbe(threading.Thread):
         self.daemon = daemon
 
         # connect to dispatcher
-        dispatcher.connect(self._send_data, signal='fromMoteConnector@' + self._portname)
+        dispatcher.connect(self._queue_data, signal='fromMoteConnector@' + self._portname)
+
+        if self.RX_QUEUE_SIZE:
+            self.set_rx_queue(self.RX_QUEUE_SIZE)
 
         # start myself
         self.start()
@@ -82,6 +131,8 @@ class MoteProbe(threading.Thread):
                 log.debug("start running")
                 log.debug("attaching to port {0}".format(self._portname))
             self._attach()
+            self._attach_ok = True
+            self._attached.set()
 
             while not self.quit:  # read bytes from serial pipe
                 try:
@@ -100,7 +151,9 @@ class MoteProbe(threading.Thread):
             log.critical(err_msg)
             sys.exit(-1)
         finally:
+            self._attached.set()
             self._detach()
+            self._stop_tx()
 
     # ======================== public ==================================
 
@@ -113,9 +166,65 @@ class MoteProbe(threading.Thread):
         with self.data_lock:
             return self._portname
 
+    @property
+    def rx_stats(self):
+        """ Counters of the incoming path: queued frames, frames received and frames dropped """
+        rx_queue = self.rx_queue
+        if rx_queue is None:
+            return {}
+        return rx_queue.stats
+
+    def set_rx_queue(self, size, policy=None):
+        """
+        Hands the received frames to the parser through a queue of size frames, drained by a thread of its own, so a
+        slow parser does not stall the reader. The policy (RX_DROP_POLICY by default) tells what happens once the queue
+        is full. A size of 0 parses the frames on the reader thread again.
+        """
+        with self.data_lock:
+            rx_queue = self.rx_queue
+            if size and rx_queue is not None:
+                rx_queue.configure(size, policy)
+                return
+            if size:
+                self.rx_queue = FrameQueue(size, policy or self.RX_DROP_POLICY)
+                self._start_rx_feed(self.rx_queue)
+                return
+            self.rx_queue = None
+
+        # the feed hands over the frames still queued, then exits
+        if rx_queue is not None:
+            rx_queue.close()
+
+    @property
+    def tx_stats(self):
+        """ Counters of the outgoing path: queued, written and dropped frames, writes, bytes written, bytes/sec """
+        with self.data_lock:
+            self._update_tx_rate(0)
+            return {
+                'queue_depth': self._tx_queue.qsize(),
+                'frames': self._tx_frames,
+                'writes': self._tx_writes,
+                'bytes': self._tx_bytes,
+                'bytes_per_sec': self._tx_bytes_per_sec,
+                'dropped': self._tx_dropped,
+            }
+
     def close(self):
         """ Signal thread to exit """
         self.quit = True
+        self._disconnect_tx()
+        # wake up the writer and the parser feed
+        try:
+            self._tx_queue.put_nowait(self._TX_CLOSE)
+        except queue.Full:
+            pass
+        rx_queue = self.rx_queue
+        if rx_queue is not None:
+            rx_queue.close()
+
+    def wait_attached(self, timeout=None):
+        """ Blocks until the probe is attached to its port, returns False on timeout or if attaching failed """
+        return self._attached.wait(timeout) and self._attach_ok
 
     def test_serial(self, pkts=1, timeout=2):
         """ Probes serial pipe to test responsiveness """
@@ -136,83 +245,282 @@ class MoteProbe(threading.Thread):
         raise NotImplementedError("Should be implemented by child class")
 
     @abc.abstractmethod
-    def _send_data(self, data):
+    def _send_data(self, hdlc_data):
+        """ Writes HDLC encoded bytes, one or several frames, to the mote """
         raise NotImplementedError("Should be implemented by child class")
 
     @abc.abstractmethod
     def _rcv_data(self):
         raise NotImplementedError("Should be implemented by child class")
 
-    def _handle_frame(self):
+    def _queue_data(self, data):
+        """ HDLC encodes a frame and queues it for the writer, blocks while the queue is full """
+        if self._tx_stopped:
+            self._tx_drop(1)
+            return
+        if self._tx_writer is None:
+            with self.data_lock:
+                if self._tx_writer is None:
+                    self._tx_writer = threading.Thread(target=self._tx_loop, name='MoteProbeTx@' + self._portname,
+                                                       daemon=True)
+                    self._tx_writer.start()
+        self._tx_queue.put((self.hdlc.hdlcify(data), self._tx_paced(data)))
+
+    def _tx_paced(self, data):
+        """ Whether a frame is a 6LoWPAN fragment following the first one of its packet """
+        return (self.tx_pacing > 0 and len(data) > self._TX_LOWPAN_OFFSET
+                and data[0] == OpenParser.SERFRAME_PC2MOTE_DATA
+                and data[self._TX_LOWPAN_OFFSET] & Fragmentor.FRAG_DISPATCH_MASK == Fragmentor.FRAGN_DISPATCH)
+
+    def _tx_loop(self):
+        """ Writes the queued frames, a paced frame at least tx_pacing seconds after the previous write """
+        try:
+            if not self.wait_attached():
+                return
+
+            while not self.quit:
+                frame, paced = self._tx_next()
+                if frame is None:
+                    break
+
+                if paced:
+                    delay = self._tx_last + self.tx_pacing - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                tx_data, num_frames = self._tx_merge(frame)
+                try:
+                    self._send_data(tx_data)
+                except Exception as err:
+                    if not self.quit:
+                        log.error('{}: {}'.format(self.name, err))
+                    continue
+                self._tx_done(num_frames, len(tx_data))
+        finally:
+            self._stop_tx()
+
+    def _stop_tx(self):
+        """
+        Stops taking frames for the mote once nothing writes them anymore (the port failed to attach, or was detached):
+        the queued frames and the ones sent afterwards are dropped, the senders never block on the full queue.
+        """
+        self._tx_stopped = True
+        self._disconnect_tx()
+
+        dropped = 0
+        while True:
+            try:
+                frame, _ = self._tx_queue.get_nowait()
+            except queue.Empty:
+                break
+            if frame is not None:
+                dropped += 1
+        if dropped:
+            self._tx_drop(dropped)
+
+        # wake up the writer, if still waiting for a frame
+        try:
+            self._tx_queue.put_nowait(self._TX_CLOSE)
+        except queue.Full:
+            pass
+
+    def _tx_drop(self, num_frames):
+        with self.data_lock:
+            self._tx_dropped += num_frames
+        log.warning('{}: not attached, {} frame(s) to the mote dropped'.format(self.name, num_frames))
+
+    def _disconnect_tx(self):
+        """ Stops routing outgoing data to this probe, another probe may be opened on the same port """
+        try:
+            dispatcher.disconnect(self._queue_data, signal='fromMoteConnector@' + self._portname)
+        except dispatcher.errors.DispatcherKeyError:
+            pass
+
+    def _tx_next(self, block=True):
+        """ Returns the next queued (frame, paced) tuple, or None if the queue is empty and block is False """
+        item, self._tx_held = self._tx_held, None
+        if item is None:
+            try:
+                item = self._tx_queue.get(block)
+            except queue.Empty:
+                return None
+        return item
+
+    def _tx_merge(self, frame):
+        """
+        Appends the pending frames to frame, up to tx_coalesce bytes, and returns the bytes to write and their number
+        of frames. A paced frame ends the write, it is held back for the next one.
+        """
+        frames = [frame]
+        tx_len = len(frame)
+        while tx_len < self.tx_coalesce:
+            try:
+                item = self._tx_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] is None or item[1]:
+                self._tx_held = item
+                break
+            frames.append(item[0])
+            tx_len += len(item[0])
+        return frames[0] if len(frames) == 1 else b''.join(frames), len(frames)
+
+    def _tx_done(self, num_frames, tx_len):
+        """ Accounts a write of num_frames frames, tx_len bytes """
+        with self.data_lock:
+            self._tx_frames += num_frames
+            self._tx_writes += 1
+            self._tx_bytes += tx_len
+            self._update_tx_rate(tx_len)
+        self._tx_last = time.monotonic()
+
+    def _start_rx_feed(self, rx_queue):
+        """ Starts the thread handing the frames of rx_queue to the parser """
+        threading.Thread(target=self._rx_loop, args=(rx_queue,), name='MoteProbeRx@' + self._portname,
+                         daemon=True).start()
+
+    def _rx_loop(self, rx_queue):
+        """ Hands the queued frames to the parser until rx_queue is closed """
+        while True:
+            frame, stamp = rx_queue.get_stamped()
+            if frame is None:
+                break
+            self._rx_deliver(frame, stamp)
+
+    def _queue_frame(self, rx_queue, frame, stamp):
+        """ Hands a received frame over to the feed of rx_queue, returns False if a frame had to be dropped """
+        return rx_queue.put(frame, stamp)
+
+    def _rx_deliver(self, frame, stamp):
+        """ Hands a frame taken from the receive queue to the parser """
+        if self.send_to_parser:
+            try:
+                self.send_to_parser(frame)
+            except Exception as err:
+                log.critical(format_crash_message(self.name, err))
+
+        stats = self.stats
+        if stats is not None and stamp is not None:
+            stats.latency.add(time.perf_counter() - stamp)
+
+    def _update_tx_rate(self, tx_len, window=1.0):
+        """ Accounts tx_len written bytes and refreshes bytes_per_sec once per window (data_lock held) """
+        now = time.monotonic()
+        self._tx_rate_bytes += tx_len
+        elapsed = now - self._tx_rate_start
+        if elapsed >= window:
+            self._tx_bytes_per_sec = self._tx_rate_bytes / elapsed
+            self._tx_rate_start = now
+            self._tx_rate_bytes = 0
+
+    def _handle_frame(self, frame):
         """ Handles a HDLC frame """
         valid_frame = False
-        temp_buf = self.rx_buf
+        stats = self.stats
+
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(self._portname, bytes(frame))
+
         try:
-            self.rx_buf = self.hdlc.dehdlcify(self.rx_buf)
+            out_buf = self.hdlc.dehdlcify(frame)
 
             if log.isEnabledFor(logging.DEBUG):
                 log.debug("{}: {} dehdlcized input: {}".format(
                     self.name,
-                    format_string_buf(temp_buf),
-                    format_string_buf(self.rx_buf)))
+                    format_buf(frame),
+                    format_buf(out_buf)))
+
+            if stats is not None:
+                stats.frames += 1
+                stamp = time.perf_counter()
+            else:
+                stamp = None
 
-            if self.send_to_parser:
-                self.send_to_parser([ord(c) for c in self.rx_buf])
+            rx_queue = self.rx_queue
+            if rx_queue is not None:
+                if not self._queue_frame(rx_queue, out_buf, stamp) and log.isEnabledFor(logging.DEBUG):
+                    log.debug('{}: receive queue full, frame dropped'.format(self.name))
+            elif self.send_to_parser:
+                self.send_to_parser(out_buf)
+                if stamp is not None:
+                    stats.latency.add(time.perf_counter() - stamp)
 
             valid_frame = True
         except openhdlc.HdlcException as err:
-            log.warning('{}: invalid serial frame: {} {}'.format(self.name, format_string_buf(temp_buf), err))
+            if stats is not None:
+                stats.hdlc_errors += 1
+            log.warning('{}: invalid serial frame: {} {}'.format(self.name, format_buf(frame), err))
 
         return valid_frame
 
-    def _rx_buf_add(self, byte):
-        """ Adds byte to buffer and escapes the XONXOFF bytes """
-        if byte == chr(self.XONXOFF_ESCAPE):
-            self.xonxoff_escaping = True
-        else:
-            if self.xonxoff_escaping is True:
-                self.rx_buf += chr(ord(byte) ^ self.XONXOFF_MASK)
-                self.xonxoff_escaping = False
-            elif byte != chr(self.XON) and byte != chr(self.XOFF):
-                self.rx_buf += byte
+    @classmethod
+    def _xonxoff_unescape(cls, buf):
+        """ Removes the XON/XOFF characters from a buffer and restores the escaped bytes """
+        if cls.XONXOFF_ESCAPE not in buf:
+            return buf.translate(None, cls._XONXOFF_DELETE)
+
+        chunks = buf.split(cls._XONXOFF_ESCAPE_BYTE)
+        out_buf = bytearray(chunks[0].translate(None, cls._XONXOFF_DELETE))
+        for chunk in chunks[1:]:
+            if chunk:
+                out_buf.append(chunk[0] ^ cls.XONXOFF_MASK)
+                out_buf += chunk[1:].translate(None, cls._XONXOFF_DELETE)
+        return out_buf
 
     def _parse_bytes(self, octets):
-        """ Parses bytes received from serial pipe """
-        for byte in octets:
+        """ Splits the bytes received from serial pipe into HDLC frames """
+        buf = self.rx_buf
+        buf += octets
+        end = len(buf)
+        pos = 0
+
+        stats = self.stats
+        if stats is not None:
+            stats.bytes += len(octets)
+
+        while pos < end:
             if not self.receiving:
-                if self.hdlc_flag and byte != self.hdlc.HDLC_FLAG:
-                    # start of frame
-                    if log.isEnabledFor(logging.DEBUG):
-                        log.debug("%s: start of HDLC frame %s %s",
-                                  self.name,
-                                  format_string_buf(self.hdlc.HDLC_FLAG),
-                                  format_string_buf(byte))
-                    self.receiving = True
-                    # discard received self.hdlc_flag
-                    self.hdlc_flag = False
-                    self.xonxoff_escaping = False
-                    self.rx_buf = self.hdlc.HDLC_FLAG
-                    self._rx_buf_add(byte)
-                elif byte == self.hdlc.HDLC_FLAG:
-                    # received hdlc flag
+                if not self.hdlc_flag:
+                    # drop garbage up to the next hdlc flag
+                    flag = buf.find(self._HDLC_FLAG_BYTE, pos)
+                    if stats is not None:
+                        stats.garbage_bytes += (end if flag < 0 else flag) - pos
+                    if flag < 0:
+                        pos = end
+                        break
                     self.hdlc_flag = True
-                else:
-                    # drop garbage
-                    pass
-            else:
-                if byte != self.hdlc.HDLC_FLAG:
-                    # middle of frame
-                    self._rx_buf_add(byte)
-                else:
-                    # end of frame, received self.hdlc_flag
-                    if log.isEnabledFor(logging.DEBUG):
-                        log.debug("{}: end of hdlc frame {}".format(self.name, format_string_buf(byte)))
+                    pos = flag + 1
 
-                    self.hdlc_flag = True
-                    self.receiving = False
-                    self._rx_buf_add(byte)
-                    valid_frame = self._handle_frame()
+                # the frame starts at the first byte which is not a hdlc flag
+                while pos < end and buf[pos] == self._HDLC_FLAG_INT:
+                    pos += 1
+                if pos == end:
+                    break
+
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("{}: start of hdlc frame".format(self.name))
+
+                self.receiving = True
+                # discard received self.hdlc_flag
+                self.hdlc_flag = False
+
+            stop = buf.find(self._HDLC_FLAG_BYTE, pos)
+            if stop < 0:
+                # middle of frame, keep the partial frame until the next read
+                break
+
+            # end of frame, received self.hdlc_flag
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("{}: end of hdlc frame".format(self.name))
+
+            self.hdlc_flag = True
+            self.receiving = False
+            frame = self._HDLC_FLAG_BYTE + self._xonxoff_unescape(buf[pos:stop]) + self._HDLC_FLAG_BYTE
+            pos = stop + 1
+
+            if self._handle_frame(frame):
+                # discard valid frame self.hdlc_flag
+                self.hdlc_flag = False
 
-                    if valid_frame:
-                        # discard valid frame self.hdlc_flag
-                        self.hdlc_flag = False
+        del buf[:pos]
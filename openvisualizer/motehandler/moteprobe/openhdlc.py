@@ -5,9 +5,16 @@ HDLC framing module.
                   October 2012
 """
 
+import array
 import logging
+import sys
 
-from openvisualizer.utils import format_string_buf
+from openvisualizer.utils import format_buf
+
+try:
+    from binascii import crc_hqx
+except ImportError:
+    crc_hqx = None
 
 log = logging.getLogger('OpenHdlc')
 log.setLevel(logging.ERROR)
@@ -19,10 +26,10 @@ class HdlcException(Exception):
 
 
 class OpenHdlc(object):
-    HDLC_FLAG = '\x7e'
-    HDLC_FLAG_ESCAPED = '\x5e'
-    HDLC_ESCAPE = '\x7d'
-    HDLC_ESCAPE_ESCAPED = '\x5d'
+    HDLC_FLAG = b'\x7e'
+    HDLC_FLAG_ESCAPED = b'\x5e'
+    HDLC_ESCAPE = b'\x7d'
+    HDLC_ESCAPE_ESCAPED = b'\x5d'
     HDLC_CRCINIT = 0xffff
     HDLC_CRCGOOD = 0xf0b8
 
@@ -68,19 +75,17 @@ class OpenHdlc(object):
         Build an hdlc frame.
 
         Use 0x00 for both addr byte, and control byte.
-        """
 
-        # make copy of input
-        out_buf = in_buf[:]
+        :param in_buf: the frame payload, any bytes-like object or list of integers
+        :returns: the hdlc frame as bytes
+        """
 
         # calculate CRC
-        crc = self.HDLC_CRCINIT
-        for b in out_buf:
-            crc = self._crc_iteration(crc, b)
-        crc = 0xffff - crc
+        out_buf = bytes(in_buf)
+        crc = 0xffff - fcs16(out_buf)
 
         # append CRC
-        out_buf = out_buf + chr(crc & 0xff) + chr((crc & 0xff00) >> 8)
+        out_buf = out_buf + bytes([crc & 0xff, (crc & 0xff00) >> 8])
 
         # stuff bytes
         out_buf = out_buf.replace(self.HDLC_ESCAPE, self.HDLC_ESCAPE + self.HDLC_ESCAPE_ESCAPED)
@@ -95,45 +100,99 @@ class OpenHdlc(object):
         """
         Parse an hdlc frame.
 
-        :returns: the extracted frame, or -1 if wrong checksum
+        :param in_buf: the hdlc frame, flags included, as a bytes-like object
+        :returns: the extracted frame as bytes
+        :raises HdlcException: if the frame is too short or has a wrong checksum
         """
-        assert in_buf[0] == self.HDLC_FLAG
-        assert in_buf[-1] == self.HDLC_FLAG
+        assert in_buf[0] == self.HDLC_FLAG[0]
+        assert in_buf[-1] == self.HDLC_FLAG[0]
 
-        # make copy of input
-        out_buf = in_buf[:]
         if log.isEnabledFor(logging.DEBUG):
-            log.debug("got              {0}".format(format_string_buf(out_buf)))
+            log.debug("got              {0}".format(format_buf(in_buf)))
 
         # remove flags
-        out_buf = out_buf[1:-1]
+        out_buf = bytes(in_buf[1:-1])
         if log.isEnabledFor(logging.DEBUG):
-            log.debug("after flags:     {0}".format(format_string_buf(out_buf)))
+            log.debug("after flags:     {0}".format(format_buf(out_buf)))
 
         # unstuff
-        out_buf = out_buf.replace(self.HDLC_ESCAPE + self.HDLC_FLAG_ESCAPED, self.HDLC_FLAG)
-        out_buf = out_buf.replace(self.HDLC_ESCAPE + self.HDLC_ESCAPE_ESCAPED, self.HDLC_ESCAPE)
+        if self.HDLC_ESCAPE in out_buf:
+            out_buf = out_buf.replace(self.HDLC_ESCAPE + self.HDLC_FLAG_ESCAPED, self.HDLC_FLAG)
+            out_buf = out_buf.replace(self.HDLC_ESCAPE + self.HDLC_ESCAPE_ESCAPED, self.HDLC_ESCAPE)
         if log.isEnabledFor(logging.DEBUG):
-            log.debug("after unstuff:   {0}".format(format_string_buf(out_buf)))
+            log.debug("after unstuff:   {0}".format(format_buf(out_buf)))
 
         if len(out_buf) < 2:
             raise HdlcException('packet too short')
 
         # check CRC
-        crc = self.HDLC_CRCINIT
-        for b in out_buf:
-            crc = self._crc_iteration(crc, b)
-        if crc != self.HDLC_CRCGOOD:
+        if fcs16(out_buf) != self.HDLC_CRCGOOD:
             raise HdlcException('wrong CRC')
 
         # remove CRC
         out_buf = out_buf[:-2]  # remove CRC
         if log.isEnabledFor(logging.DEBUG):
-            log.debug("after CRC:       {0}".format(format_string_buf(out_buf)))
+            log.debug("after CRC:       {0}".format(format_buf(out_buf)))
 
         return out_buf
 
-    # ============================ private =====================================
 
-    def _crc_iteration(self, crc, b):
-        return (crc >> 8) ^ self.FCS16TAB[((crc ^ (ord(b))) & 0xff)]
+# ============================ FCS-16 backends =================================
+
+def _fcs16_tuple(buf, crc=OpenHdlc.HDLC_CRCINIT):
+    """ Byte-per-byte FCS-16 over FCS16TAB, the reference implementation. """
+    table = OpenHdlc.FCS16TAB
+    for b in buf:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xff]
+    return crc
+
+
+_FCS16TAB_WORD = None
+
+
+def _fcs16_table16(buf, crc=OpenHdlc.HDLC_CRCINIT):
+    """ FCS-16 consuming two bytes per table lookup, the 64K-entry table is built on first use. """
+    global _FCS16TAB_WORD
+
+    if _FCS16TAB_WORD is None:
+        table = OpenHdlc.FCS16TAB
+        word_table = []
+        for v in range(0x10000):
+            v = (v >> 8) ^ table[v & 0xff]
+            word_table.append((v >> 8) ^ table[v & 0xff])
+        _FCS16TAB_WORD = tuple(word_table)
+
+    num_words = len(buf) >> 1
+    words = array.array('H', bytes(buf[:2 * num_words]))
+    if sys.byteorder == 'big':
+        words.byteswap()
+
+    word_table = _FCS16TAB_WORD
+    for w in words:
+        crc = word_table[crc ^ w]
+
+    if len(buf) & 1:
+        crc = (crc >> 8) ^ OpenHdlc.FCS16TAB[(crc ^ buf[-1]) & 0xff]
+    return crc
+
+
+# bit-reversal of every byte value, used to map the reflected FCS-16 onto the non-reflected CRC-CCITT of crc_hqx
+_BIT_REVERSE = bytes(int('{:08b}'.format(b)[::-1], 2) for b in range(0x100))
+
+
+def _fcs16_crc_hqx(buf, crc=OpenHdlc.HDLC_CRCINIT):
+    """ FCS-16 computed by binascii.crc_hqx on the bit-reversed input. """
+    crc = crc_hqx(bytes(buf).translate(_BIT_REVERSE), (_BIT_REVERSE[crc & 0xff] << 8) | _BIT_REVERSE[crc >> 8])
+    return (_BIT_REVERSE[crc & 0xff] << 8) | _BIT_REVERSE[crc >> 8]
+
+
+FCS16_BACKENDS = {
+    'tuple': _fcs16_tuple,
+    'table16': _fcs16_table16,
+}
+
+if crc_hqx is not None:
+    FCS16_BACKENDS['crc_hqx'] = _fcs16_crc_hqx
+    fcs16 = _fcs16_crc_hqx
+else:
+    fcs16 = _fcs16_table16
@@ -0,0 +1,180 @@
+# Copyright (c) 2010-2013, Regents of the University of California.
+# All rights reserved.
+#
+# Released under the BSD 3-Clause license as published at the link below.
+# https://openwsn.atlassian.net/wiki/display/OW/License
+
+import logging
+import queue
+import threading
+import time
+
+from .frametrace import TraceReader
+from .moteprobe import MoteProbe, MoteProbeNoData
+
+log = logging.getLogger('MoteProbe')
+log.setLevel(logging.ERROR)
+log.addHandler(logging.NullHandler())
+
+
+# ============================ class ===================================
+
+class TraceReplay(threading.Thread):
+    """
+    Reads a trace file once and hands each frame to the ReplayMoteProbe of its port.
+
+    All the ports share one clock: a frame is handed over once its recorded time, relative to the first frame of the
+    trace (or to start), divided by speed has passed since the replay started. The replay starts once every probe is
+    connected to its parser, and waits for a probe whose parser lags behind rather than dropping its frames.
+    """
+
+    def __init__(self, trace, speed=1.0, start=None, end=None):
+        super(TraceReplay, self).__init__(name='TraceReplay@' + trace, daemon=True)
+
+        self.trace = trace
+        self.speed = speed
+        self.start_time = start
+        self.end_time = end
+
+        self.probes = {}
+
+    # ======================== public ==================================
+
+    def add_probe(self, probe):
+        self.probes[probe.portname] = probe
+
+    # ======================== thread ==================================
+
+    def run(self):
+        try:
+            # the probes start before their MoteConnector, hold the trace back until every parser is connected
+            while not self._stopped() and not all(p.send_to_parser for p in self.probes.values()):
+                time.sleep(0.01)
+
+            with TraceReader(self.trace) as reader:
+                # a single port is read through its own index, several ones in a single scan of the trace
+                port = next(iter(self.probes)) if len(self.probes) == 1 else None
+                origin = reader.first_timestamp
+                if origin is not None and self.start_time is not None:
+                    origin = max(origin, self.start_time)
+                start = time.monotonic()
+
+                for timestamp, port_name, frame in reader.frames(port, self.start_time, self.end_time):
+                    probe = self.probes.get(port_name)
+                    if probe is None or probe.quit:
+                        continue
+
+                    if self.speed:
+                        # sleep in short steps, to notice close() during the long silences of a trace
+                        due = start + (timestamp - origin) / self.speed
+                        while not self._stopped() and time.monotonic() < due:
+                            time.sleep(max(0.0, min(due - time.monotonic(), 0.1)))
+
+                    if not self._hand_over(probe, frame):
+                        if self._stopped():
+                            break
+        except Exception as err:
+            log.error('{}: {}'.format(self.name, err))
+        finally:
+            for probe in self.probes.values():
+                self._hand_over(probe, None)
+
+    # ======================== private =================================
+
+    def _stopped(self):
+        return all(p.quit for p in self.probes.values())
+
+    @staticmethod
+    def _hand_over(probe, frame):
+        """ Queues a frame (or the end of the trace, None) for a probe, returns False if the probe was closed """
+        while not probe.quit:
+            try:
+                probe.inbox.put(frame, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+# ============================ class ===================================
+
+class ReplayMoteProbe(MoteProbe):
+    """
+    Feeds the frames recorded on one port of a trace file (see frametrace) to the parser, as if received from the mote.
+
+    The frames are replayed with their recorded spacing divided by speed, or as fast as the parser consumes them with a
+    speed of 0, optionally only those recorded between the start and end timestamps. Frames sent to the mote are
+    discarded. The probes created by from_trace share one TraceReplay, which keeps the timing between the ports.
+    """
+
+    INBOX_SIZE = 256  # frames read from the trace but not yet handed to the parser
+
+    def __init__(self, trace, port, speed=1.0, start=None, end=None, replay=None):
+        self.trace = trace
+        self.inbox = queue.Queue(maxsize=self.INBOX_SIZE)
+        self._finished = threading.Event()
+
+        # initialize the parent class
+        MoteProbe.__init__(self, portname=port, daemon=True)
+
+        if replay is None:
+            replay = TraceReplay(trace, speed, start, end)
+            replay.add_probe(self)
+            replay.start()
+        else:
+            replay.add_probe(self)
+        self.replay = replay
+
+    @classmethod
+    def from_trace(cls, trace, speed=1.0, start=None, end=None):
+        """ Returns a probe replaying each port recorded in trace, start and end are relative to the first frame """
+        with TraceReader(trace) as reader:
+            ports = reader.ports
+            first = reader.first_timestamp
+        if first is not None:
+            start = first + start if start is not None else None
+            end = first + end if end is not None else None
+
+        replay = TraceReplay(trace, speed, start, end)
+        probes = [cls(trace, port, replay=replay) for port in ports]
+        replay.start()
+        return probes
+
+    # ======================== public ==================================
+
+    @property
+    def serial(self):
+        return None
+
+    def wait_finished(self, timeout=None):
+        """ Blocks until all the recorded frames were read, returns False on timeout """
+        return self._finished.wait(timeout)
+
+    # ======================== private =================================
+
+    def _attach(self):
+        pass
+
+    def _detach(self):
+        self._finished.set()
+
+    def _send_data(self, hdlc_data):
+        pass
+
+    def _rcv_data(self):
+        try:
+            frame = self.inbox.get(timeout=0.1)
+        except queue.Empty:
+            raise MoteProbeNoData()
+
+        if frame is None:
+            log.info('{}: end of trace {}'.format(self.name, self.trace))
+            self._finished.set()
+            raise MoteProbeNoData()
+        return frame
+
+    def _parse_bytes(self, frame):
+        """ The frames were recorded once deframed, they are handled whole """
+        if self.stats is not None:
+            self.stats.bytes += len(frame)
+        self._handle_frame(frame)
@@ -4,13 +4,20 @@
 # Released under the BSD 3-Clause license as published at the link below.
 # https://openwsn.atlassian.net/wiki/display/OW/License
 
+import json
 import logging
 import os
 import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import serial
+from appdirs import user_data_dir
+from serial.tools import list_ports
 
 from .moteprobe import MoteProbe, MoteProbeNoData
+from openvisualizer import APPNAME
 
 try:
     import _winreg as winreg
@@ -23,14 +30,74 @@ log.setLevel(logging.ERROR)
 log.addHandler(logging.NullHandler())
 
 
+# ============================ class ===================================
+
+class BaudrateCache(object):
+    """
+    Remembers the baudrate at which a mote last answered on each serial port, across OpenVisualizer restarts.
+
+    Entries are keyed by the port path and the USB serial number of the adapter, so plugging another mote into the same
+    port does not reuse a stale baudrate.
+    """
+
+    FILENAME = 'baudrates.json'
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.path.join(user_data_dir(APPNAME), self.FILENAME)
+        self.data_lock = threading.Lock()
+        self._serial_numbers = {p.device: p.serial_number for p in list_ports.comports()}
+        self._baudrates = {}
+
+        try:
+            with open(self.path) as f:
+                self._baudrates = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as err:
+            log.warning("Ignoring baudrate cache {}: {}".format(self.path, err))
+
+    def get(self, port):
+        with self.data_lock:
+            return self._baudrates.get(self._key(port))
+
+    def set(self, port, baudrate):
+        with self.data_lock:
+            self._baudrates[self._key(port)] = baudrate
+
+    def discard(self, port):
+        with self.data_lock:
+            self._baudrates.pop(self._key(port), None)
+
+    def save(self):
+        with self.data_lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'w') as f:
+                    json.dump(self._baudrates, f, indent=4, sort_keys=True)
+            except IOError as err:
+                log.error("Could not save baudrate cache {}: {}".format(self.path, err))
+
+    def _key(self, port):
+        return '{}#{}'.format(port, self._serial_numbers.get(port) or '')
+
+
 # ============================ class ===================================
 
 class SerialMoteProbe(MoteProbe):
-    def __init__(self, port, baudrate):
+    RX_CHUNK_SIZE = 4096  # upper bound on the number of bytes drained from the serial port per read
+    DISCOVERY_WORKERS = 16  # maximum number of serial ports probed concurrently
+    ATTACH_TIMEOUT = 5  # seconds to wait for a serial port to open during discovery
+    CACHED_TEST_TIMEOUT = 1  # seconds to wait for the echo when trying the cached baudrate of a port
+
+    def __init__(self, port, baudrate, bulk_read=True, rx_chunk_size=RX_CHUNK_SIZE):
         self._port = port
         self._baudrate = baudrate
         self._serial = None
 
+        # bulk-read mode drains all pending bytes per read() call, otherwise the port is read one byte at a time
+        self._bulk_read = bulk_read
+        self._rx_chunk_size = rx_chunk_size
+
         # initialize the parent class
         MoteProbe.__init__(self, portname=port)
 
@@ -46,56 +113,99 @@ class SerialMoteProbe(MoteProbe):
         return self._serial
 
     @classmethod
-    def probe_serial_ports(cls, baudrate, port_mask=None):
+    def probe_serial_ports(cls, baudrate, port_mask=None, max_workers=DISCOVERY_WORKERS, baudrate_cache=None):
+        """
+        Probes all the serial ports matching port_mask in parallel and returns the probes attached to a mote.
+
+        When a BaudrateCache is given, the baudrate cached for a port is tried first with a single short echo and the
+        full probe over all the baudrates only runs if the mote does not answer.
+        """
         ports = cls._get_ports_from_mask(port_mask)
+        baudrate = [int(b) for b in baudrate]
         mote_probes = []
-        probe = None
+        started_probes = []
+        started_lock = threading.Lock()
 
         log.warning("Probing motes: {} at baudrates {}".format(ports, baudrate))
-
+        start_time = time.perf_counter()
+
+        def probe_port(port):
+            probe = cls(port=port, baudrate=115200)
+            with started_lock:
+                started_probes.append(probe)
+            try:
+                if not probe.wait_attached(cls.ATTACH_TIMEOUT):
+                    raise IOError('could not attach to {}'.format(port))
+
+                cached = baudrate_cache.get(port) if baudrate_cache is not None else None
+                if cached in baudrate:
+                    log.debug("Probe port {} at cached baudrate {}".format(port, cached))
+                    probe._serial.baudrate = cached
+                    if probe.test_serial(pkts=1, timeout=cls.CACHED_TEST_TIMEOUT):
+                        return probe
+
+                for baud in baudrate:
+                    log.debug("Probe port {} at baudrate {}".format(port, baud))
+                    probe._serial.baudrate = baud
+                    if probe.test_serial(pkts=2):
+                        if baudrate_cache is not None:
+                            baudrate_cache.set(port, baud)
+                        return probe
+            except Exception as e:
+                log.error(e)
+
+            if baudrate_cache is not None:
+                baudrate_cache.discard(port)
+            probe.close()
+            probe.join()
+            return None
+
+        # the baudrates of one port are tried in turn, but up to max_workers ports are probed at once
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ports))))
+        futures = [executor.submit(probe_port, port) for port in ports]
         try:
-            for port in ports:
-                try:
-                    probe = cls(port=port, baudrate=115200)
-                    while probe._serial is None:
-                        pass
-                    for baud in baudrate:
-                        log.debug("Probe port {} at baudrate {}".format(port, baud))
-                        probe._serial.baudrate = baud
-                        if probe.test_serial(pkts=2):
-                            mote_probes.append(probe)
-                            break
-                except Exception as e:
-                    if probe:
-                        probe.close()
-                        probe.join()
-                    log.error(e)
+            for future in futures:
+                probe = future.result()
+                if probe is not None:
+                    mote_probes.append(probe)
+            executor.shutdown()
         except KeyboardInterrupt:
             # graceful exit
-            for mote in mote_probes:
-                mote.close()
-                mote.join()
-            if probe:
-                probe.close()
-                probe.join()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+            with started_lock:
+                for probe in started_probes:
+                    probe.close()
+                    probe.join()
             os.kill(os.getpid(), signal.SIGTERM)
+
+        if baudrate_cache is not None:
+            baudrate_cache.save()
+
         valid_motes = ['{0}'.format(p._portname) for p in mote_probes]
-        log.success("Discovered serial-port(s): {0}".format(valid_motes))
+        log.success("Discovered serial-port(s): {0} in {1:.2f}s ({2} port(s) probed)".format(
+            valid_motes, time.perf_counter() - start_time, len(ports)))
 
         return mote_probes
 
     # ======================== private =================================
 
-    def _send_data(self, data):
-        hdlc_data = self.hdlc.hdlcify(data).encode("utf-8")
+    def _send_data(self, hdlc_data):
         bytes_written = 0
-        self._serial.flush()
         while bytes_written != len(hdlc_data):
-            bytes_written += self._serial.write(hdlc_data)
+            bytes_written += self._serial.write(hdlc_data[bytes_written:])
+        self._serial.flush()
+
+    def _rcv_data(self):
+        if self._bulk_read:
+            # block (up to the serial timeout) for at least one byte, otherwise drain what is already buffered
+            rx_bytes = min(max(self._serial.in_waiting, 1), self._rx_chunk_size)
+        else:
+            rx_bytes = 1
 
-    def _rcv_data(self, rx_bytes=1):
         data = self._serial.read(rx_bytes)
-        if data == 0:
+        if not data:
             raise MoteProbeNoData
         else:
             return data
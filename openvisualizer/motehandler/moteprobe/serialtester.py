@@ -57,13 +57,13 @@ class SerialTester(EventBusClient):
     def _receive_data_from_mote_serial(self, data):
 
         # handle data
-        if chr(data[0]) == chr(openparser.OpenParser.SERFRAME_MOTE2PC_DATA):
+        if data[0] == openparser.OpenParser.SERFRAME_MOTE2PC_DATA:
             # don't handle if I'm not testing
             with self.data_lock:
                 if not self.busy_testing:
                     return
             with self.data_lock:
-                self.last_received = data[1 + 2 + 5:]  # type (1B), moteId (2B), ASN (5B)
+                self.last_received = list(data[1 + 2 + 5:])  # type (1B), moteId (2B), ASN (5B)
                 # wake up other thread
                 self.wait_for_reply.set()
 
@@ -131,11 +131,13 @@ class SerialTester(EventBusClient):
             with self.data_lock:
                 self.last_sent = packet_to_send[:]
 
+            # arm the reply event before sending, a fast mote may answer before dispatch() returns
+            self.wait_for_reply.clear()
+
             # send
             self.dispatch(
                 signal='fromMoteConnector@' + self.moteProbeSerialPort,
-                data=''.join(
-                    [chr(openparser.OpenParser.SERFRAME_PC2MOTE_TRIGGERSERIALECHO)] + [chr(b) for b in packet_to_send]),
+                data=bytes([openparser.OpenParser.SERFRAME_PC2MOTE_TRIGGERSERIALECHO] + packet_to_send),
             )
 
             with self.data_lock:
@@ -146,7 +148,6 @@ class SerialTester(EventBusClient):
             self._log('sent:     {0}'.format(self.format_list(self.last_sent)))
 
             # wait for answer
-            self.wait_for_reply.clear()
             if self.wait_for_reply.wait(timeout):
 
                 # log
@@ -52,9 +52,8 @@ class OpentestbedMoteProbe(MoteProbe):
 
     # ======================== private =================================
 
-    def _send_data(self, data):
-        hdlc_data = self.hdlc.hdlcify(data)
-        payload_buffer = {'token': 123, 'serialbytes': [ord(i) for i in hdlc_data]}
+    def _send_data(self, hdlc_data):
+        payload_buffer = {'token': 123, 'serialbytes': list(hdlc_data)}
 
         # publish the cmd message
         self.mqtt_client.publish(
@@ -64,7 +63,7 @@ class OpentestbedMoteProbe(MoteProbe):
 
     def _rcv_data(self):
         rx_bytes = self.mqtt_serial_queue.get()
-        return [chr(i) for i in rx_bytes]
+        return bytes(rx_bytes)
 
     def _detach(self):
         pass
@@ -320,6 +320,7 @@ class StateIdManager(StateElem):
         self.ebc = event_bus_client
         self.mote_connector = mote_connector
         self._is_dagroot = None
+        self._announced_dagroot = None
 
     def get_16b_addr(self) -> Optional[str]:
         try:
@@ -383,21 +384,26 @@ class StateIdManager(StateElem):
             notif.myPrefix_7,
         ]
 
-        # announce information about the DAG root to the eventBus
-        if self._is_dagroot != self.data[0]['isDAGroot']:
-            # dispatch
-            self.ebc.dispatch(
-                signal='infoDagRoot',
-                data={
-                    'isDAGroot': self.data[0]['isDAGroot'],
-                    'eui64': self.data[0]['my64bID'].addr,
-                    'serialPort': self.mote_connector.serialport,
-                },
-            )
-
         # record is_dagroot
         self._is_dagroot = self.data[0]['isDAGroot']
 
+    def announce(self):
+        """ Announces information about the DAG root to the eventBus if it changed, called without the state lock """
+        if self._announced_dagroot == self._is_dagroot:
+            return
+
+        self._announced_dagroot = self._is_dagroot
+
+        # dispatch
+        self.ebc.dispatch(
+            signal='infoDagRoot',
+            data={
+                'isDAGroot': self.data[0]['isDAGroot'],
+                'eui64': self.data[0]['my64bID'].addr,
+                'serialPort': self.mote_connector.serialport,
+            },
+        )
+
 
 class StateMyDagRank(StateElem):
     def update(self, notif=None, creator=None, owner=None):
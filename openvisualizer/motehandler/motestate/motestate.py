@@ -205,6 +205,9 @@ class MoteState(EventBusClient):
 
         }
 
+        # a namedtuple built elsewhere is matched on its fields, the maps are never changed once built
+        self._handlers_by_fields = {k._fields: v for k, v in self.notif_handlers.items()}
+
         self.mote_connector.received_status_notif = self._received_status_notif
 
         # initialize parent class
@@ -250,21 +253,19 @@ class MoteState(EventBusClient):
 
     def _received_status_notif(self, data):
         # log
-        log.debug("received {0}".format(data))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("received {0}".format(data))
+
+        # the parsers share the namedtuple classes, the type of the notification gives its handler
+        handler = self.notif_handlers.get(type(data))
+        if handler is None:
+            handler = self._handlers_by_fields.get(getattr(data, '_fields', None))
+            if handler is None:
+                raise SystemError("No handler for data {0}".format(data))
 
-        # lock the state data
+        # lock the state data only while it is updated
         with self.state_lock:
-            # call handler
-            found = False
-            for k, v in self.notif_handlers.items():
-                if self._is_namedtuple_instance(data, k):
-                    found = True
-                    v(data)
-                    break
-
-        if not found:
-            raise SystemError("No handler for data {0}".format(data))
-
-    @staticmethod
-    def _is_namedtuple_instance(var, tuple_instance):
-        return var._fields == tuple_instance._fields
+            handler(data)
+
+        # a change of DAG root is announced on the event bus once the state is unlocked
+        self.state[self.ST_IDMANAGER].announce()
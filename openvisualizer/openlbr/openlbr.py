@@ -6,7 +6,6 @@
 
 import logging
 import threading
-import time
 
 from openvisualizer.eventbus.eventbusclient import EventBusClient
 from openvisualizer.openlbr.sixlowpan_frag import Fragmentor
@@ -275,7 +274,6 @@ class OpenLbr(EventBusClient):
                     signal='bytesToMesh',
                     data=(list(lowpan['nextHop']), fragment),
                 )
-                time.sleep(0.01)
 
         except (ValueError, NotImplementedError) as err:
             log.error(err)
@@ -289,8 +287,10 @@ class OpenLbr(EventBusClient):
         port.
         """
         try:
+            # the parser hands over bytes, the 6LoWPAN processing below operates on lists of integers
+            address, payload = list(data[0]), list(data[1])
+
             # reassemble if 6LoWPAN was fragmented
-            address, payload = data
             reassembled = self.fragmentor.do_reassemble(payload)
 
             if reassembled is not None:
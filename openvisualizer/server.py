@@ -18,9 +18,14 @@ from xmlrpc.client import Fault
 
 from openvisualizer.eventbus import eventbusmonitor
 from openvisualizer.eventbus.eventbusclient import EventBusClient
+from openvisualizer.motehandler.ingeststats import ConnectorStats, ProbeStats
 from openvisualizer.motehandler.moteconnector.moteconnector import MoteConnector
+from openvisualizer.motehandler.moteconnector.openparser.parserstatus import StatusCache
+from openvisualizer.motehandler.moteprobe.asyncmoteprobe import AsyncSerialMoteProbe
 from openvisualizer.motehandler.moteprobe.emulatedmoteprobe import EmulatedMoteProbe
-from openvisualizer.motehandler.moteprobe.serialmoteprobe import SerialMoteProbe
+from openvisualizer.motehandler.moteprobe.frametrace import TraceRecorder
+from openvisualizer.motehandler.moteprobe.replaymoteprobe import ReplayMoteProbe
+from openvisualizer.motehandler.moteprobe.serialmoteprobe import BaudrateCache, SerialMoteProbe
 from openvisualizer.motehandler.motestate import motestate
 from openvisualizer.motehandler.motestate.motestate import MoteState
 from openvisualizer.openlbr import openlbr
@@ -28,8 +33,7 @@ from openvisualizer.opentun.opentun import OpenTun
 from openvisualizer.opentun.opentunnull import OpenTunNull
 from openvisualizer.rpl import rpl, topology
 from openvisualizer.simulator.simengine import SimEngine
-from openvisualizer.utils import extract_component_codes, extract_log_descriptions, extract_6top_rcs, \
-    extract_6top_states
+from openvisualizer.utils import extract_stack_defines, StackDefinesCache
 
 log = logging.getLogger('OpenVisualizer')
 
@@ -42,6 +46,12 @@ class OpenVisualizer(EventBusClient):
         SIMULATION = 1
         IOTLAB = 2
         TESTBED = 3
+        REPLAY = 4
+
+    PROBE_BACKENDS = {
+        'thread': SerialMoteProbe,
+        'asyncio': AsyncSerialMoteProbe,
+    }
 
     def __init__(self, config, mode, **kwargs):
 
@@ -54,12 +64,18 @@ class OpenVisualizer(EventBusClient):
         if self.mode == self.Mode.HARDWARE:
             self.baudrate = kwargs.get('baudrate')
             self.port_mask = kwargs.get('port_mask')
-            self.mote_probes = SerialMoteProbe.probe_serial_ports(port_mask=self.port_mask, baudrate=self.baudrate)
+            probe_cls = self.PROBE_BACKENDS[kwargs.get('probe_backend', 'thread')]
+            baudrate_cache = BaudrateCache() if kwargs.get('baudrate_cache', True) else None
+            self.mote_probes = probe_cls.probe_serial_ports(
+                port_mask=self.port_mask, baudrate=self.baudrate, baudrate_cache=baudrate_cache)
         elif self.mode == self.Mode.SIMULATION:
             self.num_of_motes = kwargs.get("num_of_motes")
             self.simulator = SimEngine(self.num_of_motes)
             self.mote_probes = [EmulatedMoteProbe(m_if) for m_if in self.simulator.mote_interfaces]
             self.simulator.start()
+        elif self.mode == self.Mode.REPLAY:
+            self.mote_probes = ReplayMoteProbe.from_trace(
+                kwargs.get('trace'), kwargs.get('speed', 1.0), kwargs.get('start'), kwargs.get('end'))
         elif self.mode == self.Mode.IOTLAB:
             pass
         elif self.mode == self.Mode.TESTBED:
@@ -73,6 +89,15 @@ class OpenVisualizer(EventBusClient):
         self.fw_path = config.fw_path
         self.page_zero = config.page_zero
 
+        for mp in self.mote_probes:
+            mp.tx_pacing = config.tx_pacing
+            mp.tx_coalesce = config.tx_coalesce
+            mp.set_rx_queue(config.rx_queue_size, config.rx_drop_policy)
+
+        self.recorder = None
+        if config.record_trace:
+            self.start_trace_recording(config.record_trace)
+
         self.ebm = eventbusmonitor.EventBusMonitor(kwargs.get("wireshark_debug"))
         self.lbr = openlbr.OpenLbr(self.page_zero)
         self.rpl = rpl.RPL()
@@ -91,6 +116,17 @@ class OpenVisualizer(EventBusClient):
 
         self._dagroot = None
 
+        if config.ingest_stats:
+            self.enable_ingest_stats()
+
+        if config.status_dedup:
+            self.enable_status_dedup()
+
+        if config.async_delivery:
+            self.enable_async_delivery()
+
+        self.set_log_window(config.log_window)
+
         if self.root:
             log.info(f"Setting DAGroot: {self.root}")
             Timer(2, self.set_dagroot, args=(self.root,)).start()
@@ -98,14 +134,7 @@ class OpenVisualizer(EventBusClient):
     def extract_stack_defines(self):
         """ Extract firmware definitions for the OpenVisualizer parser from the OpenWSN-FW files. """
         log.info('extracting firmware definitions.')
-        definitions = {
-            "components": extract_component_codes(os.path.join(self.fw_path, 'inc', 'defs.h')),
-            "log_descriptions": extract_log_descriptions(os.path.join(self.fw_path, 'inc', 'defs.h')),
-            "sixtop_returncodes": extract_6top_rcs(os.path.join(self.fw_path, 'stack', '02b-MAChigh', 'sixtop.h')),
-            "sixtop_states": extract_6top_states(os.path.join(self.fw_path, 'stack', '02b-MAChigh', 'sixtop.h')),
-        }
-
-        return definitions
+        return extract_stack_defines(self.fw_path, StackDefinesCache())
 
     def shutdown(self) -> None:
         """ Shutdown server and all its thread-based components. """
@@ -114,6 +143,7 @@ class OpenVisualizer(EventBusClient):
             self.simulator.shutdown()
             self.simulator.join()
 
+        self.disable_async_delivery()
         self.tun.close()
         # self.jrc.close()
 
@@ -121,6 +151,8 @@ class OpenVisualizer(EventBusClient):
             probe.close()
             probe.join()
 
+        self.stop_trace_recording()
+
         raise KeyboardInterrupt()
 
     # ======================== RPC functions ================================
@@ -284,8 +316,108 @@ class OpenVisualizer(EventBusClient):
     def get_wireshark_debug(self) -> bool:
         return self.ebm.wireshark_debug_enabled
 
-    def get_ebm_stats(self):
-        return self.ebm.get_stats()
+    def get_ebm_stats(self, intervals: bool = False) -> Dict[str, list]:
+        """ Returns the number and rate of the events per sender and signal, see EventBusMonitor.get_stats """
+        return self.ebm.get_stats(intervals)
+
+    def enable_ingest_stats(self) -> None:
+        """ Starts (or restarts from zero) collecting the ingest statistics of all the mote probes and connectors """
+        for mp in self.mote_probes:
+            mp.stats = ProbeStats()
+        for mc in self.mote_connectors:
+            mc.stats = ConnectorStats()
+
+    def disable_ingest_stats(self) -> None:
+        for mp in self.mote_probes:
+            mp.stats = None
+        for mc in self.mote_connectors:
+            mc.stats = None
+
+    def get_ingest_stats(self) -> Dict[str, Dict[str, Any]]:
+        """ Returns the probe and connector statistics of each port, empty while the statistics are disabled """
+        stats = {}
+        for mc in self.mote_connectors:
+            mp = mc.mote_probe
+            if mp.stats is not None and mc.stats is not None:
+                stats[mp.portname] = {'probe': mp.stats.to_dict(), 'connector': mc.stats.to_dict()}
+        return stats
+
+    def enable_status_dedup(self) -> None:
+        """ Stops parsing and forwarding to the mote states the status elements received unchanged """
+        for mc in self.mote_connectors:
+            mc.parser.parser_status.status_cache = StatusCache()
+
+    def disable_status_dedup(self) -> None:
+        for mc in self.mote_connectors:
+            mc.parser.parser_status.status_cache = None
+
+    def get_status_dedup_stats(self) -> Dict[str, Dict[str, int]]:
+        """ Returns the hits and misses of the status cache of each port, empty while deduplication is disabled """
+        stats = {}
+        for mc in self.mote_connectors:
+            status_cache = mc.parser.parser_status.status_cache
+            if status_cache is not None:
+                stats[mc.mote_probe.portname] = status_cache.to_dict()
+        return stats
+
+    def set_log_window(self, seconds: float) -> None:
+        """ Repeated mote log entries are counted instead of printed during seconds, 0 prints them all """
+        for mc in self.mote_connectors:
+            for lp in mc.parser.log_parsers:
+                lp.aggregation_window = seconds
+
+    def get_mote_log_stats(self) -> Dict[str, list]:
+        """ Returns the number of log entries received per mote, component and error code, keyed by port name """
+        return {
+            mc.mote_probe.portname: [entry for lp in mc.parser.log_parsers for entry in lp.get_error_info()]
+            for mc in self.mote_connectors
+        }
+
+    def enable_async_delivery(self) -> None:
+        """
+        Delivers the events to the TUN interface, the wireshark export and the DAO processing on their own threads.
+        """
+        self.tun.enable_async(['v6ToInternet'])
+        self.rpl.enable_async([(self.WILDCARD, self.PROTO_ICMPv6, rpl.RPL.IANA_ICMPv6_RPL_TYPE)])
+        self.ebm.enable_async()
+
+    def disable_async_delivery(self) -> None:
+        for subscriber in (self.tun, self.rpl, self.ebm):
+            subscriber.disable_async()
+
+    def get_async_stats(self) -> Dict[str, Dict[str, Any]]:
+        """ Returns the queue and lag statistics of the subscribers delivered asynchronously, keyed by name """
+        return {
+            subscriber.name: subscriber.worker.to_dict()
+            for subscriber in (self.tun, self.rpl, self.ebm) if subscriber.worker is not None
+        }
+
+    def start_trace_recording(self, path: str) -> None:
+        """ Records the frames received from all the motes to a trace file, which openv-server replay plays back """
+        self.stop_trace_recording()
+        self.recorder = TraceRecorder(path)
+        for mp in self.mote_probes:
+            mp.recorder = self.recorder
+
+    def stop_trace_recording(self) -> int:
+        """ Stops recording, returns the number of frames recorded """
+        recorder = self.recorder
+        if recorder is None:
+            return 0
+
+        for mp in self.mote_probes:
+            mp.recorder = None
+        recorder.close()
+        self.recorder = None
+        return recorder.frames
+
+    def get_rx_stats(self) -> Dict[str, Dict[str, int]]:
+        """ Returns the counters of the receive buffer of each mote probe (depth, frames, drops), keyed by port name """
+        return {mp.portname: mp.rx_stats for mp in self.mote_probes}
+
+    def get_tx_stats(self) -> Dict[str, Dict[str, float]]:
+        """ Returns the counters of the outgoing serial path of each mote probe, keyed by port name """
+        return {mp.portname: mp.tx_stats for mp in self.mote_probes}
 
     @staticmethod
     def _extract_mote_states(ms) -> Dict[int, str]:
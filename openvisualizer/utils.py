@@ -4,12 +4,18 @@
 # Released under the BSD 3-Clause license as published at the link below.
 # https://openwsn.atlassian.net/wiki/display/OW/License
 
+import hashlib
+import json
 import logging
+import os
 import re
 import threading
 import traceback
 
 import verboselogs
+from appdirs import user_data_dir
+
+from openvisualizer import APPNAME
 
 verboselogs.install()
 
@@ -310,3 +316,105 @@ def extract_6top_states(fw_6top_definitions_path):
                 codes_found[code] = name
 
     return codes_found
+
+
+class StackDefinesCache(object):
+    """
+    Firmware definitions extracted from the OpenWSN-FW sources, cached on disk across OpenVisualizer restarts.
+
+    Each entry remembers the path, modification time, size and SHA-1 of the file it was extracted from, and the VERSION
+    of the extractors. An entry is reused when it has the current VERSION and the file has the same modification time
+    and size, or else the same SHA-1 (e.g. after a fresh checkout).
+    """
+
+    FILENAME = 'stack_defines.json'
+    VERSION = 1  # increment when the extract_* functions or the format of the entries change
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else os.path.join(user_data_dir(APPNAME), self.FILENAME)
+        self.dirty = False
+        self._entries = {}
+
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (IOError, ValueError) as err:
+            log.warning("Ignoring firmware definitions cache {}: {}".format(self.path, err))
+
+    def get(self, name, source):
+        """ Returns the codes extracted as name from source, or None if the file changed since """
+        entry = self._entries.get(name)
+        source = os.path.abspath(source)
+        if not isinstance(entry, dict) or entry.get('version') != self.VERSION or entry.get('source') != source:
+            return None
+
+        stat = os.stat(source)
+        if entry.get('mtime') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+            if entry.get('sha1') != self._sha1(source):
+                return None
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self.dirty = True
+
+        # json keys are strings
+        return {int(code): value for code, value in entry['codes'].items()}
+
+    def set(self, name, source, codes):
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        self._entries[name] = {
+            'version': self.VERSION,
+            'source': source,
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha1': self._sha1(source),
+            'codes': codes,
+        }
+        self.dirty = True
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump(self._entries, f, indent=4, sort_keys=True)
+        except IOError as err:
+            log.error("Could not save firmware definitions cache {}: {}".format(self.path, err))
+        else:
+            self.dirty = False
+
+    @staticmethod
+    def _sha1(source):
+        with open(source, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+
+def extract_stack_defines(fw_path, cache=None):
+    """
+    Extracts the firmware definitions used by the parsers from the OpenWSN-FW sources in fw_path.
+
+    :param cache: a StackDefinesCache, the sources which did not change since the previous extraction are not scanned
+    """
+    defs_h = os.path.join(fw_path, 'inc', 'defs.h')
+    sixtop_h = os.path.join(fw_path, 'stack', '02b-MAChigh', 'sixtop.h')
+    extractors = [
+        ("components", extract_component_codes, defs_h),
+        ("log_descriptions", extract_log_descriptions, defs_h),
+        ("sixtop_returncodes", extract_6top_rcs, sixtop_h),
+        ("sixtop_states", extract_6top_states, sixtop_h),
+    ]
+
+    definitions = {}
+    for name, extract, source in extractors:
+        codes = cache.get(name, source) if cache is not None else None
+        if codes is None:
+            codes = extract(source)
+            if cache is not None:
+                cache.set(name, source, codes)
+        definitions[name] = codes
+
+    if cache is not None and cache.dirty:
+        cache.save()
+
+    return definitions
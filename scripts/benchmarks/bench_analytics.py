@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Offline analytics benchmark: openv-analyze over a generated multi-root trace of status, log and uinject data frames.
+
+Times the analysis in this process and in process pools of increasing size, with one shard per port and with time
+slices, and checks that every run produces the same summary.
+
+Run with: python -m scripts.benchmarks.bench_analytics
+"""
+
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import click
+
+from openvisualizer.analytics.batch import analyze, make_shards
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.frametrace import TraceRecorder
+from scripts.benchmarks.framegen import build_parser_trace, uinject_frame
+
+
+def _rounded(value):
+    """ The float sums depend on the sharding, in their last digits """
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {k: _rounded(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rounded(v) for v in value]
+    return value
+
+
+def build_trace(path, num_ports, num_frames, data_ratio=0.3, loss=0.05, motes_per_root=10, rate=100.0):
+    """ Records num_frames frames per port, a data_ratio of them uinject packets of which loss are lost """
+    rng = random.Random(0)
+    hdlc = openhdlc.OpenHdlc()
+    counters = {}
+    other = [build_parser_trace(num_frames, seed=port) for port in range(num_ports)]
+
+    with TraceRecorder(path) as recorder:
+        for i in range(num_frames):
+            for port in range(num_ports):
+                if rng.random() < data_ratio:
+                    src_id = (port << 8) + rng.randrange(motes_per_root)
+                    counter = counters[src_id] = counters.get(src_id, -1) + 1
+                    if rng.random() < loss:
+                        continue
+                    frame = uinject_frame(src_id, counter & 0xffff, rng.randint(5, 500), rng.randint(1, 4),
+                                          rng.randint(1, 4), rng.randint(1, 50), 1000)
+                else:
+                    frame = other[port][i]
+                recorder.record('root{}'.format(port), hdlc.hdlcify(frame), timestamp=i / rate)
+
+
+@click.command()
+@click.option('-p', '--ports', default=4, show_default=True, help='Number of ports (DAG roots) of the trace')
+@click.option('-n', '--frames', default=50000, show_default=True, help='Number of frames per port')
+@click.option('--slice', 'slice_length', default=60.0, show_default=True, help='Length of the time slices (s)')
+def cli(ports, frames, slice_length):
+    """ Measures the analysis throughput, in process and with process pools. """
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        trace = os.path.join(tmp_dir, 'trace.bin')
+        build_trace(trace, ports, frames)
+        make_shards([trace])  # builds the index
+
+        cpus = multiprocessing.cpu_count()
+        click.secho("Analyzing {} frames ({} bytes), {} CPUs\n".format(
+            ports * frames, os.path.getsize(trace), cpus), bold=True)
+
+        runs = [('in process', None, 1)]
+        runs += [('{} processes'.format(n), None, n) for n in sorted({2, cpus} - {1})]
+        runs += [('{} processes, slices'.format(n), slice_length, n) for n in sorted({2, cpus} - {1})]
+
+        click.secho("{:<24} {:>8} {:>10} {:>12}".format('run', 'shards', 'time (s)', 'frames/s'))
+        expected = None
+        for name, length, processes in runs:
+            shards = make_shards([trace], length)
+            start = time.perf_counter()
+            summary = analyze(shards, processes).to_dict()
+            elapsed = time.perf_counter() - start
+
+            summary.pop('shards')
+            summary = _rounded(summary)
+            if expected is None:
+                expected = summary
+            assert summary == expected
+
+            click.secho("{:<24} {:>8} {:>10.3f} {:>12.0f}".format(
+                name, len(shards), elapsed, summary['frames'] / elapsed))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmark of the FCS-16 backends available in openhdlc, plus a full dehdlcify() round per frame.
+
+Run with: python -m scripts.benchmarks.bench_crc16
+"""
+
+import random
+import timeit
+
+import click
+
+from openvisualizer.motehandler.moteprobe import openhdlc
+
+
+@click.command()
+@click.option('-n', '--frames', default=10000, show_default=True, help='Number of frames per measurement')
+@click.option('-l', '--frame-len', default=80, show_default=True, help='Length of each frame')
+def cli(frames, frame_len):
+    """ Reports the per-frame cost of each FCS-16 backend. """
+
+    rng = random.Random(0)
+    bufs = [bytes(rng.randint(0x00, 0xff) for _ in range(frame_len)) for _ in range(frames)]
+
+    click.secho("FCS-16 over {} frames of {} bytes (selected backend: {})\n".format(
+        frames, frame_len, openhdlc.fcs16.__name__), bold=True)
+
+    click.secho("{:<10} {:>12}".format('backend', 'us/frame'))
+    for name, backend in sorted(openhdlc.FCS16_BACKENDS.items()):
+        backend(bufs[0])  # builds lazily initialized tables
+        elapsed = timeit.timeit(lambda: [backend(b) for b in bufs], number=1)
+        click.secho("{:<10} {:>12.2f}".format(name, 1e6 * elapsed / frames))
+
+    hdlc = openhdlc.OpenHdlc()
+    frames_hdlc = [hdlc.hdlcify(b) for b in bufs]
+    elapsed = timeit.timeit(lambda: [hdlc.dehdlcify(f) for f in frames_hdlc], number=1)
+    click.secho("\ndehdlcify: {:.2f} us/frame".format(1e6 * elapsed / frames))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+Event bus benchmark: cost of EventBusClient.dispatch against the number of motes.
+
+Each mote brings the clients of a real server (a MoteConnector and a MoteState with their registrations), next to the
+network-wide clients (OpenLBR, RPL, topology, JRC, OpenTun). The indexed EventBusRegistry is compared with the former
+implementation, every client connected to the dispatcher and scanning its registrations on every event.
+
+Run with: python -m scripts.benchmarks.bench_eventbus
+"""
+
+import threading
+import time
+
+import click
+from pydispatch import dispatcher
+
+from openvisualizer.eventbus.eventbusclient import EventBusClient, signals_equivalent
+
+W = EventBusClient.WILDCARD
+DAGROOT = (0xbb, 0xbb, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x12, 0x4b, 0x00, 0x00, 0x00, 0x00, 0x01)
+
+
+class LegacyEventBusClient(object):
+    """ The former EventBusClient: connected to every signal, scanning its registrations """
+
+    def __init__(self, name, registrations):
+        self.data_lock = threading.RLock()
+        self.name = name
+        self.registrations = [dict(r, numRx=0) for r in registrations]
+        dispatcher.connect(receiver=self._event_bus_notification)
+
+    def dispatch(self, signal, data):
+        return dispatcher.send(sender=self.name, signal=signal, data=data)
+
+    def close(self):
+        dispatcher.disconnect(self._event_bus_notification)
+
+    def _event_bus_notification(self, signal, sender, data):
+        callback = None
+        with self.data_lock:
+            for r in self.registrations:
+                if signals_equivalent(r['signal'], signal) and (r['sender'] == sender or r['sender'] == W):
+                    callback = r['callback']
+                    break
+        if not callback:
+            return None
+        return callback(sender=sender, signal=signal, data=data)
+
+
+class IndexedEventBusClient(EventBusClient):
+
+    def close(self):
+        self.disconnect()
+
+
+def _callback(sender, signal, data):
+    return None
+
+
+def _registrations(*signals, sender=W):
+    return [{'sender': sender, 'signal': signal, 'callback': _callback} for signal in signals]
+
+
+def build_clients(cls, num_motes):
+    clients = [
+        cls('OpenLBR', _registrations('v6ToMesh', 'networkPrefix', 'infoDagRoot', 'fromMote.data')),
+        cls('RPL', _registrations('networkPrefix', 'infoDagRoot', 'getSourceRoute', (DAGROOT, 'icmpv6', 155))),
+        cls('topology', _registrations('updateParents', 'getParents')),
+        cls('JRC', _registrations('registerDagRoot', 'unregisterDagRoot', (DAGROOT, 'udp', 5683))),
+        cls('OpenTun', _registrations('v6ToInternet', 'getNetworkPrefix', (W, 'icmpv6', W))),
+    ]
+    for i in range(num_motes):
+        clients.append(cls('mote_connector@{}'.format(i), _registrations('infoDagRoot', 'cmdToMote')))
+        clients.append(cls('motestate@{}'.format(i), _registrations(
+            'fromMote.status', sender='mote_connector@{}'.format(i))))
+    return clients
+
+
+def _time(sender, signal, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        sender.dispatch(signal, None)
+    return (time.perf_counter() - start) / iterations
+
+
+@click.command()
+@click.option('-m', '--motes', default='1,10,50,100', show_default=True, help='Comma-separated numbers of motes')
+@click.option('-n', '--iterations', default=2000, show_default=True, help='Events dispatched per measurement')
+def cli(motes, iterations):
+    """ Measures the cost of dispatching the most frequent events. """
+
+    events = [
+        ('fromMote.status', 'status (1 client)'),
+        ('fromMote.data', 'data (1 client)'),
+        ((DAGROOT, 'udp', 5683), 'CoAP (2 clients)'),
+        ('infoDagRoot', 'infoDagRoot (all)'),
+    ]
+
+    click.secho("{:>6} {:<20} {:>12} {:>12} {:>8}".format('motes', 'event', 'legacy (us)', 'indexed (us)', 'speedup'),
+                bold=True)
+    for num_motes in (int(m) for m in motes.split(',')):
+        for signal, name in events:
+            results = []
+            for cls in (LegacyEventBusClient, IndexedEventBusClient):
+                clients = build_clients(cls, num_motes)
+                try:
+                    results.append(_time(clients[-2], signal, iterations))
+                finally:
+                    for client in clients:
+                        client.close()
+            click.secho("{:>6} {:<20} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+                num_motes, name, results[0] * 1e6, results[1] * 1e6, results[0] / results[1]))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmark for the HDLC deframer in MoteProbe._parse_bytes.
+
+Compares the chunk-oriented deframer against the previous byte-per-byte state machine (reproduced below) on a
+synthetic serial stream fed in chunks of various sizes. Both paths run the same dehdlcify/CRC step per frame. Also
+reports the cost of the ingest statistics (MoteProbe.stats) when enabled.
+
+Run with: python -m scripts.benchmarks.bench_hdlc_deframer
+"""
+
+import time
+
+import click
+
+from openvisualizer.motehandler.ingeststats import ProbeStats
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.mockmoteprobe import MockMoteProbe
+from scripts.benchmarks.framegen import build_serial_stream
+
+
+class ByteStateMachine(object):
+    """ The byte-per-byte deframer MoteProbe used before, operating on str buffers (converted back for the CRC). """
+
+    XOFF = chr(0x13)
+    XON = chr(0x11)
+    XONXOFF_ESCAPE = chr(0x12)
+    XONXOFF_MASK = 0x10
+    HDLC_FLAG = chr(0x7e)
+
+    def __init__(self, send_to_parser):
+        self.hdlc = openhdlc.OpenHdlc()
+        self.send_to_parser = send_to_parser
+        self.rx_buf = ''
+        self.hdlc_flag = False
+        self.receiving = False
+        self.xonxoff_escaping = False
+
+    def _handle_frame(self):
+        try:
+            self.send_to_parser(self.hdlc.dehdlcify(self.rx_buf.encode('latin-1')))
+        except openhdlc.HdlcException:
+            return False
+        return True
+
+    def _rx_buf_add(self, byte):
+        if byte == self.XONXOFF_ESCAPE:
+            self.xonxoff_escaping = True
+        else:
+            if self.xonxoff_escaping is True:
+                self.rx_buf += chr(ord(byte) ^ self.XONXOFF_MASK)
+                self.xonxoff_escaping = False
+            elif byte != self.XON and byte != self.XOFF:
+                self.rx_buf += byte
+
+    def _parse_bytes(self, octets):
+        for byte in octets:
+            if not self.receiving:
+                if self.hdlc_flag and byte != self.HDLC_FLAG:
+                    self.receiving = True
+                    self.hdlc_flag = False
+                    self.xonxoff_escaping = False
+                    self.rx_buf = self.HDLC_FLAG
+                    self._rx_buf_add(byte)
+                elif byte == self.HDLC_FLAG:
+                    self.hdlc_flag = True
+            else:
+                if byte != self.HDLC_FLAG:
+                    self._rx_buf_add(byte)
+                else:
+                    self.hdlc_flag = True
+                    self.receiving = False
+                    self._rx_buf_add(byte)
+                    if self._handle_frame():
+                        self.hdlc_flag = False
+
+
+def _run(parse_bytes, chunks):
+    start = time.perf_counter()
+    for chunk in chunks:
+        parse_bytes(chunk)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('-n', '--frames', default=20000, show_default=True, help='Number of frames in the stream')
+@click.option('-l', '--payload-len', default=40, show_default=True, help='Payload length of each frame')
+def cli(frames, payload_len):
+    """ Compares the byte-per-byte and the chunk-oriented HDLC deframers. """
+
+    stream, _ = build_serial_stream(frames, payload_len)
+    click.secho("Deframing {} frames ({} bytes)\n".format(frames, len(stream)), bold=True)
+
+    probe = MockMoteProbe('bench')
+    probe.close()
+    probe.join()
+
+    click.secho("{:<8} {:>14} {:>14} {:>10}".format('chunk', 'per-byte (f/s)', 'chunked (f/s)', 'speedup'))
+    for chunk_len in [1, 64, 1024, 4096]:
+        chunks = [stream[i:i + chunk_len] for i in range(0, len(stream), chunk_len)]
+
+        received = []
+        legacy = ByteStateMachine(received.append)
+        legacy_time = _run(legacy._parse_bytes, [c.decode('latin-1') for c in chunks])
+        assert len(received) == frames
+
+        received = []
+        probe.send_to_parser = received.append
+        chunked_time = _run(probe._parse_bytes, chunks)
+        assert len(received) == frames
+
+        click.secho("{:<8} {:>14.0f} {:>14.0f} {:>9.1f}x".format(
+            chunk_len, frames / legacy_time, frames / chunked_time, legacy_time / chunked_time))
+
+    click.secho("\n{:<8} {:>14} {:>14} {:>10}".format('chunk', 'stats off (f/s)', 'stats on (f/s)', 'overhead'))
+    for chunk_len in [64, 4096]:
+        chunks = [stream[i:i + chunk_len] for i in range(0, len(stream), chunk_len)]
+        probe.send_to_parser = lambda data: None
+
+        probe.stats = None
+        off_time = min(_run(probe._parse_bytes, chunks) for _ in range(3))
+        probe.stats = ProbeStats()
+        on_time = min(_run(probe._parse_bytes, chunks) for _ in range(3))
+        probe.stats = None
+
+        click.secho("{:<8} {:>14.0f} {:>14.0f} {:>9.1f}%".format(
+            chunk_len, frames / off_time, frames / on_time, 100 * (on_time - off_time) / off_time))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+uinject KPI aggregation benchmark: the running aggregates of ParserData (UinjectKpi) against the former sample lists.
+
+The former implementation appended every sample to per-mote lists, and re-summed and re-sorted them whenever the KPIs
+were published (on every packet with an MQTT broker). Reports the per-packet cost and the memory held after n packets.
+
+Run with: python -m scripts.benchmarks.bench_kpi
+"""
+
+import random
+import time
+import tracemalloc
+
+import click
+
+from openvisualizer.motehandler.moteconnector.openparser.kpistats import UinjectKpi
+
+
+class LegacyKpi(object):
+    """ The sample lists of ParserData.avg_kpi[src_id] and their publish_kpi computation, as before """
+
+    def __init__(self):
+        self.data = {'counter': [], 'latency': [], 'numCellsUsedTx': [], 'numCellsUsedRx': [], 'dutyCycle': []}
+
+    def add(self, counter, latency, cells_tx, cells_rx, duty_cycle):
+        self.data['counter'].append(counter)
+        self.data['latency'].append(latency)
+        self.data['numCellsUsedTx'].append(cells_tx)
+        self.data['numCellsUsedRx'].append(cells_rx)
+        self.data['dutyCycle'].append(duty_cycle)
+
+    def publish(self):
+        mote_data = self.data
+        avg_cells_usage = float(sum(mote_data['numCellsUsedTx']) / len(mote_data['numCellsUsedTx'])) / float(64)
+        avg_latency = sum(mote_data['latency']) / len(mote_data['latency'])
+        mote_data['counter'].sort()
+        avg_pdr = float(len(set(mote_data['counter']))) / float(1 + mote_data['counter'][-1] - mote_data['counter'][0])
+        return avg_cells_usage, avg_latency, avg_pdr
+
+
+class RunningKpi(UinjectKpi):
+
+    def publish(self):
+        return self.avg_cells_usage, self.avg_latency, self.avg_pdr
+
+
+def _samples(num_packets, seed=0):
+    rng = random.Random(seed)
+    return [(i & 0xffff, rng.randint(5, 500), rng.randint(1, 4), rng.randint(1, 4), rng.random() / 10)
+            for i in range(num_packets) if rng.random() > 0.05]
+
+
+def _feed(cls, samples, publish):
+    kpi = cls()
+    for sample in samples:
+        kpi.add(*sample)
+        if publish:
+            kpi.publish()
+    return kpi
+
+
+def _run(cls, samples, publish):
+    """ :returns: a tuple (time, memory held, published KPIs) """
+    start = time.perf_counter()
+    kpi = _feed(cls, samples, publish)
+    elapsed = time.perf_counter() - start
+
+    # measured apart, tracing slows down the allocations
+    tracemalloc.start()
+    kpi = _feed(cls, samples, False)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory, kpi.publish()
+
+
+@click.command()
+@click.option('-n', '--packets', default='1000,10000,50000', show_default=True,
+              help='Comma-separated numbers of uinject packets received from a mote')
+def cli(packets):
+    """ Measures the per-packet cost of the uinject KPIs, with and without publishing. """
+
+    click.secho("{:>8} {:<9} {:>14} {:>14} {:>14} {:>12}".format(
+        'packets', 'publish', 'legacy (us)', 'running (us)', 'legacy (KB)', 'running (KB)'), bold=True)
+    for num_packets in (int(n) for n in packets.split(',')):
+        samples = _samples(num_packets)
+        for publish in (False, True):
+            if publish and num_packets > 20000:
+                # O(n log n) per packet, the legacy run would take minutes
+                continue
+            legacy = _run(LegacyKpi, samples, publish)
+            running = _run(RunningKpi, samples, publish)
+            assert all(abs(a - b) < 1e-9 for a, b in zip(legacy[2], running[2]))
+            click.secho("{:>8} {:<9} {:>14.3f} {:>14.3f} {:>14.1f} {:>12.1f}".format(
+                num_packets, 'yes' if publish else 'no', legacy[0] / len(samples) * 1e6,
+                running[0] / len(samples) * 1e6, legacy[1] / 1024.0, running[1] / 1024.0))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmark for the sub-parser selection of OpenParser and ParserStatus.
+
+Compares the dispatch tables against the previous linear scans over the parsing keys (reproduced below), both feeding
+the same parser instances with a trace of deframed status and log frames, wrapped in a memoryview as done by
+MoteConnector. Also measures the status deduplication (ParserStatus.status_cache) on a trace where a mote cycles
+through its status elements and table rows, only some of them having changed since the previous copy.
+
+Run with: python -m scripts.benchmarks.bench_parser
+"""
+
+import logging
+import random
+import struct
+import time
+
+import click
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.moteconnector.openparser.parserexception import ParserException
+from openvisualizer.motehandler.moteconnector.openparser.parserstatus import StatusCache
+from scripts.benchmarks.framegen import build_parser_trace
+
+log = logging.getLogger('ParserStatus')
+
+
+class LinearScanParser(object):
+    """ The sub-parser selection used before: a scan over the parsing keys and a struct format parsed per frame. """
+
+    def __init__(self, open_parser):
+        self.open_parser = open_parser
+        self.parser_status = open_parser.parser_status
+
+    def parse_input(self, data):
+        for key in self.open_parser.parsing_keys:
+            if data[key.index] == key.val:
+                if key.parser is self.parser_status:
+                    return self._parse_status(data[self.open_parser.header_length:])
+                return key.parser.parse_input(data[self.open_parser.header_length:])
+        raise ParserException(ParserException.ExceptionType.NO_KEY)
+
+    def _parse_status(self, data):
+        (mote_id, status_elem) = struct.unpack('<HB', data[:3])
+        log.debug("moteId={0} statusElem={1}".format(mote_id, status_elem))
+        data = data[3:]
+        for key in self.parser_status.fields_parsing_keys:
+            if status_elem == key.val:
+                return_tuple = self.parser_status.named_tuple[key.name](*struct.unpack(key.structure, data))
+                log.debug("parsed into {0}".format(return_tuple))
+                return 'status', return_tuple
+        raise ParserException(ParserException.ExceptionType.NO_KEY)
+
+
+def _run(parse_input, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        parse_input(frame)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('-n', '--frames', default=50000, show_default=True, help='Number of frames in the trace')
+@click.option('-s', '--status-ratio', default=0.9, show_default=True, help='Fraction of status frames in the trace')
+@click.option('-c', '--change-ratio', default=0.2, show_default=True,
+              help='Fraction of changed status elements in the deduplication trace')
+def cli(frames, status_ratio, change_ratio):
+    """ Compares the linear-scan and the table-driven sub-parser selection. """
+
+    trace = [memoryview(frame) for frame in build_parser_trace(frames, status_ratio)]
+    click.secho("Parsing {} frames ({:.0f}% status)\n".format(frames, 100 * status_ratio), bold=True)
+
+    open_parser = OpenParser(None, {}, 'bench')
+    legacy = LinearScanParser(open_parser)
+
+    # both must agree before being timed
+    for frame in trace[:1000]:
+        assert legacy.parse_input(frame) == open_parser.parse_input(frame)
+
+    legacy_time = min(_run(legacy.parse_input, trace) for _ in range(3))
+    table_time = min(_run(open_parser.parse_input, trace) for _ in range(3))
+
+    click.secho("{:>16} {:>16} {:>10}".format('linear (f/s)', 'table (f/s)', 'speedup'))
+    click.secho("{:>16.0f} {:>16.0f} {:>9.1f}x".format(
+        frames / legacy_time, frames / table_time, legacy_time / table_time))
+
+    # one copy of each status element and table row, resent over and over, some of them with new content
+    fresh = build_parser_trace(frames, status_ratio=1.0)
+    rows = {}
+    for frame in fresh:
+        key = open_parser.parser_status.fields_dispatch[frame[3]]
+        rows.setdefault((frame[3], frame[4] if key.has_rows else None), frame)
+    pool = list(rows.values())
+    rng = random.Random(0)
+    trace = []
+    for i in range(frames):
+        frame = pool[i % len(pool)]
+        if rng.random() < change_ratio:
+            # same element (and row), new content
+            frame = frame[:5] + bytes(rng.randint(0x00, 0xff) for _ in range(len(frame) - 5))
+        trace.append(memoryview(frame))
+
+    open_parser.parser_status.status_cache = None
+    off_time = min(_run(open_parser.parse_input, trace) for _ in range(3))
+    open_parser.parser_status.status_cache = StatusCache()
+    on_time = min(_run(open_parser.parse_input, trace) for _ in range(3))
+    cache = open_parser.parser_status.status_cache
+
+    click.secho("\n{:>16} {:>16} {:>10} {:>10}".format('dedup off (f/s)', 'dedup on (f/s)', 'speedup', 'hit ratio'))
+    click.secho("{:>16.0f} {:>16.0f} {:>9.1f}x {:>9.1f}%".format(
+        frames / off_time, frames / on_time, off_time / on_time, 100.0 * cache.hits / (cache.hits + cache.misses)))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Scaling benchmark of the serial probe backends: aggregated frames/sec as a function of the number of serial ports.
+
+Every port is emulated by a pseudo-terminal. A single writer thread pushes the same pre-encoded stream into all the pty
+masters while the probes under test read the slave sides, either with one thread per port (SerialMoteProbe) or from one
+event loop (AsyncSerialMoteProbe).
+
+Run with: python -m scripts.benchmarks.bench_probe_scaling
+"""
+
+import os
+import select
+import threading
+import time
+
+import click
+
+from openvisualizer.motehandler.moteprobe.asyncmoteprobe import AsyncSerialMoteProbe
+from openvisualizer.motehandler.moteprobe.serialmoteprobe import SerialMoteProbe
+from scripts.benchmarks.framegen import build_serial_stream
+
+BACKENDS = {
+    'thread': SerialMoteProbe,
+    'asyncio': AsyncSerialMoteProbe,
+}
+
+
+class _FrameCounter(object):
+
+    def __init__(self, expected):
+        self.lock = threading.Lock()
+        self.expected = expected
+        self.received = 0
+        self.done = threading.Event()
+
+    def __call__(self, data):
+        with self.lock:
+            self.received += 1
+            if self.received >= self.expected:
+                self.done.set()
+
+
+def _write_all(masters, stream, chunk_len=1024):
+    """ Writes stream into every pty master without letting a full pty block the others. """
+    offsets = {fd: 0 for fd in masters}
+    while offsets:
+        _, writable, _ = select.select([], list(offsets), [], 1)
+        for fd in writable:
+            written = os.write(fd, stream[offsets[fd]:offsets[fd] + chunk_len])
+            offsets[fd] += written
+            if offsets[fd] >= len(stream):
+                del offsets[fd]
+
+
+def run_scaling(probe_cls, num_ports, stream, frames_per_port, timeout):
+    """ :returns: a tuple (frames_received, wall_time, cpu_time) """
+    ptys = [os.openpty() for _ in range(num_ports)]
+    for master, _ in ptys:
+        os.set_blocking(master, False)
+
+    counter = _FrameCounter(num_ports * frames_per_port)
+    probes = []
+    try:
+        for _, slave in ptys:
+            probe = probe_cls(port=os.ttyname(slave), baudrate=115200)
+            probe.send_to_parser = counter
+            probes.append(probe)
+
+        for probe in probes:
+            probe.wait_attached()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        _write_all([master for master, _ in ptys], stream)
+        counter.done.wait(timeout)
+
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+    finally:
+        for probe in probes:
+            probe.close()
+        for probe in probes:
+            probe.join()
+        for master, slave in ptys:
+            os.close(master)
+            os.close(slave)
+
+    return counter.received, wall_time, cpu_time
+
+
+@click.command()
+@click.option('-p', '--ports', default='1,4,16,64', show_default=True, help='Comma-separated numbers of ports')
+@click.option('-n', '--frames', default=2000, show_default=True, help='Number of frames sent on each port')
+@click.option('-l', '--payload-len', default=40, show_default=True, help='Payload length of each frame')
+@click.option('-t', '--timeout', default=120, show_default=True, help='Give up on a run after this many seconds')
+def cli(ports, frames, payload_len, timeout):
+    """ Compares the threaded and asyncio probe backends for a growing number of serial ports. """
+
+    stream, _ = build_serial_stream(frames, payload_len)
+    click.secho("{} frames ({} bytes) per port\n".format(frames, len(stream)), bold=True)
+
+    click.secho("{:<8} {:<8} {:>10} {:>10} {:>12} {:>10}".format(
+        'backend', 'ports', 'frames', 'wall (s)', 'frames/s', 'cpu (s)'))
+    for num_ports in [int(p) for p in ports.split(',')]:
+        for name, probe_cls in sorted(BACKENDS.items(), reverse=True):
+            received, wall_time, cpu_time = run_scaling(probe_cls, num_ports, stream, frames, timeout)
+            click.secho("{:<8} {:<8} {:>10} {:>10.3f} {:>12.0f} {:>10.3f}".format(
+                name, num_ports, received, wall_time, received / wall_time, cpu_time))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Ingest throughput benchmark: replays a frame trace through the full receive pipeline of OpenVisualizer.
+
+Each port of the trace is replayed as fast as possible by a ReplayMoteProbe feeding a MoteConnector (parsers, event
+bus) and a MoteState, as in openv-server replay --speed 0. Without --trace, a trace of status and log frames is
+generated first (and kept with --save).
+
+Run with: python -m scripts.benchmarks.bench_replay
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from openvisualizer.motehandler.ingeststats import ConnectorStats
+from openvisualizer.motehandler.moteconnector.moteconnector import MoteConnector
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.frametrace import TraceRecorder, read_trace
+from openvisualizer.motehandler.moteprobe.replaymoteprobe import ReplayMoteProbe
+from openvisualizer.motehandler.motestate.motestate import MoteState
+from scripts.benchmarks.framegen import build_parser_trace
+
+
+def build_trace(path, num_ports, num_frames, status_ratio=0.9, rate=100.0):
+    """ Records num_frames frames per port, each port sending one every 1/rate seconds """
+    hdlc = openhdlc.OpenHdlc()
+    frames = [build_parser_trace(num_frames, status_ratio, seed=port) for port in range(num_ports)]
+    with TraceRecorder(path) as recorder:
+        for i in range(num_frames):
+            for port in range(num_ports):
+                recorder.record('replay{}'.format(port), hdlc.hdlcify(frames[port][i]), timestamp=i / rate)
+
+
+def run_replay(path, timeout):
+    """ :returns: a tuple (frames, parse_errors, wall_time, cpu_time) """
+    expected = {}
+    for _, port, _ in read_trace(path):
+        expected[port] = expected.get(port, 0) + 1
+
+    probes = ReplayMoteProbe.from_trace(path, speed=0)
+    connectors = [MoteConnector(mp, {}, None) for mp in probes]
+    states = [MoteState(mc) for mc in connectors]
+    for mc in connectors:
+        mc.stats = ConnectorStats()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        deadline = time.monotonic() + timeout
+        for mc in connectors:
+            while mc.stats.frames + mc.stats.parse_errors < expected[mc.serialport] and time.monotonic() < deadline:
+                time.sleep(0.001)
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+    finally:
+        for mp in probes:
+            mp.close()
+        for mp in probes:
+            mp.join()
+
+    assert len(states) == len(probes)
+    frames = sum(mc.stats.frames for mc in connectors)
+    parse_errors = sum(mc.stats.parse_errors for mc in connectors)
+    return frames, parse_errors, wall_time, cpu_time
+
+
+@click.command()
+@click.option('--trace', type=click.Path(exists=True, dir_okay=False), help='Trace to replay')
+@click.option('-p', '--ports', default=4, show_default=True, help='Number of ports of the generated trace')
+@click.option('-n', '--frames', default=20000, show_default=True,
+              help='Number of frames per port of the generated trace')
+@click.option('--save', type=click.Path(dir_okay=False), help='Keep the generated trace in this file')
+@click.option('-t', '--timeout', default=120, show_default=True, help='Give up after this many seconds')
+def cli(trace, ports, frames, save, timeout):
+    """ Replays a trace through the receive pipeline at maximum speed. """
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if trace is None:
+            trace = save or os.path.join(tmp_dir, 'trace.bin')
+            build_trace(trace, ports, frames)
+
+        click.secho("Replaying {} ({} bytes)\n".format(trace, os.path.getsize(trace)), bold=True)
+        received, parse_errors, wall_time, cpu_time = run_replay(trace, timeout)
+
+        click.secho("{:>10} {:>12} {:>10} {:>12} {:>10}".format(
+            'frames', 'parse errors', 'wall (s)', 'frames/s', 'cpu (s)'))
+        click.secho("{:>10} {:>12} {:>10.3f} {:>12.0f} {:>10.3f}".format(
+            received, parse_errors, wall_time, (received + parse_errors) / wall_time, cpu_time))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    cli()
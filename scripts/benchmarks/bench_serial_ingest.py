@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+Serial ingest throughput benchmark for the SerialMoteProbe.
+
+A pseudo-terminal stands in for the USB serial port: the benchmark writes a pre-encoded stream of HDLC frames on the
+master side while a SerialMoteProbe reads from the slave side. It reports frames/sec and CPU time for the byte-per-read
+path and for the bulk-read path.
+
+Run with: python -m scripts.benchmarks.bench_serial_ingest
+"""
+
+import os
+import threading
+import time
+
+import click
+
+from openvisualizer.motehandler.moteprobe.serialmoteprobe import SerialMoteProbe
+from scripts.benchmarks.framegen import build_serial_stream
+
+WRITE_CHUNK = 1024  # bytes written to the pty master per os.write() call
+
+
+class _FrameCounter(object):
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.received = 0
+        self.done = threading.Event()
+
+    def __call__(self, data):
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+
+def run_ingest(stream, num_frames, bulk_read, timeout):
+    """
+    Pushes stream through a SerialMoteProbe attached to a pseudo-terminal.
+
+    :returns: a tuple (frames_received, wall_time, cpu_time)
+    """
+    master, slave = os.openpty()
+    probe = SerialMoteProbe(port=os.ttyname(slave), baudrate=115200, bulk_read=bulk_read)
+
+    try:
+        while probe.serial is None and probe.is_alive():
+            time.sleep(0.01)
+
+        counter = _FrameCounter(num_frames)
+        probe.send_to_parser = counter
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+
+        for i in range(0, len(stream), WRITE_CHUNK):
+            os.write(master, stream[i:i + WRITE_CHUNK])
+
+        counter.done.wait(timeout)
+
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+    finally:
+        probe.close()
+        probe.join()
+        os.close(master)
+        os.close(slave)
+
+    return counter.received, wall_time, cpu_time
+
+
+@click.command()
+@click.option('-n', '--frames', default=20000, show_default=True, help='Number of frames to push through the probe')
+@click.option('-l', '--payload-len', default=40, show_default=True, help='Payload length of each frame')
+@click.option('-t', '--timeout', default=120, show_default=True, help='Give up on a run after this many seconds')
+def cli(frames, payload_len, timeout):
+    """ Compares frames/sec and CPU time of the byte-per-read and bulk-read serial ingest paths. """
+
+    stream, _ = build_serial_stream(frames, payload_len)
+    click.secho("Pushing {} frames ({} bytes) through a pty-backed serial port\n".format(frames, len(stream)),
+                bold=True)
+
+    click.secho("{:<12} {:>10} {:>10} {:>12} {:>12}".format('mode', 'frames', 'wall (s)', 'frames/s', 'cpu (s)'))
+    for name, bulk_read in [('per-byte', False), ('bulk', True)]:
+        received, wall_time, cpu_time = run_ingest(stream, frames, bulk_read, timeout)
+        click.secho("{:<12} {:>10} {:>10.3f} {:>12.0f} {:>12.3f}".format(
+            name, received, wall_time, received / wall_time, cpu_time))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Startup benchmark of openv-server: extraction of the firmware definitions (OpenVisualizer.extract_stack_defines).
+
+Compares a cold start (sources scanned with the regular expressions), a warm start (definitions read from the
+StackDefinesCache) and a start after the sources were touched without being modified (SHA-1 check). Uses the firmware
+tree given with --fw-path (or $OPENWSN_FW_BASE), otherwise generates sources of a similar size.
+
+Run with: python -m scripts.benchmarks.bench_startup
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+from openvisualizer.utils import extract_stack_defines, StackDefinesCache
+
+
+def build_fw_tree(root, num_components=120, num_logs=250, num_rcs=16, num_states=40, filler=20):
+    """ Writes inc/defs.h and stack/02b-MAChigh/sixtop.h shaped like the OpenWSN-FW ones under root """
+    os.makedirs(os.path.join(root, 'inc'))
+    os.makedirs(os.path.join(root, 'stack', '02b-MAChigh'))
+
+    comment = ['// ' + 'x' * 60] * filler
+    with open(os.path.join(root, 'inc', 'defs.h'), 'w') as f:
+        lines = ['enum {']
+        lines += ['   COMPONENT_C{0:<20} = 0x{0:02x},'.format(i) for i in range(num_components)]
+        lines += ['};'] + comment + ['enum {']
+        lines += ['   ERR_E{0:<30} = 0x{0:02x}, // log description {0} [{{0}},{{1}}]'.format(i)
+                  for i in range(num_logs)]
+        lines += ['};'] + comment * 10
+        f.write('\n'.join(lines))
+
+    with open(os.path.join(root, 'stack', '02b-MAChigh', 'sixtop.h'), 'w') as f:
+        lines = ['#define IANA_6TOP_RC_R{0:<12} 0x{0:02x} // RC_{0}'.format(i) for i in range(num_rcs)]
+        lines += comment + ['typedef enum {']
+        lines += ['   SIX_STATE_S{0:<20} = 0x{0:02x},'.format(i) for i in range(num_states)]
+        lines += ['} six2six_state_t;'] + comment * 5
+        f.write('\n'.join(lines))
+
+
+def _timed(fw_path, cache_path=None, runs=20):
+    """ :returns: the best time of extract_stack_defines over runs """
+    best = float('inf')
+    for _ in range(runs):
+        cache = StackDefinesCache(cache_path) if cache_path is not None else None
+        start = time.perf_counter()
+        extract_stack_defines(fw_path, cache)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option('--fw-path', default=lambda: os.environ.get('OPENWSN_FW_BASE'), help='Path to the OpenWSN firmware')
+def cli(fw_path):
+    """ Measures the firmware definitions extraction done at every openv-server start. """
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if not fw_path:
+            fw_path = os.path.join(tmp_dir, 'openwsn-fw')
+            build_fw_tree(fw_path)
+        cache_path = os.path.join(tmp_dir, StackDefinesCache.FILENAME)
+        sources = [os.path.join(fw_path, 'inc', 'defs.h'), os.path.join(fw_path, 'stack', '02b-MAChigh', 'sixtop.h')]
+        click.secho("Firmware definitions from {} ({} bytes)\n".format(
+            fw_path, sum(os.path.getsize(s) for s in sources)), bold=True)
+
+        cold = _timed(fw_path)
+        extract_stack_defines(fw_path, StackDefinesCache(cache_path))
+        warm = _timed(fw_path, cache_path)
+
+        # new modification times, same content: every start checks the hashes and refreshes the cache
+        def touched():
+            for source in sources:
+                os.utime(source)
+            cache = StackDefinesCache(cache_path)
+            start = time.perf_counter()
+            extract_stack_defines(fw_path, cache)
+            return time.perf_counter() - start
+        touch = min(touched() for _ in range(20))
+
+        # whole process, from the interpreter start to the definitions being available
+        process = []
+        for cached in [False, True]:
+            code = 'from openvisualizer.utils import extract_stack_defines, StackDefinesCache; ' \
+                   'extract_stack_defines({!r}, {})'.format(
+                       fw_path, 'StackDefinesCache({!r})'.format(cache_path) if cached else None)
+            start = time.perf_counter()
+            subprocess.check_call([sys.executable, '-c', code])
+            process.append(time.perf_counter() - start)
+
+        click.secho("{:<24} {:>12}".format('extraction', 'time (ms)'))
+        click.secho("{:<24} {:>12.3f}".format('cold (regex scan)', cold * 1e3))
+        click.secho("{:<24} {:>12.3f}".format('warm (cached)', warm * 1e3))
+        click.secho("{:<24} {:>12.3f}".format('touched (sha1 check)', touch * 1e3))
+        click.secho("{:<24} {:>12.3f}".format('process, cold', process[0] * 1e3))
+        click.secho("{:<24} {:>12.3f}".format('process, warm', process[1] * 1e3))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    cli()
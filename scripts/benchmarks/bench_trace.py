@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+Trace reading benchmark: TraceReader (memory map and sidecar index) against read_trace (sequential scan).
+
+Times the index build and load, then a full read, a time window and a single port over the last part of the trace.
+Uses the trace given with --trace, otherwise generates one with bench_replay.
+
+Run with: python -m scripts.benchmarks.bench_trace
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import click
+
+from openvisualizer.motehandler.moteprobe.frametrace import TraceReader, read_trace
+from scripts.benchmarks.bench_replay import build_trace
+
+
+def _timed(func, repeat=3):
+    """ :returns: a tuple (best time, result) """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _scan(path, port=None, start=None, end=None):
+    count = 0
+    for timestamp, port_name, _ in read_trace(path):
+        if (port is None or port_name == port) and (start is None or timestamp >= start) and \
+                (end is None or timestamp <= end):
+            count += 1
+    return count
+
+
+def _indexed(reader, port=None, start=None, end=None):
+    return sum(1 for _ in reader.frames(port, start, end))
+
+
+@click.command()
+@click.option('--trace', type=click.Path(exists=True, dir_okay=False), help='Trace to read')
+@click.option('-p', '--ports', default=8, show_default=True, help='Number of ports of the generated trace')
+@click.option('-n', '--frames', default=100000, show_default=True,
+              help='Number of frames per port of the generated trace')
+def cli(trace, ports, frames):
+    """ Compares indexed and sequential queries over a trace. """
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if trace is None:
+            trace = os.path.join(tmp_dir, 'trace.bin')
+            build_trace(trace, ports, frames)
+        elif os.path.exists(trace + '.idx'):
+            os.remove(trace + '.idx')
+
+        click.secho("Reading {} ({} bytes)\n".format(trace, os.path.getsize(trace)), bold=True)
+
+        build, reader = _timed(lambda: TraceReader(trace), repeat=1)
+        reader.close()
+        load, reader = _timed(lambda: TraceReader(trace))
+
+        first, last = reader.first_timestamp, reader.last_timestamp
+        window = (first + 0.9 * (last - first), first + 0.91 * (last - first))
+        port = reader.ports[-1]
+        queries = [
+            ('all frames', {}),
+            ('1% time window', {'start': window[0], 'end': window[1]}),
+            ('1 port, last 10%', {'port': port, 'start': window[0]}),
+        ]
+
+        click.secho("{:<20} {:>12}".format('index', 'time (ms)'))
+        click.secho("{:<20} {:>12.3f}".format('build', build * 1e3))
+        click.secho("{:<20} {:>12.3f}".format('load', load * 1e3))
+        click.secho("")
+
+        click.secho("{:<20} {:>10} {:>12} {:>12} {:>8}".format('query', 'frames', 'scan (ms)', 'index (ms)', 'speedup'))
+        for name, kwargs in queries:
+            scan, expected = _timed(lambda: _scan(trace, **kwargs))
+            indexed, count = _timed(lambda: _indexed(reader, **kwargs))
+            assert count == expected
+            click.secho("{:<20} {:>10} {:>12.3f} {:>12.3f} {:>7.1f}x".format(
+                name, count, scan * 1e3, indexed * 1e3, scan / indexed))
+        reader.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    cli()
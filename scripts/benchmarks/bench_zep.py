@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""
+Gateway throughput with the wireshark (ZEP) debug export off and on.
+
+The packets received from a mote ('fromMote.data') go through OpenLbr to the Internet ('v6ToInternet', a null TUN
+interface here), while the EventBusMonitor exports a ZEP copy of each of them when wireshark debug is on. The export
+built from templates is compared with the former one, which built the IPv6/UDP packet with scapy and computed the
+FCS bit by bit.
+
+Run with: python -m scripts.benchmarks.bench_zep
+"""
+
+import time
+
+import click
+from pydispatch import dispatcher
+from scapy.compat import raw
+from scapy.layers.inet import UDP
+from scapy.layers.inet6 import IPv6
+
+from openvisualizer.eventbus.eventbusclient import EventBusClient
+from openvisualizer.eventbus.eventbusmonitor import EventBusMonitor
+from openvisualizer.openlbr.openlbr import OpenLbr
+from openvisualizer.opentun.opentun import OpenTun
+from openvisualizer.utils import calculate_fcs, format_ipv6_addr
+
+PREFIX = [0xbb, 0xbb, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]
+DAGROOT = [0x00, 0x12, 0x4b, 0x00, 0x00, 0x00, 0x00, 0x01]
+MOTE = [0x00, 0x12, 0x4b, 0x00, 0x00, 0x00, 0x00, 0x02]
+
+
+class LegacyEventBusMonitor(EventBusMonitor):
+    """ The former ZEP export """
+
+    @staticmethod
+    def _wrap_mac_and_zep(previous_hop, next_hop, lowpan):
+        phop = list(previous_hop[:])
+        phop.reverse()
+        nhop = list(next_hop[:])
+        nhop.reverse()
+
+        zep = [ord('E'), ord('X'), 0x02, 0x01, 0x00, 0x00, 0x01, 0x01, 0xff]
+        zep += [0x01] * 8 + [0x02] * 4 + [0x00] * 10
+        zep += [21 + len(lowpan) + 2]
+
+        mac = [0x41, 0xcc, 0x66, 0xfe, 0xca] + nhop + phop + list(lowpan)
+        mac += calculate_fcs(mac)
+        return zep + mac
+
+    @staticmethod
+    def _wrap_ipv6_udp(zep):
+        udp = UDP(sport=0, dport=17754)
+        udp.add_payload(bytes(zep))
+        addr = format_ipv6_addr(OpenTun.IPV6PREFIX + OpenTun.IPV6HOST)
+        ip = IPv6(version=6, tc=0, src=addr, hlim=64, dst=addr) / udp
+        return [b for b in raw(ip)]
+
+
+class NullTun(EventBusClient):
+
+    def __init__(self):
+        self.packets = 0
+        super(NullTun, self).__init__('OpenTun', registrations=[
+            {'sender': self.WILDCARD, 'signal': 'v6ToInternet', 'callback': self._v6_to_internet_notif},
+            {'sender': self.WILDCARD, 'signal': 'getSourceRoute', 'callback': self._get_source_route_notif},
+        ])
+
+    def _v6_to_internet_notif(self, sender, signal, data):
+        self.packets += 1
+
+    @staticmethod
+    def _get_source_route_notif(sender, signal, data):
+        return []
+
+
+def build_lowpan(lbr, payload_len):
+    """ A 6LoWPAN UDP packet from a mote to an Internet host """
+    src = format_ipv6_addr(PREFIX + MOTE)
+    pkt = IPv6(src=src, dst='2001:db8::1', hlim=64) / UDP(sport=61617, dport=61617) / (b'x' * payload_len)
+    ipv6 = lbr.disassemble_ipv6(list(raw(pkt)))
+    lowpan = lbr.ipv6_to_lowpan(ipv6)
+    lowpan['route'] = [ipv6['dst_addr']]
+    lowpan = lbr.reassemble_lowpan(lowpan)
+
+    # the RPI of a packet going up the DODAG, the encoder sets the down flag
+    for i in range(len(lowpan) - 1):
+        if lowpan[i] & lbr.MASK_6LoRH == lbr.CRITICAL_6LoRH and lowpan[i + 1] == lbr.TYPE_6LoRH_RPI:
+            lowpan[i] &= ~lbr.O_FLAG
+            break
+    return bytes(lowpan)
+
+
+def export_cost(monitor_cls, lowpan, packets):
+    """ Returns the time, in seconds, to build one ZEP debug packet, without sending it """
+    wrap_mac_and_zep = monitor_cls._wrap_mac_and_zep
+    wrap_ipv6_udp = monitor_cls._wrap_ipv6_udp
+    previous_hop = bytes(MOTE)
+
+    start = time.perf_counter()
+    for _ in range(packets):
+        list(wrap_ipv6_udp(wrap_mac_and_zep(previous_hop, DAGROOT, lowpan)))
+    return (time.perf_counter() - start) / packets
+
+
+def run(monitor_cls, wireshark_debug, lowpan, packets):
+    """ Returns the gateway throughput, in packets per second, and the number of exported ZEP packets """
+    monitor = monitor_cls(wireshark_debug)
+    monitor.dagoot_eui64 = DAGROOT
+    tun = NullTun()
+    lbr = OpenLbr(False)
+    lbr.network_prefix = PREFIX
+    lbr.dagRootEui64 = DAGROOT
+
+    data = (bytes(MOTE), lowpan)
+    try:
+        start = time.perf_counter()
+        for _ in range(packets):
+            dispatcher.send(sender='mote_connector@1', signal='fromMote.data', data=data)
+        elapsed = time.perf_counter() - start
+    finally:
+        dispatcher.disconnect(monitor._eventbus_notification)
+        tun.disconnect()
+        lbr.disconnect()
+
+    return packets / elapsed, tun.packets - packets
+
+
+@click.command()
+@click.option('-n', '--packets', default=5000, show_default=True, help='Packets forwarded per measurement')
+@click.option('-l', '--payload-len', default=40, show_default=True, help='UDP payload length')
+def cli(packets, payload_len):
+    """ Measures the gateway throughput with the ZEP export off, on (former export) and on (template export). """
+
+    lbr = OpenLbr(False)
+    lowpan = build_lowpan(lbr, payload_len)
+    lbr.disconnect()
+
+    configs = [
+        ('debug off', EventBusMonitor, False),
+        ('debug on, legacy export', LegacyEventBusMonitor, True),
+        ('debug on, template export', EventBusMonitor, True),
+    ]
+
+    click.secho("{} packets of {} bytes (6LoWPAN)\n".format(packets, len(lowpan)), bold=True)
+    click.secho("{:<28} {:>10} {:>12} {:>10}".format('config', 'pkt/s', 'us/pkt', 'relative'), bold=True)
+    baseline = None
+    for name, monitor_cls, wireshark_debug in configs:
+        rate, exported = run(monitor_cls, wireshark_debug, lowpan, packets)
+        assert exported == (packets if wireshark_debug else 0)
+        baseline = baseline or rate
+        click.secho("{:<28} {:>10.0f} {:>12.1f} {:>9.0f}%".format(name, rate, 1e6 / rate, 100 * rate / baseline))
+
+    click.secho("\n{:<28} {:>10}".format('ZEP packet only', 'us/pkt'), bold=True)
+    for name, monitor_cls in (('legacy export', LegacyEventBusMonitor), ('template export', EventBusMonitor)):
+        click.secho("{:<28} {:>10.1f}".format(name, 1e6 * export_cost(monitor_cls, lowpan, packets)))
+
+
+if __name__ == "__main__":
+    cli()
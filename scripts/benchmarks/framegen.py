@@ -0,0 +1,93 @@
+"""
+Helpers that generate synthetic mote-to-PC serial traffic for the benchmark scripts.
+"""
+
+import random
+
+from openvisualizer.motehandler.moteconnector.openparser.parserlogs import ParserLogs
+from openvisualizer.motehandler.moteconnector.openparser.parserstatus import ParserStatus
+from openvisualizer.motehandler.moteprobe.moteprobe import MoteProbe
+from openvisualizer.motehandler.moteprobe.openhdlc import OpenHdlc
+
+_XONXOFF_SPECIAL = (MoteProbe.XON, MoteProbe.XOFF, MoteProbe.XONXOFF_ESCAPE)
+
+
+def xonxoff_escape(buf):
+    """ Escapes XON, XOFF and the escape character itself, as done by the mote's UART driver. """
+    out_buf = bytearray()
+    for b in buf:
+        if b in _XONXOFF_SPECIAL:
+            out_buf += bytes([MoteProbe.XONXOFF_ESCAPE, b ^ MoteProbe.XONXOFF_MASK])
+        else:
+            out_buf.append(b)
+    return bytes(out_buf)
+
+
+def random_status_frame(rng, payload_len):
+    """ Returns the payload of a status frame ('S', mote id, status element) followed by random bytes. """
+    return bytes([ord('S'), 0x01, 0x00, rng.randint(0, 12)] + [rng.randint(0x00, 0xff) for _ in range(payload_len)])
+
+
+def build_serial_stream(num_frames, payload_len=40, seed=0):
+    """
+    Builds the raw byte stream a mote would put on the wire for num_frames status frames.
+
+    :returns: a tuple (stream, frames) with the HDLC and XON/XOFF encoded stream and the list of frame payloads
+    """
+    rng = random.Random(seed)
+    hdlc = OpenHdlc()
+
+    frames = []
+    stream = bytearray()
+    for _ in range(num_frames):
+        frame = random_status_frame(rng, payload_len)
+        frames.append(frame)
+        stream += xonxoff_escape(hdlc.hdlcify(frame))
+
+    return bytes(stream), frames
+
+
+def build_parser_trace(num_frames, status_ratio=0.9, seed=0):
+    """
+    Builds the deframed payloads the parser receives from a mote: well-formed status frames of every status element,
+    mixed with log frames.
+
+    :returns: the list of frame payloads
+    """
+    rng = random.Random(seed)
+    status_lengths = [(key.val, key.struct.size) for key in ParserStatus().fields_parsing_keys]
+
+    frames = []
+    for _ in range(num_frames):
+        if rng.random() < status_ratio:
+            status_elem, length = rng.choice(status_lengths)
+            frame = [ord('S'), 0x01, 0x00, status_elem] + [rng.randint(0x00, 0xff) for _ in range(length)]
+        else:
+            # mote id, component, error code, arg1, arg2
+            frame = [ParserLogs.LogSeverity.SEVERITY_INFO, 0x00, 0x01, rng.randint(0x00, 0xff), rng.randint(0x00, 0x20)]
+            frame += [rng.randint(0x00, 0xff) for _ in range(4)]
+        frames.append(bytes(frame))
+
+    return frames
+
+
+def uinject_frame(src_id, counter, latency, cells_tx=1, cells_rx=1, ticks_on=1, ticks_total=100):
+    """
+    Returns the payload of a data frame carrying a uinject packet, as the DAG root forwards it to ParserData.
+
+    :param src_id: the 16-bit id of the source mote
+    :param counter: the 16-bit packet counter of the source
+    :param latency: the number of slots between the packet generation and its reception by the root
+    """
+    asn_src = bytes([0x00, 0x01, 0x00, counter & 0xff, counter >> 8])
+    asn_root = bytes([latency & 0xff, 0x01 + (latency >> 8)]) + asn_src[2:]
+
+    payload = bytearray(40)
+    payload[-7:] = b'uinject'
+    payload[-14:-9] = asn_src  # the counter is carried in the last two bytes
+    payload[-15] = cells_tx
+    payload[-16] = cells_rx
+    payload[-18:-16] = bytes([src_id & 0xff, src_id >> 8])
+    payload[-22:-18] = ticks_on.to_bytes(4, 'little')
+    payload[-26:-22] = ticks_total.to_bytes(4, 'little')
+    return bytes([ord('D'), 0x01, 0x00]) + asn_root + bytes(16) + bytes(payload)
@@ -39,6 +39,7 @@ setup(
         'console_scripts': [
             'openv-server = openvisualizer.__main__:cli',
             'openv-client = openvisualizer.client.__main__:cli',
+            'openv-analyze = openvisualizer.analytics.__main__:cli',
             'openv-serial = scripts.serialtester_cli:cli',
             'openv-tun = scripts.ping_responder:cli',
         ],
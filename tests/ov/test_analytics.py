@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import json
+import struct
+
+import pytest
+from click.testing import CliRunner
+
+from openvisualizer.analytics.__main__ import cli
+from openvisualizer.analytics.batch import analyze, make_shards
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.frametrace import TraceRecorder
+
+# ============================ defines =================================
+
+# mote 0x0102, component 3, error code 0x10, arg1 5, arg2 6
+LOG_ENTRY = b'E\x01\x02\x03\x10\x00\x05\x00\x06'
+
+LOST = {3, 7}
+
+
+# ============================ helpers =================================
+
+def _uinject(src_id, counter, latency):
+    """ A data frame with a uinject packet, 25% duty cycle, 4 cells for tx and 3 for rx """
+    asn_src = bytes([0x00, 0x01, 0x00, counter & 0xff, counter >> 8])
+    payload = bytearray(40)
+    payload[-7:] = b'uinject'
+    payload[-14:-9] = asn_src
+    payload[-15] = 4
+    payload[-16] = 3
+    payload[-18:-16] = struct.pack('<H', src_id)
+    payload[-22:-18] = struct.pack('<I', 25)
+    payload[-26:-22] = struct.pack('<I', 100)
+    asn_root = bytes([latency, 0x01]) + asn_src[2:]
+    return b'D\x01\x00' + asn_root + bytes(16) + bytes(payload)
+
+
+# ============================ fixtures ================================
+
+@pytest.fixture
+def trace(tmp_path):
+    """ Two roots over 20s, the packets of mote 0xabcd counters 0 to 9 (but LOST) seen by the first one """
+    path = str(tmp_path / 'trace.bin')
+    hdlc = openhdlc.OpenHdlc()
+    with TraceRecorder(path) as recorder:
+        for i in range(10):
+            if i not in LOST:
+                recorder.record('root0', hdlc.hdlcify(_uinject(0xabcd, i, 10 + i)), timestamp=2.0 * i)
+            recorder.record('root1', hdlc.hdlcify(_uinject(0x1234, 100 + i, 5)), timestamp=2.0 * i + 1)
+            recorder.record('root1', hdlc.hdlcify(LOG_ENTRY), timestamp=2.0 * i + 1)
+        recorder.record('root0', b'\x7e\x01\x02\x03\x7e', timestamp=20.0)
+    return path
+
+
+# ============================ tests ===================================
+
+def test_analyze(trace):
+    summary = analyze(make_shards([trace]), processes=1).to_dict()
+
+    assert summary['shards'] == 2
+    assert summary['frames'] == 8 + 20
+    assert summary['hdlc_errors'] == 1
+    assert summary['frame_types'] == {'data': 18, 'error': 10}
+    assert (summary['first'], summary['last']) == (0.0, 19.0)
+
+    kpi = summary['kpi']['abcd']
+    assert kpi['packets'] == 8
+    assert kpi['avg_pdr'] == 0.8
+    assert (kpi['min_latency'], kpi['max_latency']) == (10, 19)
+    assert kpi['avg_latency'] == sum(10 + i for i in range(10) if i not in LOST) / 8
+    assert kpi['avg_dutyCycle'] == 0.25
+    assert kpi['avg_cellsUsage'] == 4 / 64.0
+    assert summary['kpi']['1234']['avg_pdr'] == 1.0
+    assert summary['network_kpi']['avg_pdr'] == 0.9
+
+    assert summary['logs'] == [{'severity': 'E', 'mote_id': 0x0102, 'component': 'unknown component code 3',
+                                'error_code': 0x10, 'count': 10}]
+
+
+@pytest.mark.parametrize('slice_length, processes', [(3.0, 1), (None, 2), (5.0, 2)])
+def test_analyze_sharding(trace, slice_length, processes):
+    expected = analyze(make_shards([trace]), processes=1).to_dict()
+    expected.pop('shards')
+
+    summary = analyze(make_shards([trace], slice_length), processes).to_dict()
+    summary.pop('shards')
+    assert summary == expected
+
+
+def test_make_shards(trace):
+    shards = make_shards([trace], 8.0)
+    assert [(s.port, s.start, s.end) for s in shards[:2]] == [('root0', 0.0, 8.0), ('root1', 0.0, 8.0)]
+    # slices starting at 0, 8 and 16 for each port
+    assert len(shards) == 6
+
+
+def test_cli(trace, tmp_path):
+    output = str(tmp_path / 'summary.json')
+    result = CliRunner().invoke(cli, [trace, '-o', output, '-j', '1', '--slice', '4', '--latency-samples', '16'])
+
+    assert result.exit_code == 0, result.output
+    with open(output) as f:
+        kpi = json.load(f)['kpi']['abcd']
+    assert kpi['packets'] == 8
+    assert kpi['max_latency'] == kpi['p99_latency'] == 19
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+import gc
+import random
+import sys
+import threading
+
+import pytest
+from pydispatch import dispatcher
+
+from openvisualizer.eventbus.eventbusclient import EventBusClient, signals_equivalent
+
+# ============================ defines =================================
+
+W = EventBusClient.WILDCARD
+ADDR_1 = (0xbb, 0xbb, 0x01)
+ADDR_2 = (0xbb, 0xbb, 0x02)
+
+
+# ============================ helpers =================================
+
+class _Client(EventBusClient):
+
+    def __init__(self, name, registrations=()):
+        self.received = []
+        super(_Client, self).__init__(name, registrations=[
+            {'sender': sender, 'signal': signal, 'callback': self._make_callback(tag)}
+            for sender, signal, tag in registrations
+        ])
+
+    def _make_callback(self, tag):
+        def _callback(sender, signal, data):
+            self.received.append((tag, sender, signal, data))
+            return tag
+
+        return _callback
+
+
+@pytest.fixture
+def switch_often():
+    """ Makes the threads switch far more often, to exercise the interleavings """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run_threads(*targets):
+    errors = []
+    barrier = threading.Barrier(len(targets))
+
+    def _run(target):
+        try:
+            barrier.wait()
+            target()
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=_run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+
+
+@pytest.fixture
+def clients():
+    created = []
+
+    def _create(*args):
+        client = _Client(*args)
+        created.append(client)
+        return client
+
+    yield _create
+    for client in created:
+        client.disconnect()
+
+
+# ============================ tests ===================================
+
+def test_exact_and_wildcard_signals(clients):
+    a = clients('a', [(W, 'fromMote.data', 'data'), (W, W, 'any')])
+    b = clients('b', [('mote_connector@1', 'fromMote.status', 'status')])
+    sender = clients('mote_connector@1')
+
+    assert sender.dispatch('fromMote.status', 1) == [(a.registrations[1]['callback'], 'any'),
+                                                     (b.registrations[0]['callback'], 'status')]
+    # the first matching registration of a client wins
+    assert sender.dispatch('fromMote.data', 2) == [(a.registrations[0]['callback'], 'data')]
+    # tuple signals do not match the string wildcard
+    assert sender.dispatch((ADDR_1, 'udp', 5683), 3) == []
+    assert len(a.received) == 2 and len(b.received) == 1
+
+
+def test_sender_filter(clients):
+    state = clients('motestate@1', [('mote_connector@1', 'fromMote.status', 'status')])
+
+    clients('mote_connector@2').dispatch('fromMote.status', None)
+    assert state.received == []
+    clients('mote_connector@1').dispatch('fromMote.status', None)
+    assert len(state.received) == 1
+
+
+def test_tuple_wildcards(clients):
+    exact = clients('exact', [(W, (ADDR_1, 'udp', 5683), 'exact')])
+    port = clients('port', [(W, (W, 'udp', 5683), 'port')])
+    proto = clients('proto', [(W, (ADDR_2, 'icmpv6', W), 'proto')])
+    sender = clients('sender')
+
+    assert [r for _, r in sender.dispatch((ADDR_1, 'udp', 5683), None)] == ['exact', 'port']
+    assert [r for _, r in sender.dispatch((ADDR_2, 'udp', 5683), None)] == ['port']
+    assert [r for _, r in sender.dispatch((ADDR_2, 'icmpv6', 0), None)] == ['proto']
+    # an event carrying a wildcard reaches every equivalent subscription
+    assert [r for _, r in sender.dispatch((W, 'udp', 5683), None)] == ['exact', 'port']
+    assert (len(exact.received), len(port.received), len(proto.received)) == (2, 3, 1)
+
+
+def test_unregister_and_disconnect(clients):
+    client = clients('client', [(W, 'signal', 'signal')])
+    sender = clients('sender')
+    callback = client.registrations[0]['callback']
+
+    with pytest.raises(SystemError):
+        client.register(W, 'signal', callback)
+
+    client.unregister(W, 'signal', callback)
+    assert sender.dispatch('signal', None) == []
+
+    client.register(W, 'signal', callback)
+    assert sender._dispatch_and_get_result('signal', None) == 'signal'
+    client.disconnect()
+    assert not sender._dispatch_protocol('signal', None)
+
+
+def test_collected_client(clients):
+    sender = clients('sender')
+    client = _Client('transient', [(W, 'signal', 'signal')])
+    del client
+    gc.collect()
+
+    assert sender.dispatch('signal', None) == []
+
+
+def test_raw_dispatcher_events(clients):
+    client = clients('client', [(W, 'v6ToInternet', 'v6')])
+    dispatcher.send(sender='EventBusMonitor', signal='v6ToInternet', data=[1])
+    assert client.received == [('v6', 'EventBusMonitor', 'v6ToInternet', [1])]
+
+
+def test_matches_linear_scan(clients):
+    """ The indexed lookup notifies the same callbacks as scanning every registration of every client """
+    rng = random.Random(0)
+    senders = ['s1', 's2', W]
+    signals = ['a', 'b', W, (ADDR_1, 'udp', 1), (ADDR_2, 'udp', 1), (ADDR_1, 'icmpv6', 2)]
+
+    def _random_signal():
+        signal = rng.choice(signals)
+        if isinstance(signal, tuple):
+            signal = tuple(W if rng.random() < 0.3 else e for e in signal)
+        return signal
+
+    created = []
+    for i in range(20):
+        registrations = [(rng.choice(senders), _random_signal(), '{}.{}'.format(i, j))
+                         for j in range(rng.randint(1, 4))]
+        # no duplicates
+        registrations = list({(r[0], r[1]): r for r in registrations}.values())
+        created.append(clients('client{}'.format(i), registrations))
+
+    for _ in range(200):
+        sender, signal = rng.choice(senders[:2]), _random_signal()
+        expected = []
+        for client in created:
+            for reg in client.registrations:
+                if signals_equivalent(reg['signal'], signal) and reg['sender'] in (sender, W):
+                    expected.append(reg['callback'])
+                    break
+
+        assert [callback for callback, _ in clients(sender).dispatch(signal, None)] == expected
+
+
+def test_async_delivery(clients):
+    client = clients('client', [(W, 'signal', 'signal'), (W, (ADDR_1, 'icmpv6', 155), 'dao'), (W, 'other', 'other')])
+    sender = clients('sender')
+
+    with pytest.raises(ValueError):
+        client.enable_async(['getSourceRoute'])
+    assert client.worker is None
+
+    client.enable_async(['signal', (W, 'icmpv6', 155)])
+    callbacks = [reg['callback'] for reg in client.registrations]
+    # the asynchronous callbacks are taken to accept the event
+    assert sender.dispatch('signal', 1) == [(callbacks[0], True)]
+    assert sender._dispatch_protocol((ADDR_1, 'icmpv6', 155), 2)
+    assert sender.dispatch('other', 3) == [(callbacks[2], 'other')]
+
+    # the registrations made later follow the same rule
+    client.register(W, 'late', client._make_callback('late'))
+    client.enable_async(['signal', (W, 'icmpv6', 155), 'late'])
+    assert sender.dispatch('late', 4) == [(client.registrations[3]['callback'], True)]
+
+    worker = client.worker
+    client.disable_async()
+    assert client.worker is None and worker.to_dict()['delivered'] == 3
+    assert sorted(data for _, _, _, data in client.received) == [1, 2, 3, 4]
+    assert sender.dispatch('signal', 5) == [(callbacks[0], 'signal')]
+
+
+def test_concurrent_register_and_dispatch(clients, switch_often):
+    """ Events keep reaching the stable subscribers, exactly once, while other clients come and go """
+    stable = clients('stable', [(W, 'signal', 'signal'), (W, (ADDR_1, 'udp', W), 'udp')])
+    num_events = 2000
+
+    def _dispatch():
+        sender = _Client('sender')
+        for i in range(num_events):
+            sender.dispatch('signal' if i % 2 else (ADDR_1, 'udp', i), i)
+        sender.disconnect()
+
+    def _churn():
+        for i in range(200):
+            client = _Client('transient', [(W, 'signal', 'signal'), (W, (W, 'udp', i), 'udp')])
+            client.register(W, W, client._make_callback('any'))
+            client.unregister(W, (W, 'udp', i), client.registrations[1]['callback'])
+            if i % 2:
+                client.disconnect()
+            del client
+
+    _run_threads(_dispatch, _dispatch, _dispatch, _churn, _churn)
+
+    assert len(stable.received) == 3 * num_events
+    for tag, _, signal, data in stable.received:
+        assert tag == ('signal' if data % 2 else 'udp')
+
+    # only the stable client is left, the leftovers of the collected transient clients are pruned
+    gc.collect()
+    assert [r for _, r in clients('sender').dispatch('signal', None)] == ['signal']
+
+
+def test_concurrent_registrations(clients, switch_often):
+    """ Registrations made concurrently, on one client or many, are all kept """
+    shared = clients('shared')
+    num_threads, num_signals = 6, 50
+    own = [clients('own{}'.format(t)) for t in range(num_threads)]
+
+    def _register(t):
+        def _run():
+            for i in range(num_signals):
+                signal = 'signal.{}.{}'.format(t, i)
+                shared.register(W, signal, shared._make_callback(signal))
+                own[t].register(W, signal, own[t]._make_callback(signal))
+        return _run
+
+    _run_threads(*[_register(t) for t in range(num_threads)])
+
+    assert len(shared.registrations) == num_threads * num_signals
+    sender = clients('sender')
+    for t in range(num_threads):
+        for i in range(num_signals):
+            signal = 'signal.{}.{}'.format(t, i)
+            assert [r for _, r in sender.dispatch(signal, None)] == [signal, signal]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import random
+import threading
+import time
+
+import mock
+from pydispatch import dispatcher
+from scapy.compat import raw
+from scapy.layers.inet import UDP
+from scapy.layers.inet6 import IPv6
+
+from openvisualizer.eventbus.eventbusmonitor import EventBusMonitor
+from openvisualizer.opentun.opentun import OpenTun
+from openvisualizer.utils import calculate_fcs, format_ipv6_addr
+
+
+# ============================ helpers =================================
+
+def _send(sender, signal, num):
+    for i in range(num):
+        dispatcher.send(sender=sender, signal=signal, data=i)
+
+
+def _zep_reference(channel, mac):
+    """ The ZEP debug packet, as built with scapy """
+    zep = [ord('E'), ord('X'), 0x02, 0x01, channel, 0x00, 0x01, 0x01, 0xff] + [0x01] * 8 + [0x02] * 4 + [0x00] * 10
+    zep += [len(mac) + 2] + mac + calculate_fcs(mac)
+
+    addr = format_ipv6_addr(OpenTun.IPV6PREFIX + OpenTun.IPV6HOST)
+    udp = UDP(sport=0, dport=17754)
+    udp.add_payload(bytes(zep))
+    return list(raw(IPv6(version=6, tc=0, src=addr, hlim=64, dst=addr) / udp))
+
+
+# ============================ tests ===================================
+
+def test_monitor_counts_per_thread():
+    monitor = EventBusMonitor(wireshark_debug=False)
+
+    threads = [threading.Thread(target=_send, args=('mote_connector@{}'.format(i % 2), 'fromMote.status', 500))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _send('OpenLBR', ('bbbb', 'udp', 5683), 3)
+
+    assert monitor.stats[('mote_connector@0', 'fromMote.status')] == 1000
+    assert monitor.stats[('mote_connector@1', 'fromMote.status')] == 1000
+    assert monitor.stats[('OpenLBR', ('bbbb', 'udp', 5683))] == 3
+
+    # the counters of the threads which exited are kept, not their dictionaries
+    assert len(monitor._thread_stats) == 1
+    assert monitor.stats[('mote_connector@0', 'fromMote.status')] == 1000
+
+
+def test_monitor_get_stats():
+    monitor = EventBusMonitor(wireshark_debug=False)
+    _send('sender', 'signal', 10)
+    _send('sender', ('bbbb', 'udp', 5683), 1)
+
+    snapshot = monitor.get_stats()
+    assert snapshot['fields'] == EventBusMonitor.STATS_FIELDS
+    stats = {(row[0], row[1]): dict(zip(snapshot['fields'], row)) for row in snapshot['rows']}
+    assert stats[('sender', 'signal')]['num'] == 10
+    assert stats[('sender', 'signal')]['rate'] > 0
+
+    # the tuple signals are returned as strings
+    assert stats[('sender', "('bbbb', 'udp', 5683)")]['num'] == 1
+
+
+def test_monitor_rate():
+    monitor = EventBusMonitor(wireshark_debug=False)
+    clock = mock.Mock(return_value=1000.0)
+
+    with mock.patch('openvisualizer.eventbus.eventbusmonitor.time.monotonic', clock):
+        # 10 events per second for 20 s, then 2 per second
+        for i in range(200):
+            clock.return_value = 1000.0 + i / 10.0
+            dispatcher.send(sender='sender', signal='signal', data=None)
+        for i in range(20):
+            clock.return_value = 1020.0 + i / 2.0
+            dispatcher.send(sender='sender', signal='signal', data=None)
+
+        def rate():
+            return dict(zip(EventBusMonitor.STATS_FIELDS, monitor.get_stats()['rows'][0]))['rate']
+
+        clock.return_value = 1030.0
+        assert rate() == 2.0
+        # nothing since, the rate falls to zero
+        clock.return_value = 1032.5
+        assert rate() == 1.0
+        clock.return_value = 1040.0
+        assert rate() == 0.0
+
+
+def test_monitor_intervals():
+    monitor = EventBusMonitor(wireshark_debug=False)
+    for _ in range(5):
+        dispatcher.send(sender='sender', signal='signal', data=None)
+        time.sleep(0.01)
+
+    snapshot = monitor.get_stats(intervals=True)
+    assert snapshot['fields'] == EventBusMonitor.STATS_FIELDS + EventBusMonitor.INTERVAL_FIELDS
+    stats = dict(zip(snapshot['fields'], snapshot['rows'][0]))
+    assert stats['interval_mean'] >= 0.01
+    # the percentiles are powers of two microseconds, upper bounds of the intervals
+    assert stats['interval_max'] >= stats['interval_p50'] >= 0.01
+    assert stats['interval_p50'] in [(1 << i) / 1e6 for i in range(24)]
+
+    # the histogram of the intervals, 10 ms fall in the bucket of 2**14 us
+    assert len(stats['intervals']) == 24
+    assert sum(stats['intervals']) == 4
+    assert sum(stats['intervals'][14:]) == 4
+
+
+def test_monitor_zep_export():
+    monitor = EventBusMonitor(wireshark_debug=True)
+    exported = []
+
+    def _v6_to_internet(sender, signal, data):
+        exported.append(data)
+
+    dispatcher.connect(_v6_to_internet, signal='v6ToInternet')
+    try:
+        rng = random.Random(0)
+        for _ in range(200):
+            previous_hop = [rng.randint(0x00, 0xff) for _ in range(8)]
+            lowpan = [rng.randint(0x00, 0xff) for _ in range(rng.randint(0, 100))]
+            monitor._dispatch_mesh_debug_packet(monitor._wrap_mac_and_zep(previous_hop, monitor.dagoot_eui64, lowpan))
+            mac = [0x41, 0xcc, 0x66, 0xfe, 0xca] + monitor.dagoot_eui64[::-1] + previous_hop[::-1] + lowpan
+            assert exported[-1] == _zep_reference(0, mac)
+
+            body = [rng.randint(0x00, 0xff) for _ in range(rng.randint(0, 125))]
+            channel = rng.randint(11, 26)
+            monitor._dispatch_mesh_debug_packet(monitor._wrap_zep_crc(body, channel))
+            assert exported[-1] == _zep_reference(channel, body)
+    finally:
+        dispatcher.disconnect(_v6_to_internet, signal='v6ToInternet')
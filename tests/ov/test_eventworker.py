@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import threading
+
+from openvisualizer.eventbus.eventworker import EventWorker
+
+
+# ============================ helpers =================================
+
+class _Recorder(object):
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.received = []
+        self.threads = set()
+
+    def callback(self, sender, signal, data):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.threads.add(threading.current_thread())
+        self.received.append((sender, signal, data))
+
+
+# ============================ tests ===================================
+
+def test_eventworker_delivers_in_order():
+    recorder = _Recorder()
+    worker = EventWorker('test')
+    for i in range(100):
+        assert worker.put(recorder.callback, 'sender', 'signal', i)
+    worker.close(timeout=5)
+
+    assert recorder.received == [('sender', 'signal', i) for i in range(100)]
+    assert threading.current_thread() not in recorder.threads
+
+    stats = worker.to_dict()
+    assert (stats['queued'], stats['delivered'], stats['dropped'], stats['depth']) == (100, 100, 0, 0)
+    assert stats['lag']['count'] == stats['duration']['count'] == 100
+
+
+def test_eventworker_drops_oldest():
+    gate = threading.Event()
+    recorder = _Recorder(gate)
+    worker = EventWorker('test', maxlen=3)
+
+    # the first event blocks the worker, the queue fills up behind it
+    worker.put(recorder.callback, 'sender', 'signal', 0)
+    while len(worker):
+        pass
+    results = [worker.put(recorder.callback, 'sender', 'signal', i) for i in range(1, 6)]
+    assert results == [True, True, True, False, False]
+
+    gate.set()
+    worker.close(timeout=5)
+    assert [data for _, _, data in recorder.received] == [0, 3, 4, 5]
+    assert worker.to_dict()['dropped'] == 2
+    assert worker.to_dict()['max_depth'] == 3
+
+
+def test_eventworker_callback_error():
+    def _fail(sender, signal, data):
+        raise ValueError(data)
+
+    recorder = _Recorder()
+    worker = EventWorker('test')
+    worker.put(_fail, 'sender', 'signal', 0)
+    worker.put(recorder.callback, 'sender', 'signal', 1)
+    worker.close(timeout=5)
+
+    assert recorder.received == [('sender', 'signal', 1)]
+    assert worker.to_dict()['errors'] == 1
+    assert not worker.put(recorder.callback, 'sender', 'signal', 2)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import pytest
+
+from openvisualizer.motehandler.moteprobe.framequeue import FrameQueue
+
+# ============================ defines =================================
+
+STATUS_1 = b'S\x01\x00\x01'
+STATUS_2 = b'S\x01\x00\x02'
+DATA_1 = b'D\x01'
+DATA_2 = b'D\x02'
+LOG_1 = b'E\x01'
+
+
+# ============================ helpers =================================
+
+def _drain(frame_queue):
+    frame_queue.close()
+    frames = []
+    frame = frame_queue.get()
+    while frame is not None:
+        frames.append(frame)
+        frame = frame_queue.get()
+    return frames
+
+
+# ============================ tests ===================================
+
+def test_framequeue_unknown_policy():
+    with pytest.raises(ValueError):
+        FrameQueue(4, 'drop-newest')
+
+
+@pytest.mark.parametrize('policy', FrameQueue.POLICIES)
+def test_framequeue_fifo(policy):
+    frame_queue = FrameQueue(8, policy)
+    frames = [STATUS_1, DATA_1, STATUS_2, LOG_1, DATA_2]
+    for frame in frames:
+        assert frame_queue.put(frame)
+
+    assert len(frame_queue) == len(frames)
+    assert _drain(frame_queue) == frames
+    assert frame_queue.stats == {'queue_depth': 0, 'frames': 5, 'dropped': 0, 'dropped_status': 0}
+
+
+def test_framequeue_drop_oldest():
+    frame_queue = FrameQueue(3, FrameQueue.DROP_OLDEST)
+    for frame in [DATA_1, STATUS_1, DATA_2]:
+        frame_queue.put(frame)
+
+    assert not frame_queue.put(LOG_1)
+    assert not frame_queue.put(STATUS_2)
+
+    assert _drain(frame_queue) == [DATA_2, LOG_1, STATUS_2]
+    assert frame_queue.stats['dropped'] == 2
+    assert frame_queue.stats['dropped_status'] == 1
+
+
+def test_framequeue_drop_status_first():
+    frame_queue = FrameQueue(3, FrameQueue.DROP_STATUS_FIRST)
+    for frame in [DATA_1, STATUS_1, STATUS_2]:
+        frame_queue.put(frame)
+
+    # the status frames go first, then the oldest of the remaining frames
+    assert not frame_queue.put(DATA_2)
+    assert not frame_queue.put(LOG_1)
+    assert not frame_queue.put(b'')
+
+    assert _drain(frame_queue) == [DATA_2, LOG_1, b'']
+    assert frame_queue.stats['dropped'] == 3
+    assert frame_queue.stats['dropped_status'] == 2
+
+
+def test_framequeue_block():
+    frame_queue = FrameQueue(1, FrameQueue.BLOCK)
+    frame_queue.put(DATA_1)
+
+    writer = threading.Thread(target=frame_queue.put, args=(DATA_2,))
+    writer.start()
+    time.sleep(0.05)
+    assert writer.is_alive()
+
+    assert frame_queue.get() == DATA_1
+    writer.join(timeout=1)
+    assert not writer.is_alive()
+
+    assert _drain(frame_queue) == [DATA_2]
+    assert frame_queue.stats['dropped'] == 0
+
+
+def test_framequeue_block_nowait():
+    frame_queue = FrameQueue(1, FrameQueue.BLOCK)
+    assert frame_queue.get_nowait() == (None, None)
+
+    # the frame is queued past maxlen instead of waiting
+    assert frame_queue.put(DATA_1, 1.0, block=False)
+    assert frame_queue.full
+    assert frame_queue.put(DATA_2, 2.0, block=False)
+    assert len(frame_queue) == 2
+
+    assert frame_queue.get_nowait() == (DATA_1, 1.0)
+    assert frame_queue.full
+    assert frame_queue.get_nowait() == (DATA_2, 2.0)
+    assert not frame_queue.full
+    assert frame_queue.stats['dropped'] == 0
+
+
+def test_framequeue_configure():
+    frame_queue = FrameQueue(1, FrameQueue.BLOCK)
+    frame_queue.put(DATA_1)
+
+    # a writer blocked on the full queue goes on once the queue grows
+    writer = threading.Thread(target=frame_queue.put, args=(DATA_2,))
+    writer.start()
+    time.sleep(0.05)
+    assert writer.is_alive()
+    frame_queue.configure(2)
+    writer.join(timeout=1)
+    assert not writer.is_alive()
+
+    frame_queue.configure(2, FrameQueue.DROP_OLDEST)
+    assert frame_queue.put(LOG_1) is False
+    assert _drain(frame_queue) == [DATA_2, LOG_1]
+
+    with pytest.raises(ValueError):
+        frame_queue.configure(2, 'drop-newest')
+
+
+def test_framequeue_close_wakes_reader():
+    frame_queue = FrameQueue(4)
+    received = []
+
+    reader = threading.Thread(target=lambda: received.append(frame_queue.get()))
+    reader.start()
+    time.sleep(0.05)
+    frame_queue.close()
+    reader.join(timeout=1)
+
+    assert not reader.is_alive()
+    assert received == [None]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+import time
+
+import mock
+import pytest
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.frametrace import TraceReader, TraceRecorder, read_trace, trace_ports
+from openvisualizer.motehandler.moteprobe.mockmoteprobe import MockMoteProbe
+from openvisualizer.motehandler.moteprobe.replaymoteprobe import ReplayMoteProbe
+
+# ============================ defines =================================
+
+PAYLOADS = [b'S\x01\x00\x02\x00\x01', b'D\x01\x02\x03', b'E\x00\x01\x02\x10\x00\x05\x00\x06']
+
+
+# ============================ fixtures ================================
+
+@pytest.fixture
+def trace(tmp_path):
+    """ Two ports, the frames of the second one recorded 0.5s apart """
+    path = str(tmp_path / 'trace.bin')
+    hdlc = openhdlc.OpenHdlc()
+    with TraceRecorder(path) as recorder:
+        for i, payload in enumerate(PAYLOADS):
+            recorder.record('/dev/ttyUSB0', hdlc.hdlcify(payload), timestamp=1000.0 + i)
+            recorder.record('emulated2', hdlc.hdlcify(payload), timestamp=1000.0 + i / 2)
+    return path
+
+
+@pytest.fixture
+def long_trace(tmp_path):
+    """ 100 frames, 0.1s apart, alternating between 3 ports """
+    path = str(tmp_path / 'long.bin')
+    hdlc = openhdlc.OpenHdlc()
+    with TraceRecorder(path) as recorder:
+        for i in range(100):
+            recorder.record('port{}'.format(i % 3), hdlc.hdlcify(bytes([ord('D'), i])), timestamp=i / 10.0)
+    return path
+
+
+def _replay(path, port, speed, connect_delay=0):
+    received = []
+    probe = ReplayMoteProbe(path, port, speed)
+    time.sleep(connect_delay)
+    probe.send_to_parser = received.append
+    try:
+        assert probe.wait_finished(timeout=5)
+        deadline = time.monotonic() + 5
+        while len(received) < len(PAYLOADS) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        probe.close()
+        probe.join()
+    return received
+
+
+# ============================ tests ===================================
+
+def test_trace_roundtrip(trace):
+    records = list(read_trace(trace))
+
+    assert trace_ports(trace) == ['/dev/ttyUSB0', 'emulated2']
+    assert len(records) == 2 * len(PAYLOADS)
+    assert records[2] == (1001.0, '/dev/ttyUSB0', openhdlc.OpenHdlc().hdlcify(PAYLOADS[1]))
+    assert records[3][:2] == (1000.5, 'emulated2')
+
+
+def test_trace_truncated(trace):
+    with open(trace, 'rb') as f:
+        data = f.read()
+    with open(trace, 'wb') as f:
+        f.write(data[:-3])
+
+    # the last, truncated, record is skipped
+    assert len(list(read_trace(trace))) == 2 * len(PAYLOADS) - 1
+
+
+def test_trace_timestamps(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    with TraceRecorder(path) as recorder:
+        def record(port):
+            for i in range(200):
+                recorder.record(port, bytes([0x7e, i, 0x7e]))
+
+        threads = [threading.Thread(target=record, args=('port{}'.format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a step back of the wall clock does not show in the trace
+        with mock.patch('openvisualizer.motehandler.moteprobe.frametrace.time.time', return_value=0.0):
+            recorder.record('port0', b'\x7e\x7e')
+
+    timestamps = [ts for ts, _, _ in read_trace(path)]
+    assert len(timestamps) == 801
+    assert timestamps == sorted(timestamps)
+    assert abs(timestamps[-1] - time.time()) < 60
+
+
+def test_trace_bad_magic(tmp_path):
+    path = str(tmp_path / 'not_a_trace.bin')
+    with open(path, 'wb') as f:
+        f.write(b'\x7e' * 64)
+
+    with pytest.raises(ValueError):
+        list(read_trace(path))
+
+
+def test_trace_recording(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    probe = MockMoteProbe('mock')
+    try:
+        probe.recorder = TraceRecorder(path)
+        probe._parse_bytes(openhdlc.OpenHdlc().hdlcify(PAYLOADS[0]) + b'\x7e\x01\x02\x7e')
+        probe.recorder.close()
+    finally:
+        probe.close()
+        probe.join()
+
+    # invalid frames are recorded too
+    frames = [frame for _, _, frame in read_trace(path)]
+    assert frames == [openhdlc.OpenHdlc().hdlcify(PAYLOADS[0]), b'\x7e\x01\x02\x7e']
+
+
+def test_replay_max_speed(trace):
+    assert _replay(trace, 'emulated2', speed=0) == PAYLOADS
+
+
+def test_replay_waits_for_parser(trace):
+    # no frame is lost while the MoteConnector is being created
+    assert _replay(trace, 'emulated2', speed=0, connect_delay=0.2) == PAYLOADS
+
+
+def test_replay_paced(trace):
+    start = time.monotonic()
+    assert _replay(trace, 'emulated2', speed=10) == PAYLOADS
+    # the last frame is 1s after the first one in the trace
+    assert time.monotonic() - start >= 0.1
+
+
+def test_reader_matches_read_trace(long_trace):
+    with TraceReader(long_trace, index_step=4) as reader:
+        assert reader.ports == ['port0', 'port1', 'port2']
+        assert list(reader.frames()) == list(read_trace(long_trace))
+        assert reader.first_timestamp == 0.0
+        assert reader.last_timestamp == 9.9
+        num_bytes = float(sum(len(frame) for _, port, frame in read_trace(long_trace) if port == 'port1'))
+        assert reader.summary()['port1'] == {'frames': 33, 'bytes': num_bytes, 'first': 0.1, 'last': 9.7}
+
+
+def test_reader_window(long_trace):
+    with TraceReader(long_trace, index_step=4) as reader:
+        assert [ts for ts, _, _ in reader.frames(start=2.0, end=3.0)] == [i / 10.0 for i in range(20, 30)]
+        assert [ts for ts, _, _ in reader.frames('port2', start=2.0, end=3.0)] == [2.0, 2.3, 2.6, 2.9]
+        assert [ts for ts, _, _ in reader.frames('port2', start=9.95)] == []
+        assert list(reader.frames('unknown')) == []
+
+
+def test_reader_index_file(long_trace):
+    with TraceReader(long_trace, index_step=4) as reader:
+        expected = list(reader.frames('port0', start=5.0))
+    assert os.path.exists(long_trace + '.idx')
+
+    # the index is reused, with its own step
+    with TraceReader(long_trace) as reader:
+        assert reader.index_step == 4
+        assert list(reader.frames('port0', start=5.0)) == expected
+
+    # and rebuilt once the trace changed
+    with TraceRecorder(long_trace) as recorder:
+        recorder.record('other', b'\x7e\x7e', timestamp=1.0)
+    with TraceReader(long_trace) as reader:
+        assert reader.index_step == TraceReader.INDEX_STEP
+        assert reader.ports == ['other']
+
+
+def test_reader_parse(tmp_path):
+    path = str(tmp_path / 'trace.bin')
+    hdlc = openhdlc.OpenHdlc()
+    with TraceRecorder(path) as recorder:
+        recorder.record('port0', hdlc.hdlcify(b'E\x00\x01\x02\x10\x00\x05\x00\x06'), timestamp=1.0)
+        recorder.record('port0', b'\x7e\x01\x02\x03\x7e', timestamp=2.0)
+        recorder.record('port0', hdlc.hdlcify(b'Z\x00'), timestamp=3.0)
+
+    with TraceReader(path) as reader:
+        parsed = list(reader.parse(OpenParser(None, {}, 'test')))
+        assert [(ts, port, event_sub_type) for ts, port, event_sub_type, _ in parsed] == [(1.0, 'port0', 'error')]
+        assert (reader.hdlc_errors, reader.parse_errors) == (1, 1)
+
+
+def test_replay_window(long_trace):
+    probes = ReplayMoteProbe.from_trace(long_trace, speed=0, start=2.0, end=3.0)
+    received = []
+    try:
+        for probe in probes:
+            probe.send_to_parser = received.append
+        for probe in probes:
+            assert probe.wait_finished(timeout=5)
+    finally:
+        for probe in probes:
+            probe.close()
+            probe.join()
+
+    assert sorted(received) == sorted(bytes([ord('D'), i]) for i in range(20, 30))
+
+
+def test_replay_shared_clock(tmp_path):
+    """ The first frame of a port recorded late in the trace is replayed that late, not along with the other ports """
+    path = str(tmp_path / 'trace.bin')
+    hdlc = openhdlc.OpenHdlc()
+    with TraceRecorder(path) as recorder:
+        recorder.record('early', hdlc.hdlcify(b'D\x01'), timestamp=1000.0)
+        recorder.record('early', hdlc.hdlcify(b'D\x02'), timestamp=1001.0)
+        recorder.record('late', hdlc.hdlcify(b'D\x03'), timestamp=1003.0)
+
+    probes = ReplayMoteProbe.from_trace(path, speed=10)
+    arrivals = {}
+    try:
+        assert len({probe.replay for probe in probes}) == 1
+        for probe in probes:
+            probe.send_to_parser = lambda data, port=probe.portname: arrivals.setdefault(port, time.monotonic())
+        for probe in probes:
+            assert probe.wait_finished(timeout=5)
+    finally:
+        for probe in probes:
+            probe.close()
+            probe.join()
+
+    assert arrivals['late'] - arrivals['early'] >= 0.25
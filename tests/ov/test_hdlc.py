@@ -10,7 +10,7 @@ import pytest
 from openvisualizer.motehandler.moteprobe import openhdlc
 
 # ============================ logging =========================================
-from openvisualizer.utils import format_string_buf
+from openvisualizer.utils import format_buf
 
 LOGFILE_NAME = 'test_hdlc.log'
 
@@ -44,6 +44,11 @@ def random_frame(request):
     return request.param
 
 
+@pytest.fixture(params=sorted(openhdlc.FCS16_BACKENDS.keys()))
+def fcs16_backend(request):
+    return openhdlc.FCS16_BACKENDS[request.param]
+
+
 # ============================ helpers =========================================
 
 # ============================ tests ===========================================
@@ -55,8 +60,8 @@ def test_build_request_frame():
     hdlc = openhdlc.OpenHdlc()
 
     # hdlcify
-    frame_hdlcified = hdlc.hdlcify('\x53')
-    log.debug("request frame: {0}".format(format_string_buf(frame_hdlcified)))
+    frame_hdlcified = hdlc.hdlcify(b'\x53')
+    log.debug("request frame: {0}".format(format_buf(frame_hdlcified)))
 
 
 def test_dehdlcify_to_zero():
@@ -66,42 +71,62 @@ def test_dehdlcify_to_zero():
 
     # hdlc_frame
     hdlc_frame = [0x53, 0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x99, 0xaa]
-    hdlc_frame = ''.join([chr(b) for b in hdlc_frame])
-    log.debug("hdlc_frame:      {0}".format(format_string_buf(hdlc_frame)))
+    hdlc_frame = bytes(hdlc_frame)
+    log.debug("hdlc_frame:      {0}".format(format_buf(hdlc_frame)))
 
     # hdlcify
     hdlc_frame = hdlc.hdlcify(hdlc_frame)
-    log.debug("hdlcify: {0}".format(format_string_buf(hdlc_frame)))
+    log.debug("hdlcify: {0}".format(format_buf(hdlc_frame)))
 
     # remove flags
     hdlc_frame = hdlc_frame[1:-1]
-    log.debug("no flags:   {0}".format(format_string_buf(hdlc_frame)))
+    log.debug("no flags:   {0}".format(format_buf(hdlc_frame)))
 
     # calculate CRC
     crcini = 0xffff
     crc = crcini
     for c in hdlc_frame:
-        tmp = crc ^ (ord(c))
+        tmp = crc ^ c
         crc = (crc >> 8) ^ hdlc.FCS16TAB[(tmp & 0xff)]
-        log.debug("after {0}, crc={1}".format(hex(ord(c)), hex(crc)))
+        log.debug("after {0}, crc={1}".format(hex(c), hex(crc)))
 
 
 def test_randdom_back_and_forth(random_frame):
     random_frame = json.loads(random_frame)
-    random_frame = ''.join([chr(b) for b in random_frame])
+    random_frame = bytes(random_frame)
 
     log.debug("\n---------- test_randdom_back_and_forth")
 
     hdlc = openhdlc.OpenHdlc()
 
-    log.debug("random_frame:    {0}".format(format_string_buf(random_frame)))
+    log.debug("random_frame:    {0}".format(format_buf(random_frame)))
 
     # hdlcify
     frame_hdlcified = hdlc.hdlcify(random_frame)
-    log.debug("hdlcified:   {0}".format(format_string_buf(frame_hdlcified)))
+    log.debug("hdlcified:   {0}".format(format_buf(frame_hdlcified)))
 
     # dehdlcify
     frame_dehdlcified = hdlc.dehdlcify(frame_hdlcified)
-    log.debug("dehdlcified:    {0}".format(format_string_buf(frame_dehdlcified)))
+    log.debug("dehdlcified:    {0}".format(format_buf(frame_dehdlcified)))
 
     assert frame_dehdlcified == random_frame
+
+
+def test_fcs16_backends_parity(fcs16_backend):
+    rng = random.Random(16)
+    for buf_len in list(range(0, 20)) + [127, 128, 1000]:
+        buf = bytes(rng.randint(0x00, 0xff) for _ in range(buf_len))
+        crc_init = rng.randint(0x0000, 0xffff)
+        assert fcs16_backend(buf) == openhdlc._fcs16_tuple(buf)
+        assert fcs16_backend(buf, crc_init) == openhdlc._fcs16_tuple(buf, crc_init)
+
+
+def test_fcs16_backends_crc_good(fcs16_backend):
+    hdlc = openhdlc.OpenHdlc()
+    rng = random.Random(17)
+
+    # a frame followed by its FCS always yields the magic HDLC_CRCGOOD value
+    for _ in range(100):
+        frame = [rng.randint(0x00, 0xff) for _ in range(rng.randint(1, 127))]
+        crc = 0xffff - fcs16_backend(bytes(frame))
+        assert fcs16_backend(bytes(frame + [crc & 0xff, crc >> 8])) == hdlc.HDLC_CRCGOOD
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from openvisualizer.motehandler.ingeststats import ConnectorStats, Histogram, ProbeStats
+
+
+# ============================ tests ===================================
+
+def test_histogram():
+    histogram = Histogram()
+    assert histogram.to_dict()['p99'] == 0.0
+
+    for _ in range(90):
+        histogram.add(3e-6)
+    for _ in range(10):
+        histogram.add(0.5)
+
+    stats = histogram.to_dict()
+    assert stats['count'] == 100
+    assert stats['max'] == 0.5
+    assert stats['mean'] == pytest.approx((90 * 3e-6 + 10 * 0.5) / 100)
+    # 3 us falls in the [2, 4) us bucket, 500 ms in the [2**18, 2**19) us one
+    assert stats['buckets'][2] == 90
+    assert stats['buckets'][19] == 10
+    assert stats['p50'] == 4e-6
+    assert stats['p90'] == 4e-6
+    assert stats['p99'] == 0.5
+
+
+def test_histogram_overflow():
+    histogram = Histogram()
+    histogram.add(3600.0)
+    assert histogram.buckets[-1] == 1
+    assert histogram.percentile(50) == 3600.0
+
+
+def test_probestats_to_dict():
+    stats = ProbeStats()
+    stats.bytes = 1000
+    stats.frames = 9
+    stats.hdlc_errors = 1
+
+    result = stats.to_dict()
+    assert result['hdlc_error_rate'] == pytest.approx(0.1)
+    assert isinstance(result['bytes'], float)
+    assert result['bytes_per_sec'] > 0
+
+
+def test_connectorstats_add():
+    stats = ConnectorStats()
+    stats.add('status', 1e-5)
+    stats.add('status', 1e-5)
+    stats.add('data', 1e-4)
+
+    result = stats.to_dict()
+    assert result['frames'] == 3
+    assert result['frame_types'] == {'status': 2, 'data': 1}
+    assert result['parse_time']['count'] == 3
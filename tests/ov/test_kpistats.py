@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import random
+import statistics
+
+import pytest
+
+from openvisualizer.motehandler.moteconnector.openparser.kpistats import CounterBitmap, Reservoir, RunningStats, \
+    UinjectKpi
+
+# ============================ defines =================================
+
+VALUES = [random.Random(0).uniform(0, 1000) for _ in range(1000)]
+
+
+# ============================ tests ===================================
+
+def test_running_stats():
+    stats = RunningStats()
+    for value in VALUES:
+        stats.add(value)
+
+    assert stats.count == len(VALUES)
+    assert stats.mean == pytest.approx(statistics.mean(VALUES))
+    assert stats.variance == pytest.approx(statistics.pvariance(VALUES))
+    assert (stats.min, stats.max) == (min(VALUES), max(VALUES))
+
+
+def test_running_stats_merge():
+    merged = RunningStats()
+    for chunk in (VALUES[:10], [], VALUES[10:600], VALUES[600:]):
+        stats = RunningStats()
+        for value in chunk:
+            stats.add(value)
+        merged.merge(stats)
+
+    assert merged.count == len(VALUES)
+    assert merged.mean == pytest.approx(statistics.mean(VALUES))
+    assert merged.stddev == pytest.approx(statistics.pstdev(VALUES))
+    assert (merged.min, merged.max) == (min(VALUES), max(VALUES))
+
+
+def test_counter_bitmap():
+    counters = CounterBitmap()
+    assert counters.pdr == 0.0
+
+    # 0xffff, received late, was sent just before 0
+    for counter in [10, 11, 11, 13, 19, 0xffff]:
+        counters.add(counter)
+    assert counters.distinct == 5
+    assert (counters.min, counters.max) == (-1, 19)
+
+    other = CounterBitmap()
+    for counter in [5, 11, 12]:
+        other.add(counter)
+    counters.merge(other)
+    assert counters.distinct == 7
+    assert counters.min == -1
+
+
+def test_counter_bitmap_laps():
+    # a week at one packet per second, the counter wraps 9 times, one packet out of 10 is lost
+    sent = range(7 * 24 * 3600)
+    received = [value & 0xffff for value in sent if value % 10]
+
+    counters = CounterBitmap()
+    for counter in received:
+        counters.add(counter)
+    assert counters.distinct == len(received)
+    assert len(counters.laps) == 10
+    assert counters.pdr == pytest.approx(0.9, abs=1e-5)
+
+    # shards of the capture merged in order, the laps are aligned on the counters received before
+    merged = CounterBitmap()
+    for start in range(0, len(received), 50000):
+        shard = CounterBitmap()
+        for counter in received[start:start + 50000]:
+            shard.add(counter)
+        merged.merge(shard)
+    assert (merged.distinct, merged.min, merged.max) == (counters.distinct, counters.min, counters.max)
+    assert merged.laps == counters.laps
+
+
+def test_reservoir():
+    reservoir = Reservoir(100, seed=1)
+    for value in range(10000):
+        reservoir.add(value)
+
+    assert reservoir.count == 10000
+    assert len(reservoir.samples) == 100
+    assert 3000 < reservoir.percentile(50) < 7000
+
+    small = Reservoir(100, seed=2)
+    for value in range(10000, 10050):
+        small.add(value)
+    assert small.percentile(100) == 10049
+
+    # the merged sample keeps the proportions of the two streams
+    reservoir.merge(small)
+    assert reservoir.count == 10050
+    assert len(reservoir.samples) == 100
+    assert sum(value >= 10000 for value in reservoir.samples) < 10
+
+
+def test_uinject_kpi():
+    kpi = UinjectKpi(latency_samples=16)
+    for counter in range(20):
+        if counter % 4:
+            kpi.add(counter, 10 * counter, 2, 1, 0.5)
+
+    result = kpi.to_dict()
+    assert result['packets'] == 15
+    assert result['avg_pdr'] == 15 / 19
+    assert result['avg_latency'] == pytest.approx(statistics.mean(10 * c for c in range(20) if c % 4))
+    assert result['avg_cellsUsage'] == 2 / 64.0
+    assert result['p50_latency'] is not None
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
 import logging.handlers
+import random
 import time
 
 import mock
 import pytest
 
+from openvisualizer.motehandler.ingeststats import ProbeStats
+from openvisualizer.motehandler.moteprobe import openhdlc
 from openvisualizer.motehandler.moteprobe.mockmoteprobe import MockMoteProbe
 
 # ============================ logging =================================
@@ -107,8 +110,92 @@ INVALID_FRAME_1 = [
 ]
 
 
+# ============================ helpers =================================
+
+class ByteStateMachine(object):
+    """ Reference byte-per-byte HDLC deframer, the frames it yields are the oracle for MoteProbe._parse_bytes. """
+
+    def __init__(self):
+        self.hdlc = openhdlc.OpenHdlc()
+        self.rx_buf = bytearray()
+        self.hdlc_flag = False
+        self.receiving = False
+        self.xonxoff_escaping = False
+        self.frames = []
+
+    def _rx_buf_add(self, byte):
+        if byte == XONXOFF_ESC:
+            self.xonxoff_escaping = True
+        elif self.xonxoff_escaping:
+            self.rx_buf.append(byte ^ XONXOFF_MASK)
+            self.xonxoff_escaping = False
+        elif byte != XON and byte != XOFF:
+            self.rx_buf.append(byte)
+
+    def parse(self, stream):
+        for byte in stream:
+            if not self.receiving:
+                if self.hdlc_flag and byte != 0x7e:
+                    self.receiving = True
+                    self.hdlc_flag = False
+                    self.xonxoff_escaping = False
+                    self.rx_buf = bytearray([0x7e])
+                    self._rx_buf_add(byte)
+                elif byte == 0x7e:
+                    self.hdlc_flag = True
+            elif byte != 0x7e:
+                self._rx_buf_add(byte)
+            else:
+                self.hdlc_flag = True
+                self.receiving = False
+                self.rx_buf.append(byte)
+                try:
+                    frame = self.hdlc.dehdlcify(self.rx_buf)
+                except openhdlc.HdlcException:
+                    pass
+                else:
+                    self.frames.append(frame)
+                    self.hdlc_flag = False
+        return self.frames
+
+
+def _build_corpus(num_frames, seed):
+    """ Random mote output: valid and corrupted frames, XON/XOFF noise, escaped bytes and garbage between frames. """
+    rng = random.Random(seed)
+    hdlc = openhdlc.OpenHdlc()
+
+    stream = []
+    for _ in range(num_frames):
+        payload = [rng.randint(0x00, 0xff) for _ in range(rng.randint(1, 120))]
+        frame = list(hdlc.hdlcify(payload))
+
+        if rng.random() < 0.1:
+            # corrupt the CRC
+            frame[-2] ^= 0xff
+
+        for b in frame:
+            if b in (XON, XOFF, XONXOFF_ESC):
+                stream += [XONXOFF_ESC, b ^ XONXOFF_MASK]
+            else:
+                stream += [b]
+            if rng.random() < 0.01:
+                stream += [rng.choice([XON, XOFF])]
+
+        if rng.random() < 0.1:
+            # garbage without hdlc flags between frames
+            stream += [rng.choice([b for b in range(0x100) if b != 0x7e]) for _ in range(rng.randint(1, 10))]
+
+    return bytes(stream)
+
+
 # ============================ fixtures ================================
 
+@pytest.fixture(scope='module', params=[0, 1, 2])
+def serial_corpus(request):
+    stream = _build_corpus(500, request.param)
+    return stream, ByteStateMachine().parse(stream)
+
+
 @pytest.fixture
 def prob_running(request):
     my_mock = MockMoteProbe(request.param)
@@ -123,8 +210,9 @@ def probe_stopped(request):
     my_mock.close()
     my_mock.join()
     # Reset Buffer
-    my_mock.rx_buf = ''
-    my_mock.xonxoff_escaping = False
+    my_mock.rx_buf = bytearray()
+    my_mock.hdlc_flag = False
+    my_mock.receiving = False
     yield my_mock
 
 
@@ -173,47 +261,81 @@ def test_moteprobe_init(prob_running):
 
 
 @pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
-def test_moteprobe__rx_buf_add(probe_stopped):
-    assert probe_stopped.rx_buf == ''
-    for c in FRAME_IN_1:
-        probe_stopped._rx_buf_add(chr(c))
-    assert probe_stopped.rx_buf == ''.join(chr(c) for c in FRAME_OUT_1)
-
-    probe_stopped.rx_buf = ''
-    assert probe_stopped.rx_buf == ''
-    for c in FRAME_IN_2:
-        probe_stopped._rx_buf_add(chr(c))
-    assert probe_stopped.rx_buf == ''.join(chr(c) for c in FRAME_OUT_2)
-
-    probe_stopped.rx_buf = ''
-    assert probe_stopped.rx_buf == ''
-    for c in FRAME_IN_3:
-        probe_stopped._rx_buf_add(chr(c))
-    assert probe_stopped.rx_buf == ''.join(chr(c) for c in FRAME_OUT_3)
+def test_moteprobe__xonxoff_unescape(probe_stopped):
+    assert probe_stopped._xonxoff_unescape(bytes(FRAME_IN_1)) == bytes(FRAME_OUT_1)
+    assert probe_stopped._xonxoff_unescape(bytes(FRAME_IN_2)) == bytes(FRAME_OUT_2)
+    assert probe_stopped._xonxoff_unescape(bytes(FRAME_IN_3)) == bytes(FRAME_OUT_3)
 
 
 @pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
 def test_moteprobe__handle_frame(probe_stopped):
-    probe_stopped.rx_buf = ''.join(chr(c) for c in VALID_FRAME_1)
-    valid = probe_stopped._handle_frame()
+    valid = probe_stopped._handle_frame(bytes(VALID_FRAME_1))
     assert valid is True
 
-    probe_stopped.rx_buf = ''
-    assert probe_stopped.rx_buf == ''
-    probe_stopped.rx_buf = ''.join(chr(c) for c in INVALID_FRAME_1)
-    valid = probe_stopped._handle_frame()
+    valid = probe_stopped._handle_frame(bytes(INVALID_FRAME_1))
     assert valid is False
 
 
 @pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
 def test_moteprobe__parse_bytes(probe_stopped):
     # receive valid frame
-    probe_stopped._parse_bytes(chr(c) for c in FRAME_IN_4)
-    assert probe_stopped.send_to_parser_data == FRAME_OUT_4
+    probe_stopped._parse_bytes(bytes(FRAME_IN_4))
+    assert probe_stopped.send_to_parser_data == bytes(FRAME_OUT_4)
     # garbage and valid frame, this verifies that it re-uses the end hdlc
     # flag from the invalid frame
-    probe_stopped._parse_bytes(chr(c) for c in FRAME_IN_5)
-    assert probe_stopped.send_to_parser_data == FRAME_OUT_5
+    probe_stopped._parse_bytes(bytes(FRAME_IN_5))
+    assert probe_stopped.send_to_parser_data == bytes(FRAME_OUT_5)
+
+
+@pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
+def test_moteprobe__parse_bytes_split(probe_stopped):
+    # a frame split over several reads is only handed to the parser once complete
+    probe_stopped._parse_bytes(bytes(FRAME_IN_4[:5]))
+    assert probe_stopped.send_to_parser_data is None
+    probe_stopped._parse_bytes(bytes(FRAME_IN_4[5:]))
+    assert probe_stopped.send_to_parser_data == bytes(FRAME_OUT_4)
+
+
+@pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
+def test_moteprobe__parse_bytes_corpus(probe_stopped, serial_corpus):
+    stream, expected = serial_corpus
+    received = []
+    probe_stopped.send_to_parser = received.append
+
+    rng = random.Random(1)
+    pos = 0
+    while pos < len(stream):
+        chunk_len = rng.randint(1, 300)
+        probe_stopped._parse_bytes(stream[pos:pos + chunk_len])
+        pos += chunk_len
+
+    assert received == expected
+
+
+@pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
+def test_moteprobe__parse_bytes_stats(probe_stopped, serial_corpus):
+    stream, expected = serial_corpus
+    probe_stopped.send_to_parser = lambda data: None
+    probe_stopped.stats = ProbeStats()
+
+    for pos in range(0, len(stream), 64):
+        probe_stopped._parse_bytes(stream[pos:pos + 64])
+
+    stats = probe_stopped.stats.to_dict()
+    assert stats['bytes'] == len(stream)
+    assert stats['frames'] == len(expected)
+    assert stats['hdlc_errors'] > 0
+    assert stats['garbage_bytes'] > 0
+    assert stats['latency']['count'] == len(expected)
+
+
+@pytest.mark.parametrize('probe_stopped', [('mock')], indirect=["probe_stopped"])
+def test_moteprobe__garbage_bytes(probe_stopped):
+    probe_stopped.stats = ProbeStats()
+    probe_stopped._parse_bytes(bytes([0x01, 0x02, 0x03]) + bytes(FRAME_IN_4))
+    assert probe_stopped.stats.garbage_bytes == 3
+    assert probe_stopped.stats.frames == 1
+    assert probe_stopped.send_to_parser_data == bytes(FRAME_OUT_4)
 
 
 @mock.patch("{}.MockMoteProbe._attach".format(MODULE_PATH))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import collections
+
+import mock
+import pytest
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.motestate.motestate import MoteState
+
+
+# ============================ fixtures ================================
+
+@pytest.fixture
+def mote_state():
+    ms = MoteState(mock.Mock(serialport='test'))
+    yield ms
+    ms.disconnect()
+
+
+def _status_frame(status_elem, payload):
+    return memoryview(bytes([OpenParser.SERFRAME_MOTE2PC_STATUS, 0x01, 0x00, status_elem]) + payload)
+
+
+# ============================ tests ===================================
+
+def test_motestate_status_notif(mote_state):
+    parser = OpenParser(None, {}, 'test')
+
+    # MyDagRank, then two rows of the schedule
+    _, notif = parser.parse_input(_status_frame(2, b'\x00\x01'))
+    mote_state._received_status_notif(notif)
+    row_len = parser.parser_status.fields_dispatch[6].struct.size
+    for row in range(2):
+        _, notif = parser.parse_input(_status_frame(6, bytes([row]) + bytes(row_len - 1)))
+        mote_state._received_status_notif(notif)
+
+    assert mote_state.get_state_elem(MoteState.ST_MYDAGRANK).data[0]['myDAGrank'] == 256
+    assert mote_state.get_state_elem(MoteState.ST_MYDAGRANK).meta[0]['numUpdates'] == 1
+    assert len(mote_state.get_state_elem(MoteState.ST_SCHEDULE).data) == 2
+
+
+def test_motestate_foreign_namedtuple(mote_state):
+    # a notification built outside of the parsers is matched on its fields
+    foreign = collections.namedtuple('Foreign', ['myDAGrank'])
+    mote_state._received_status_notif(foreign(myDAGrank=42))
+
+    assert mote_state.get_state_elem(MoteState.ST_MYDAGRANK).data[0]['myDAGrank'] == 42
+    assert foreign not in mote_state.notif_handlers
+
+
+def test_motestate_unknown_notif(mote_state):
+    with pytest.raises(SystemError):
+        mote_state._received_status_notif(collections.namedtuple('Unknown', ['foo'])(foo=1))
+
+
+def test_motestate_dagroot_announce(mote_state):
+    parser = OpenParser(None, {}, 'test')
+    id_len = parser.parser_status.fields_dispatch[1].struct.size
+    locked = []
+
+    def dispatch(signal, data):
+        locked.append((signal, data['isDAGroot'], mote_state.state_lock.locked()))
+
+    # the DAG root status is announced once per change, after the state is unlocked
+    with mock.patch.object(mote_state, 'dispatch', side_effect=dispatch):
+        for is_dagroot in (1, 1, 0):
+            _, notif = parser.parse_input(_status_frame(1, bytes([is_dagroot]) + bytes(id_len - 1)))
+            mote_state._received_status_notif(notif)
+
+    assert locked == [('infoDagRoot', 1, False), ('infoDagRoot', 0, False)]
+    assert mote_state.get_state_elem(MoteState.ST_IDMANAGER).is_dagroot() == 0
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+import logging
+import struct
+import time
+
+import mock
+import pytest
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.moteconnector.openparser.parser import Parser
+from openvisualizer.motehandler.moteconnector.openparser.parserexception import ParserException
+from openvisualizer.motehandler.moteconnector.openparser.parserlogs import ParserLogs
+from openvisualizer.motehandler.moteconnector.openparser.parserstatus import StatusCache
+
+
+# ============================ fixtures ================================
+
+@pytest.fixture
+def open_parser():
+    return OpenParser(None, {}, 'test')
+
+
+class _SubParser(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def parse_input(self, data):
+        return self.name, data
+
+
+# ============================ tests ===================================
+
+@pytest.mark.parametrize('key', range(13))
+def test_parse_status(open_parser, key):
+    field_key = open_parser.parser_status.fields_dispatch[key]
+    payload = bytes(range(field_key.struct.size))
+    frame = bytes([OpenParser.SERFRAME_MOTE2PC_STATUS, 0x01, 0x00, key]) + payload
+
+    event_type, status = open_parser.parse_input(frame)
+
+    assert event_type == 'status'
+    assert type(status).__name__ == 'Tuple_' + field_key.name
+    assert tuple(status) == struct.unpack(field_key.structure, payload)
+
+
+def test_parse_status_dedup(open_parser):
+    open_parser.parser_status.status_cache = StatusCache()
+
+    def _row(row, num_tx):
+        # ScheduleRow element, the row number comes first
+        payload = bytearray(open_parser.parser_status.fields_dispatch[6].struct.size)
+        payload[0] = row
+        payload[-3] = num_tx
+        return memoryview(bytes([OpenParser.SERFRAME_MOTE2PC_STATUS, 0x01, 0x00, 6]) + payload)
+
+    assert open_parser.parse_input(_row(0, 1))[1].row == 0
+    assert open_parser.parse_input(_row(1, 1))[1].row == 1
+    assert open_parser.parse_input(_row(0, 1)) == ('status', None)
+    assert open_parser.parse_input(_row(1, 1)) == ('status', None)
+    assert open_parser.parse_input(_row(1, 2))[1].row == 1
+
+    assert open_parser.parser_status.status_cache.to_dict() == {'hits': 2, 'misses': 3, 'entries': 2}
+
+
+def test_parse_status_unknown_element(open_parser):
+    with pytest.raises(ParserException):
+        open_parser.parse_input(bytes([OpenParser.SERFRAME_MOTE2PC_STATUS, 0x01, 0x00, 0xff]))
+
+
+def test_parse_status_wrong_length(open_parser):
+    with pytest.raises(ParserException):
+        open_parser.parse_input(bytes([OpenParser.SERFRAME_MOTE2PC_STATUS, 0x01, 0x00, 0x00, 0x01, 0x02]))
+
+
+def test_parse_unknown_type(open_parser):
+    with pytest.raises(ParserException):
+        open_parser.parse_input(b'Z\x00\x00')
+
+
+def test_parser_dispatch_tables():
+    parser = Parser(1)
+    parser._add_sub_parser(index=0, val=ord('A'), parser=_SubParser('first'))
+    parser._add_sub_parser(index=0, val=ord('A'), parser=_SubParser('second'))
+    parser._add_sub_parser(index=1, val=ord('B'), parser=_SubParser('third'))
+
+    assert len(parser.dispatch_tables) == 2
+    # the first sub-parser registered for a value wins, as with the former scan over the keys
+    assert parser.parse_input(b'AB') == ('first', b'B')
+    assert parser.parse_input(b'CB') == ('third', b'B')
+    with pytest.raises(ParserException):
+        parser.parse_input(b'CC')
+
+
+def test_parse_data_uinject(open_parser):
+    asn = bytes([0x15, 0x00, 0x00, 0x07, 0x00])
+    payload = bytearray(40)
+    payload[-7:] = b'uinject'
+    payload[-14:-9] = bytes([0x10, 0x00, 0x00, 0x07, 0x00])  # asn at the source, ends with the counter
+    payload[-15] = 4  # cells used for tx
+    payload[-16] = 3  # cells used for rx
+    payload[-18:-16] = bytes([0xcd, 0xab])  # source mote id
+    payload[-22:-18] = struct.pack('<I', 25)  # ticks on
+    payload[-26:-22] = struct.pack('<I', 100)  # ticks in total
+    frame = bytes([OpenParser.SERFRAME_MOTE2PC_DATA, 0x01, 0x00]) + asn + bytes(16) + bytes(payload)
+
+    event_type, (source, data) = open_parser.parse_input(memoryview(frame))
+
+    assert event_type == 'data'
+    assert data == bytes(payload)
+    assert open_parser.parser_data.avg_kpi['abcd'].to_dict() == {
+        'packets': 1,
+        'avg_latency': 5.0,
+        'std_latency': 0.0,
+        'min_latency': 5,
+        'max_latency': 5,
+        'avg_pdr': 1.0,
+        'avg_cellsUsage': 4 / 64.0,
+        'avg_cellsUsedRx': 3.0,
+        'avg_dutyCycle': 0.25,
+    }
+    assert open_parser.parser_data.avg_kpi['abcd'].counters.min == 0x07
+
+
+def test_parse_data_no_uinject(open_parser):
+    frame = bytes([OpenParser.SERFRAME_MOTE2PC_DATA]) + bytes(range(1, 70))
+
+    event_type, (source, data) = open_parser.parse_input(frame)
+
+    assert event_type == 'data'
+    assert source == bytes(range(16, 24))
+    assert data == bytes(range(24, 70))
+    assert open_parser.parser_data.avg_kpi == {}
+
+
+# mote 0x0102, component 3, error code 0x10, arg1 5, arg2 6
+LOG_ENTRY = b'\x01\x02\x03\x10\x00\x05\x00\x06'
+
+
+@pytest.fixture
+def log_parser():
+    parser = ParserLogs(ParserLogs.LogSeverity.SEVERITY_ERROR, {'components': {3: 'IEEE802154E'}})
+    parser_log = logging.getLogger('ParserLogs')
+    level = parser_log.level
+    parser_log.setLevel(logging.ERROR)
+    with mock.patch.object(parser_log, 'log') as log_call:
+        yield parser, log_call
+    parser_log.setLevel(level)
+
+
+def test_parserlogs_lazy_formatting(log_parser):
+    parser, log_call = log_parser
+    parser_log = logging.getLogger('ParserLogs')
+
+    parser_log.setLevel(logging.CRITICAL)
+    with mock.patch.object(parser, '_translate_log_description') as translate:
+        assert parser.parse_input(LOG_ENTRY) == ('error', LOG_ENTRY)
+        assert not translate.called
+    assert not log_call.called
+
+    parser_log.setLevel(logging.ERROR)
+    parser.parse_input(LOG_ENTRY)
+    log_call.assert_called_once_with(logging.ERROR, '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6')
+
+
+def test_parserlogs_aggregation(log_parser):
+    parser, log_call = log_parser
+    parser.aggregation_window = 1.0
+
+    with mock.patch('openvisualizer.motehandler.moteconnector.openparser.parserlogs.time.monotonic') as monotonic:
+        for now in [10.0, 10.2, 10.4, 10.6, 11.5]:
+            monotonic.return_value = now
+            parser.parse_input(LOG_ENTRY)
+        # another mote is not aggregated with the first one
+        parser.parse_input(b'\x00\x09' + LOG_ENTRY[2:])
+
+    assert [c[0][1] for c in log_call.call_args_list] == [
+        '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6',
+        '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6 (x4)',
+        '9 [IEEE802154E] unknown error 16 arg1=5 arg2=6',
+    ]
+    assert parser.error_info == {(0x0102, 3, 0x10): 5, (0x0009, 3, 0x10): 1}
+    assert parser.get_error_info()[0] == {
+        'severity': 'E', 'mote_id': 0x0102, 'component': 'IEEE802154E', 'error_code': 0x10, 'count': 5,
+    }
+
+
+def test_parserlogs_aggregation_flush(log_parser):
+    parser, log_call = log_parser
+    parser.aggregation_window = 1.0
+
+    with mock.patch('openvisualizer.motehandler.moteconnector.openparser.parserlogs.time.monotonic') as monotonic:
+        # a burst that stops is still summarized once its window closed
+        for now in [10.0, 10.2, 10.4]:
+            monotonic.return_value = now
+            parser.parse_input(LOG_ENTRY)
+        monotonic.return_value = 10.5
+        parser.get_error_info()
+        assert len(log_call.call_args_list) == 1
+        monotonic.return_value = 11.0
+        parser.get_error_info()
+
+        # and the windows of the entries that stopped coming are forgotten
+        monotonic.return_value = 12.0
+        parser.parse_input(b'\x00\x09' + LOG_ENTRY[2:])
+        monotonic.return_value = 13.5
+        parser.parse_input(b'\x00\x0a' + LOG_ENTRY[2:])
+        assert list(parser._windows) == [(0x000a, 3, 0x10)]
+
+    assert [c[0][1] for c in log_call.call_args_list] == [
+        '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6',
+        '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6 (x2)',
+        '9 [IEEE802154E] unknown error 16 arg1=5 arg2=6',
+        'a [IEEE802154E] unknown error 16 arg1=5 arg2=6',
+    ]
+
+    # the entries counted when the mote stops sending are logged by a timer, or on demand
+    parser.aggregation_window = 0.05
+    for _ in range(3):
+        parser.parse_input(LOG_ENTRY)
+    for _ in range(100):
+        if log_call.call_args_list[-1][0][1].endswith('(x2)'):
+            break
+        time.sleep(0.01)
+    assert log_call.call_args_list[-1][0][1] == '102 [IEEE802154E] unknown error 16 arg1=5 arg2=6 (x2)'
+
+    parser.aggregation_window = 60
+    for _ in range(4):
+        parser.parse_input(b'\x00\x09' + LOG_ENTRY[2:])
+    parser.flush()
+    assert log_call.call_args_list[-1][0][1] == '9 [IEEE802154E] unknown error 16 arg1=5 arg2=6 (x3)'
+    assert parser._windows == {}
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+import os
+import select
+import threading
+import time
+
+import pytest
+from pydispatch import dispatcher
+
+from openvisualizer.motehandler.moteconnector.openparser.openparser import OpenParser
+from openvisualizer.motehandler.moteprobe import openhdlc
+from openvisualizer.motehandler.moteprobe.asyncmoteprobe import AsyncSerialMoteProbe
+from openvisualizer.motehandler.moteprobe.framequeue import FrameQueue
+from openvisualizer.motehandler.moteprobe.serialmoteprobe import BaudrateCache, SerialMoteProbe
+from scripts.benchmarks.framegen import xonxoff_escape
+
+# ============================ defines =================================
+
+FRAMES = [
+    [0x53, 0x01, 0x00, 0x02, 0x10, 0x00],
+    [0x44, 0x7e, 0x7d, 0x20, 0x30, 0x40, 0x50, 0x60],
+    [0x53, 0x01, 0x00, 0x00, 0x01],
+]
+
+
+# ============================ fixtures ================================
+
+@pytest.fixture(params=['bulk', 'per-byte', 'asyncio'])
+def pty_probe(request):
+    master, slave = os.openpty()
+    if request.param == 'asyncio':
+        probe = AsyncSerialMoteProbe(port=os.ttyname(slave), baudrate=115200)
+    else:
+        probe = SerialMoteProbe(port=os.ttyname(slave), baudrate=115200, bulk_read=request.param == 'bulk')
+    probe.send_to_parser_data = []
+    probe.send_to_parser = probe.send_to_parser_data.append
+
+    assert probe.wait_attached(timeout=5)
+
+    yield master, probe
+
+    probe.close()
+    probe.join()
+    os.close(master)
+    os.close(slave)
+
+
+class EchoMote(threading.Thread):
+    """ Answers the serial echo requests written to a pty, as a mote running at any baudrate would. """
+
+    def __init__(self):
+        super(EchoMote, self).__init__(daemon=True)
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.quit = False
+        self.start()
+
+    def run(self):
+        hdlc = openhdlc.OpenHdlc()
+        buf = b''
+        while not self.quit:
+            if not select.select([self.master], [], [], 0.05)[0]:
+                continue
+            buf += os.read(self.master, 1024)
+            frames = buf.split(openhdlc.OpenHdlc.HDLC_FLAG)
+            buf = frames.pop()
+            for frame in frames:
+                if not frame:
+                    continue
+                request = hdlc.dehdlcify(openhdlc.OpenHdlc.HDLC_FLAG + frame + openhdlc.OpenHdlc.HDLC_FLAG)
+                if request[0] == OpenParser.SERFRAME_PC2MOTE_TRIGGERSERIALECHO:
+                    reply = bytes([OpenParser.SERFRAME_MOTE2PC_DATA]) + bytes(7) + request[1:]
+                    os.write(self.master, xonxoff_escape(hdlc.hdlcify(reply)))
+
+    def close(self):
+        self.quit = True
+        self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+# ============================ tests ===================================
+
+def test_serialmoteprobe_rx(pty_probe):
+    master, probe = pty_probe
+    hdlc = openhdlc.OpenHdlc()
+
+    stream = b''.join(hdlc.hdlcify(f) for f in FRAMES)
+    os.write(master, stream)
+
+    timeout = 100
+    while len(probe.send_to_parser_data) < len(FRAMES) and timeout:
+        time.sleep(0.01)
+        timeout -= 1
+
+    assert probe.send_to_parser_data == [bytes(f) for f in FRAMES]
+
+
+def test_serialmoteprobe_rx_overflow(pty_probe):
+    master, probe = pty_probe
+    hdlc = openhdlc.OpenHdlc()
+
+    # the parser is stuck, the reader keeps going and the receive buffer drops the oldest frames
+    probe.set_rx_queue(2, FrameQueue.DROP_OLDEST)
+    parser_busy = threading.Event()
+    received = []
+
+    def slow_parser(data):
+        parser_busy.wait()
+        received.append(data)
+
+    probe.send_to_parser = slow_parser
+    frames = [bytes([0x44, i]) for i in range(10)]
+    os.write(master, b''.join(hdlc.hdlcify(f) for f in frames))
+
+    timeout = 100
+    while probe.rx_stats['frames'] < len(frames) and timeout:
+        time.sleep(0.01)
+        timeout -= 1
+
+    parser_busy.set()
+    timeout = 100
+    while probe.rx_stats['dropped'] + len(received) < len(frames) and timeout:
+        time.sleep(0.01)
+        timeout -= 1
+
+    assert received[-2:] == frames[-2:]
+    assert probe.rx_stats['dropped'] + len(received) == len(frames)
+    assert probe.rx_stats['dropped'] >= len(frames) - 3
+
+
+def test_serialmoteprobe_rx_queue(pty_probe):
+    master, probe = pty_probe
+    hdlc = openhdlc.OpenHdlc()
+
+    # parsed on the reader thread by default, through the queue once set, and on the reader thread again
+    assert probe.rx_queue is None and probe.rx_stats == {}
+    for size in (4, 0):
+        probe.set_rx_queue(size)
+        os.write(master, b''.join(hdlc.hdlcify(f) for f in FRAMES))
+
+        timeout = 100
+        while len(probe.send_to_parser_data) < len(FRAMES) and timeout:
+            time.sleep(0.01)
+            timeout -= 1
+
+        assert probe.send_to_parser_data == [bytes(f) for f in FRAMES]
+        del probe.send_to_parser_data[:]
+
+    assert probe.rx_queue is None
+
+
+def test_asyncmoteprobe_rx_backpressure():
+    ptys = [os.openpty() for _ in range(2)]
+    probes = [AsyncSerialMoteProbe(port=os.ttyname(slave), baudrate=115200) for _, slave in ptys]
+    hdlc = openhdlc.OpenHdlc()
+    try:
+        for probe in probes:
+            assert probe.wait_attached(timeout=5)
+
+        # the parser of the first port is stuck and its lossless queue fills up: that port is no longer read, while
+        # the event loop goes on serving the second one
+        slow, fast = probes
+        slow.set_rx_queue(2)
+        parser_busy = threading.Event()
+        received = []
+
+        def slow_parser(data):
+            parser_busy.wait()
+            received.append(data)
+
+        slow.send_to_parser = slow_parser
+        fast.send_to_parser_data = []
+        fast.send_to_parser = fast.send_to_parser_data.append
+
+        frames = [bytes([0x44, i]) for i in range(10)]
+        for frame in frames:
+            os.write(ptys[0][0], hdlc.hdlcify(frame))
+        os.write(ptys[1][0], b''.join(hdlc.hdlcify(f) for f in FRAMES))
+
+        timeout = 100
+        while len(fast.send_to_parser_data) < len(FRAMES) and timeout:
+            time.sleep(0.01)
+            timeout -= 1
+        assert fast.send_to_parser_data == [bytes(f) for f in FRAMES]
+        assert slow._rx_paused
+
+        parser_busy.set()
+        timeout = 100
+        while len(received) < len(frames) and timeout:
+            time.sleep(0.01)
+            timeout -= 1
+
+        assert received == frames
+        assert slow.rx_stats['dropped'] == 0
+        assert not any(t.name.startswith('MoteProbeRx@') for t in threading.enumerate())
+    finally:
+        for probe in probes:
+            probe.close()
+            probe.join()
+        for master, slave in ptys:
+            os.close(master)
+            os.close(slave)
+
+
+def _read_pty(master, length, timeout=1.0):
+    received = b''
+    deadline = time.monotonic() + timeout
+    while len(received) < length and time.monotonic() < deadline:
+        if select.select([master], [], [], 0.01)[0]:
+            received += os.read(master, 1024)
+    return received
+
+
+def _wait_tx_frames(probe, frames, timeout=1.0):
+    """ The writer accounts a write once done, possibly after the bytes were read on the other side """
+    deadline = time.monotonic() + timeout
+    while probe.tx_stats['frames'] < frames and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return probe.tx_stats
+
+
+def test_serialmoteprobe_tx(pty_probe):
+    master, probe = pty_probe
+    hdlc = openhdlc.OpenHdlc()
+
+    for frame in FRAMES + FRAMES:
+        dispatcher.send(signal='fromMoteConnector@' + probe.portname, data=bytes(frame))
+
+    expected = b''.join(hdlc.hdlcify(f) for f in FRAMES + FRAMES)
+    assert _read_pty(master, len(expected)) == expected
+
+    stats = _wait_tx_frames(probe, 2 * len(FRAMES))
+    assert stats['queue_depth'] == 0
+    assert stats['frames'] == 2 * len(FRAMES)
+    assert 1 <= stats['writes'] <= stats['frames']
+    assert stats['bytes'] == len(expected)
+    # the asyncio probes are written from the event loop, without a writer thread
+    assert (probe._tx_writer is None) == isinstance(probe, AsyncSerialMoteProbe)
+
+
+def test_serialmoteprobe_tx_coalesce():
+    master, slave = os.openpty()
+    probe = SerialMoteProbe(port=os.ttyname(slave), baudrate=115200)
+    hdlc = openhdlc.OpenHdlc()
+    try:
+        assert probe.wait_attached(timeout=5)
+
+        # the frames queued while the writer is busy are merged into one write
+        send_data = probe._send_data
+        writer_busy = threading.Event()
+
+        def slow_send_data(hdlc_data):
+            writer_busy.wait()
+            send_data(hdlc_data)
+
+        probe._send_data = slow_send_data
+        for frame in FRAMES + FRAMES:
+            dispatcher.send(signal='fromMoteConnector@' + probe.portname, data=bytes(frame))
+        writer_busy.set()
+
+        expected = b''.join(hdlc.hdlcify(f) for f in FRAMES + FRAMES)
+        assert _read_pty(master, len(expected)) == expected
+        assert _wait_tx_frames(probe, 2 * len(FRAMES))['writes'] <= 2
+    finally:
+        probe.close()
+        probe.join()
+        os.close(master)
+        os.close(slave)
+
+
+def test_serialmoteprobe_tx_pacing(pty_probe):
+    master, probe = pty_probe
+    hdlc = openhdlc.OpenHdlc()
+
+    # the fragments following the first one of a packet are written tx_pacing apart, the other frames right away
+    next_hop = [0x00, 0x12, 0x4b, 0x00, 0x00, 0x00, 0x00, 0x02]
+    fragments = [
+        [OpenParser.SERFRAME_PC2MOTE_DATA] + next_hop + [0xc0, 0x90, 0x00, 0x01] + [0x55] * 8,
+        [OpenParser.SERFRAME_PC2MOTE_DATA] + next_hop + [0xe0, 0x90, 0x00, 0x01, 0x0b] + [0x55] * 8,
+        [OpenParser.SERFRAME_PC2MOTE_DATA] + next_hop + [0xe0, 0x90, 0x00, 0x01, 0x0c] + [0x55] * 8,
+    ]
+    probe.tx_pacing = 0.1
+    start = time.monotonic()
+    for frame in fragments + FRAMES:
+        dispatcher.send(signal='fromMoteConnector@' + probe.portname, data=bytes(frame))
+
+    expected = b''.join(hdlc.hdlcify(f) for f in fragments + FRAMES)
+    assert _read_pty(master, len(expected), timeout=2) == expected
+    assert time.monotonic() - start >= 2 * probe.tx_pacing
+    assert 3 <= _wait_tx_frames(probe, len(fragments) + len(FRAMES))['writes'] <= 3 + len(FRAMES)
+    assert probe._tx_paced(bytes(fragments[1]))
+    assert not probe._tx_paced(bytes(fragments[0])) and not probe._tx_paced(bytes(FRAMES[1]))
+
+
+def test_serialmoteprobe_close(pty_probe):
+    _, probe = pty_probe
+    assert probe.is_alive()
+
+    probe.close()
+    probe.join(timeout=5)
+
+    assert not probe.is_alive()
+
+
+@pytest.mark.parametrize('probe_cls', [SerialMoteProbe, AsyncSerialMoteProbe])
+def test_probe_serial_ports(probe_cls):
+    motes = [EchoMote() for _ in range(4)]
+    probes = []
+    try:
+        probes = probe_cls.probe_serial_ports(baudrate=[115200], port_mask=[m.port for m in motes], max_workers=2)
+        assert sorted(p.portname for p in probes) == sorted(m.port for m in motes)
+    finally:
+        for probe in probes:
+            probe.close()
+        for probe in probes:
+            probe.join()
+        for mote in motes:
+            mote.close()
+
+
+def test_baudrate_cache(tmp_path):
+    path = str(tmp_path / 'baudrates.json')
+
+    cache = BaudrateCache(path)
+    assert cache.get('/dev/ttyUSB0') is None
+    cache.set('/dev/ttyUSB0', 115200)
+    cache.set('/dev/ttyUSB1', 500000)
+    cache.discard('/dev/ttyUSB1')
+    cache.save()
+
+    cache = BaudrateCache(path)
+    assert cache.get('/dev/ttyUSB0') == 115200
+    assert cache.get('/dev/ttyUSB1') is None
+
+    with open(path, 'w') as f:
+        f.write('{corrupted')
+    assert BaudrateCache(path).get('/dev/ttyUSB0') is None
+
+
+def test_probe_serial_ports_cached(tmp_path):
+    path = str(tmp_path / 'baudrates.json')
+    mote = EchoMote()
+    probes = []
+    try:
+        # cold start, the echo mote answers at any baudrate so the first one is picked and cached
+        probes = SerialMoteProbe.probe_serial_ports(baudrate=['500000'], port_mask=[mote.port],
+                                                    baudrate_cache=BaudrateCache(path))
+        assert [p.serial.baudrate for p in probes] == [500000]
+        probes[0].close()
+        probes[0].join()
+
+        # warm start, the cached baudrate is tried before the ones listed first
+        probes = SerialMoteProbe.probe_serial_ports(baudrate=['115200', '500000'], port_mask=[mote.port],
+                                                    baudrate_cache=BaudrateCache(path))
+        assert [p.serial.baudrate for p in probes] == [500000]
+    finally:
+        for probe in probes:
+            probe.close()
+            probe.join()
+        mote.close()
+
+
+def test_wait_attached_error():
+    probe = SerialMoteProbe(port='/dev/does-not-exist', baudrate=115200)
+    assert not probe.wait_attached(timeout=5)
+    probe.join()
+
+
+@pytest.mark.parametrize('probe_cls', [SerialMoteProbe, AsyncSerialMoteProbe])
+def test_tx_attach_error(probe_cls):
+    port = '/dev/does-not-exist'
+    probe = probe_cls(port=port, baudrate=115200)
+    assert not probe.wait_attached(timeout=5)
+
+    # the probe is no longer routed the frames for the mote
+    assert not dispatcher.getReceivers(signal='fromMoteConnector@' + port)
+
+    # a sender still holding the probe is never blocked, even with more frames than the transmit queue holds
+    num_frames = probe.TX_QUEUE_SIZE + 10
+    sender = threading.Thread(target=lambda: [probe._queue_data(bytes(FRAMES[0])) for _ in range(num_frames)],
+                              daemon=True)
+    sender.start()
+    sender.join(5)
+    assert not sender.is_alive()
+
+    assert probe.tx_stats['frames'] == 0
+    assert probe.tx_stats['dropped'] == num_frames
+    probe.close()
+    probe.join()
@@ -2,11 +2,14 @@
 
 import json
 import logging.handlers
+import os
 
+import mock
 import pytest
 
 # ============================ logging =========================================
-from openvisualizer.utils import byteinverse, hex2buf, format_ipv6_addr, buf2int
+from openvisualizer.utils import byteinverse, hex2buf, format_ipv6_addr, buf2int, extract_stack_defines, \
+    StackDefinesCache
 
 LOGFILE_NAME = 'test_utils.log'
 
@@ -111,6 +114,28 @@ def expected_format_ipv6(request):
 
 # ============================ helpers =========================================
 
+DEFS_H = '''
+   COMPONENT_NULL                      = 0x00,
+   COMPONENT_OPENWSN                   = 0x01,
+   ERR_JOINED                          = 0x01, // node joined
+   ERR_SEQUENCE_NUMBER_COLLISION       = 0x02, // sequence number collision [{0}]
+'''
+
+SIXTOP_H = '''
+#define IANA_6TOP_RC_SUCCESS         0x00 // RC_SUCCESS  operation succeeded
+   SIX_STATE_IDLE                      = 0x00,
+'''
+
+
+def _write_fw_tree(root):
+    os.makedirs(os.path.join(root, 'inc'))
+    os.makedirs(os.path.join(root, 'stack', '02b-MAChigh'))
+    with open(os.path.join(root, 'inc', 'defs.h'), 'w') as f:
+        f.write(DEFS_H)
+    with open(os.path.join(root, 'stack', '02b-MAChigh', 'sixtop.h'), 'w') as f:
+        f.write(SIXTOP_H)
+
+
 # ============================ tests ===========================================
 
 def test_buf2int(expected_buf2int):
@@ -139,3 +164,61 @@ def test_format_ipv6_addr(expected_format_ipv6):
     log.info(ipv6_string)
 
     assert format_ipv6_addr(ipv6_list) == ipv6_string
+
+
+def test_extract_stack_defines_cache(tmp_path):
+    fw_path = str(tmp_path / 'fw')
+    cache_path = str(tmp_path / 'stack_defines.json')
+    _write_fw_tree(fw_path)
+
+    defines = extract_stack_defines(fw_path, StackDefinesCache(cache_path))
+    assert defines == {
+        'components': {0: 'NULL', 1: 'OPENWSN'},
+        'log_descriptions': {1: 'node joined', 2: 'sequence number collision [{0}]'},
+        'sixtop_returncodes': {0: 'RC_SUCCESS'},
+        'sixtop_states': {0: 'IDLE'},
+    }
+    assert os.path.isfile(cache_path)
+
+    # warm start, touched sources with the same content: nothing is scanned
+    with mock.patch('openvisualizer.utils.re.search') as search:
+        assert extract_stack_defines(fw_path, StackDefinesCache(cache_path)) == defines
+        defs_h = os.path.join(fw_path, 'inc', 'defs.h')
+        os.utime(defs_h, ns=(0, 0))
+        assert extract_stack_defines(fw_path, StackDefinesCache(cache_path)) == defines
+        assert not search.called
+
+    # modified sources are scanned again
+    with open(defs_h, 'a') as f:
+        f.write('   COMPONENT_IEEE802154                = 0x02,\n')
+    defines = extract_stack_defines(fw_path, StackDefinesCache(cache_path))
+    assert defines['components'] == {0: 'NULL', 1: 'OPENWSN', 2: 'IEEE802154'}
+
+
+def test_extract_stack_defines_cache_version(tmp_path):
+    fw_path = str(tmp_path / 'fw')
+    cache_path = str(tmp_path / 'stack_defines.json')
+    _write_fw_tree(fw_path)
+    defines = extract_stack_defines(fw_path, StackDefinesCache(cache_path))
+
+    # the entries written by other extractors are not reused, even if the sources did not change
+    with mock.patch.object(StackDefinesCache, 'VERSION', StackDefinesCache.VERSION + 1):
+        with mock.patch('openvisualizer.utils.extract_6top_states', return_value={0: 'IDLE'}) as extract:
+            assert extract_stack_defines(fw_path, StackDefinesCache(cache_path)) == defines
+            assert extract.called
+
+        with open(cache_path) as f:
+            entries = json.load(f)
+        assert all(entry['version'] == StackDefinesCache.VERSION for entry in entries.values())
+
+
+def test_extract_stack_defines_corrupt_cache(tmp_path):
+    fw_path = str(tmp_path / 'fw')
+    cache_path = str(tmp_path / 'stack_defines.json')
+    _write_fw_tree(fw_path)
+    with open(cache_path, 'w') as f:
+        f.write('{not json')
+
+    assert extract_stack_defines(fw_path, StackDefinesCache(cache_path))['sixtop_states'] == {0: 'IDLE'}
+    with open(cache_path) as f:
+        assert 'sixtop_states' in json.load(f)